@@ -1,39 +1,101 @@
 # api.py
+import codecs
+import hmac
+import json
 import os
+import re
+import time
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
-print("[API] Booting FastAPI...")
-
-from fastapi import FastAPI, HTTPException, Query, APIRouter
+from fastapi import FastAPI, HTTPException, Query, APIRouter, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
 
 _loaded = load_dotenv()
-print(f"[API] .env loaded: {_loaded}")
-print(f"[API] ENV presence -> ETH RPC: {'yes' if os.getenv('WEB3_PROVIDER_ETH') else 'no'}, "
-      f"BSC RPC: {'yes' if os.getenv('WEB3_PROVIDER_BSC') else 'no'}, "
-      f"ETHERSCAN_API_KEY: {'yes' if os.getenv('ETHERSCAN_API_KEY') else 'no'}, "
-      f"BSCSCAN_API_KEY: {'yes' if os.getenv('BSCSCAN_API_KEY') else 'no'}")
+
+# After load_dotenv, so LOG_* settings from .env apply
+from backend.utils.log import get_logger
+log = get_logger("API")
+log.debug("Booting FastAPI...")
+log.info(".env loaded: %s", _loaded)
+log.info("ENV presence -> ETH RPC: %s, BSC RPC: %s, ETHERSCAN_API_KEY: %s, BSCSCAN_API_KEY: %s",
+         *("yes" if os.getenv(k) else "no"
+           for k in ("WEB3_PROVIDER_ETH", "WEB3_PROVIDER_BSC", "ETHERSCAN_API_KEY", "BSCSCAN_API_KEY")))
 
 try:
-    from backend.core.analyze import analyze_token
-    print("[API] Import analyze_token: OK")
+    from backend.core.analyze import analyze_token_async
+    log.debug("Import analyze_token_async: OK")
 except Exception as e:
-    print("[API] Import analyze_token: FAIL ->", e)
+    log.error("Import analyze_token_async: FAIL -> %s", e)
     raise
 
 try:
-    from backend.utils.ratelimit import set_default_qps
-    print("[API] Import set_default_qps: OK")
+    from backend.utils.ratelimit import current_lane, rate_budget
+    from backend.utils.explorer import close_async_sessions
+    log.debug("Import rate_budget: OK")
 except Exception as e:
-    print("[API] Import set_default_qps: FAIL ->", e)
+    log.error("Import rate_budget: FAIL -> %s", e)
     raise
 
+from backend.chains import warm_up_clients, get_rpc_status, close_async_clients
+from backend.core.jobs import JobRunner
+from backend.db.jobs import JOBS_LEASE_SECONDS, get_job_store
+from backend.utils.addr import normalize_evm_address
+from backend.utils.cache import TTLCache
+from backend.utils.concurrency import concurrency_limit, concurrency_stats, default_ceiling
+from backend.utils.context import prefetch_contract_ages_async
+from backend.utils.metrics import render as render_metrics
+
+# Upper bound on analyses in flight per /api/batch request (all on the event loop)
+API_BATCH_MAX_CONCURRENCY = int(os.getenv("API_BATCH_MAX_CONCURRENCY", "256"))
+# Requests for a token already being analyzed attach to that analysis; its result is then
+# reused for this many seconds (0 = only share in-flight work)
+API_COALESCE_SECONDS = float(os.getenv("API_COALESCE_SECONDS", "5"))
+# Seconds between progress frames on /api/batch/stream (also keeps idle connections alive)
+API_STREAM_PROGRESS_SECONDS = max(0.1, float(os.getenv("API_STREAM_PROGRESS_SECONDS", "1")))
+# Largest address list one background job (POST /api/jobs) may hold
+JOBS_MAX_ADDRESSES = int(os.getenv("JOBS_MAX_ADDRESSES", "1000000"))
+# Shared secret remote scan workers (worker_cli.py) must send as "Authorization: Bearer ...".
+# Unset = the worker endpoints refuse everyone, unless JOBS_WORKERS_INSECURE=1 opens them (trusted networks only)
+JOBS_WORKER_TOKEN = os.getenv("JOBS_WORKER_TOKEN", "")
+JOBS_WORKERS_INSECURE = os.getenv("JOBS_WORKERS_INSECURE", "0").strip().lower() not in {"0", "false", "no", "off", ""}
+
+# (rate limit lane, chain, checksummed address, pin) -> running or recent analysis, shared by
+# /risk and /batch. The analysis runs in its first caller's rate limit lane, so an interactive
+# request never joins one queued in the batch lane behind a job's budget.
+_ANALYSES = TTLCache("api.analyze", ttl_seconds=API_COALESCE_SECONDS)
+
+
+def _analysis_key(chain: str, address: str, pin_block: Optional[bool]):
+    return current_lane(), chain, address, pin_block
+
+
+@_ANALYSES.memoize(key=_analysis_key)
+async def _shared_analysis(chain: str, address: str, pin_block: Optional[bool]):
+    return await analyze_token_async(chain, address, pin_block=pin_block)
+
+
+async def _analyze(chain: str, address: str, pin_block: Optional[bool], trace: bool):
+    """analyze_token_async, coalesced per (chain, address, pin). Traced runs get their own analysis."""
+    address = normalize_evm_address(address)
+    if trace:
+        return await analyze_token_async(chain, address, pin_block=pin_block, trace=True)
+    return await _shared_analysis(chain, address, pin_block)
+
+
+async def _job_analyze(chain: str, address: str, pin_block: Optional[bool]):
+    return await _analyze(chain, address, pin_block, False)
+
+
+_RUNNER: Optional[JobRunner] = None
+
 app = FastAPI(title="Token Rug Radar API", version="0.3.1-debug")
-print("[API] FastAPI instance created.")
+log.debug("FastAPI instance created.")
 
 # CORS
 try:
@@ -44,96 +106,502 @@ try:
         allow_methods=["*"],
         allow_headers=["*"],
     )
-    print("[API] CORS middleware registered.")
+    log.debug("CORS middleware registered.")
 except Exception as e:
-    print("[API] CORS registration failed:", e)
+    log.error("CORS registration failed: %s", e)
+
+@app.on_event("startup")
+def _warm_up_rpc_clients():
+    # Build the pooled per-chain clients once (verifies chainId) before serving traffic.
+    status = warm_up_clients()
+    log.info("RPC clients warm-up: %s", status)
+
+@app.on_event("startup")
+async def _start_job_runner():
+    # Background jobs (POST /api/jobs); jobs left running by a previous process resume once their lease expires
+    global _RUNNER
+    store = get_job_store()
+    if store is not None:
+        _RUNNER = JobRunner(store, _job_analyze, max_concurrency=API_BATCH_MAX_CONCURRENCY)
+        _RUNNER.start()
+
+@app.on_event("shutdown")
+async def _close_async_sessions():
+    if _RUNNER is not None:
+        await _RUNNER.stop()
+    await close_async_clients()
+    await close_async_sessions()
+
 
 api = APIRouter(prefix="/api")
-print("[API] APIRouter created at /api.")
+log.debug("APIRouter created at /api.")
 
 
 @api.get("/health")
 def health():
-    print("[API] GET /api/health")
+    log.debug("GET /api/health")
     return {"ok": True}
 
 
+@api.get("/rpc")
+def rpc_status():
+    log.debug("GET /api/rpc")
+    return get_rpc_status()
+
+
+@api.get("/concurrency")
+def concurrency_status():
+    # Adaptive scan concurrency per chain: current limit, analyses in flight, last change
+    return concurrency_stats()
+
+
+@api.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text format: stage latencies, RPC/explorer counters, limiter waits, caches, pools
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @api.get("/risk/{address}")
-def risk(address: str, chain: str = Query(default="eth", pattern="^(eth|bsc)$")):
-    print(f"[API] GET /api/risk/{address}?chain={chain} -> start")
+async def risk(address: str, chain: str = Query(default="eth", pattern="^(eth|bsc)$"),
+         pin: Optional[bool] = Query(default=None), trace: bool = Query(default=False)):
+    log.debug("GET /api/risk/%s?chain=%s&pin=%s&trace=%s -> start", address, chain, pin, trace)
     try:
-        out = analyze_token(chain, address)
-        print(f"[API] /risk OK address={address} chain={chain} score={out.get('score')} tier={out.get('risk_tier')}")
+        out = await _analyze(chain, address, pin, trace)
+        log.debug("/risk OK address=%s chain=%s score=%s tier=%s", address, chain, out.get('score'), out.get('risk_tier'))
         return out
     except ValueError as ve:
-        print(f"[API] /risk ValueError address={address} chain={chain} -> {ve}")
+        log.warning("/risk ValueError address=%s chain=%s -> %s", address, chain, ve)
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
-        print(f"[API] /risk ERROR address={address} chain={chain} -> {e}")
+        log.error("/risk ERROR address=%s chain=%s -> %s", address, chain, e)
         raise HTTPException(status_code=400, detail=str(e))
 
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 class BatchJob(BaseModel):
     chain: str = "eth"
     addresses: List[str]
-    concurrency: int = 2
+    concurrency: Optional[int] = None   # ceiling for this request; None = adaptive up to CONCURRENCY_MAX
     etherscan_qps: float = 4.0
+    pin_block: Optional[bool] = None
+    trace: bool = False
 
 
-@api.post("/batch")
-def batch(job: BatchJob):
-    print(f"[API] POST /api/batch -> chain={job.chain} count={len(job.addresses)} conc={job.concurrency} qps={job.etherscan_qps}")
+def _check_job(job: BatchJob, route: str):
     if job.chain not in ("eth", "bsc"):
-        print("[API] /batch error: invalid chain")
+        log.warning("%s error: invalid chain", route)
         raise HTTPException(status_code=400, detail="chain must be 'eth' or 'bsc'")
     if not job.addresses:
-        print("[API] /batch error: empty addresses")
+        log.warning("%s error: empty addresses", route)
         raise HTTPException(status_code=400, detail="addresses list is empty")
 
+
+def _job_concurrency(job: BatchJob) -> int:
+    # Coroutines, not threads: concurrency is only a cap on analyses in flight; below it the
+    # chain's adaptive limit (shared with every other scan in this process) decides
+    return max(1, min(API_BATCH_MAX_CONCURRENCY, job.concurrency or default_ceiling()))
+
+
+async def _prefetch_ages(job: BatchJob, route: str, addresses: Optional[List[str]] = None):
+    # Creation info for the whole job in a few multi-address explorer calls (best effort)
     try:
-        set_default_qps(job.etherscan_qps)
-        print(f"[API] /batch rate limit set: {job.etherscan_qps} req/s")
+        await prefetch_contract_ages_async(job.chain, job.addresses if addresses is None else addresses)
     except Exception as e:
-        print("[API] /batch rate limit set FAIL:", e)
+        log.warning("%s age prefetch failed, falling back to per-token lookups: %s", route, e)
+
+
+async def _work(job: BatchJob, addr: str) -> dict:
+    """One batch item: the analysis, or {chain, address, error}."""
+    log.debug("[WORK] Start %s", addr)
+    try:
+        res = await _analyze(job.chain, addr, job.pin_block, job.trace)
+        log.debug("[WORK] OK %s score=%s tier=%s", addr, res.get('score'), res.get('risk_tier'))
+        return res
+    except Exception as e:
+        log.warning("[WORK] FAIL %s -> %s", addr, e)
+        return {"chain": job.chain, "address": addr, "error": str(e)}
+
+
+@api.post("/batch")
+async def batch(job: BatchJob):
+    log.info("POST /api/batch -> chain=%s count=%s conc=%s qps=%s", job.chain, len(job.addresses), job.concurrency, job.etherscan_qps)
+    _check_job(job, "/batch")
+
+    # This job's own explorer budget, queued behind interactive /risk calls; nothing global changes
+    with rate_budget(job.etherscan_qps, lane="batch"):
+        return await _run_batch(job)
+
+
+async def _run_batch(job: BatchJob) -> dict:
+    await _prefetch_ages(job, "/batch")
 
     out = []
+    sem = asyncio.Semaphore(_job_concurrency(job))
+    limit = concurrency_limit(job.chain)
 
-    def work(addr: str):
-        print(f"[API][WORK] Start {addr}")
-        try:
-            res = analyze_token(job.chain, addr)
-            print(f"[API][WORK] OK {addr} score={res.get('score')} tier={res.get('risk_tier')}")
-            return res
-        except Exception as e:
-            print(f"[API][WORK] FAIL {addr} -> {e}")
-            return {"chain": job.chain, "address": addr, "error": str(e)}
+    async def work(addr: str):
+        async with sem, limit.slot():
+            return await _work(job, addr)
 
     try:
-        with ThreadPoolExecutor(max_workers=max(1, min(8, job.concurrency))) as ex:
-            futs = {ex.submit(work, a): a for a in job.addresses}
-            for fut in as_completed(futs):
-                out.append(fut.result())
-        print(f"[API] /batch completed -> {len(out)} results")
+        for fut in asyncio.as_completed([work(a) for a in job.addresses]):
+            out.append(await fut)
+        log.info("/batch completed -> %s results", len(out))
     except Exception as e:
-        print("[API] /batch thread pool error:", e)
+        log.error("/batch error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
     return {"count": len(out), "results": out}
 
 
+class _BatchProgress:
+    """Counters behind the progress frames of one streamed batch."""
+
+    def __init__(self, total: int, chain: str, ceiling: int):
+        self.total = total
+        self.limit = concurrency_limit(chain)
+        self.ceiling = ceiling
+        self.done = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.started = time.monotonic()
+
+    def frame(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        eta = elapsed / self.done * (self.total - self.done) if self.done else None
+        return {"done": self.done, "failed": self.failed, "in_flight": self.in_flight,
+                "limit": min(self.limit.limit, self.ceiling), "total": self.total, "elapsed_s": round(elapsed, 1),
+                "eta_s": round(eta, 1) if eta is not None else None}
+
+
+_PREFETCH_PAGE = 100   # addresses per contract-age prefetch while a streamed batch runs
+
+
+async def _prefetch_ahead(job: BatchJob):
+    # Page by page beside the workers, never before them: the first result must not wait for
+    # ages of the whole list. The first addresses go to the workers at once, so start after them.
+    addrs = job.addresses[_job_concurrency(job):]
+    for i in range(0, len(addrs), _PREFETCH_PAGE):
+        await _prefetch_ages(job, "/batch/stream", addrs[i:i + _PREFETCH_PAGE])
+
+
+async def _feed_batch(job: BatchJob, out: asyncio.Queue, progress: _BatchProgress):
+    """Run the job with a pool of workers, handing each result to out as it completes."""
+    prefetch = asyncio.create_task(_prefetch_ahead(job))
+    try:
+        addrs = iter(job.addresses)   # shared by the workers; only the event loop touches it
+
+        async def worker():
+            for addr in addrs:
+                async with progress.limit.slot():
+                    progress.in_flight += 1
+                    try:
+                        res = await _work(job, addr)
+                    finally:
+                        progress.in_flight -= 1
+                progress.done += 1
+                progress.failed += 1 if res.get("error") else 0
+                await out.put(res)    # bounded: a slow reader pauses the workers
+
+        await asyncio.gather(*(worker() for _ in range(_job_concurrency(job))))
+    finally:
+        prefetch.cancel()
+        if not asyncio.current_task().cancelling():   # cancelled = nobody is reading anymore
+            await out.put(None)
+
+
+def _frame(fmt: str, kind: str, payload: dict) -> str:
+    data = json.dumps(jsonable_encoder({"type": kind, **payload}), default=str)
+    if fmt == "sse":
+        return f"event: {kind}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+async def _stream_batch(job: BatchJob, fmt: str):
+    progress = _BatchProgress(len(job.addresses), job.chain, _job_concurrency(job))
+    out: asyncio.Queue = asyncio.Queue(maxsize=2 * _job_concurrency(job))
+    # The feeder task copies this context: the job's explorer budget, behind interactive calls
+    with rate_budget(job.etherscan_qps, lane="batch"):
+        feeder = asyncio.create_task(_feed_batch(job, out, progress))
+    try:
+        yield _frame(fmt, "start", {"chain": job.chain, "total": progress.total})
+        next_progress = time.monotonic() + API_STREAM_PROGRESS_SECONDS
+        while True:
+            try:
+                res = await asyncio.wait_for(out.get(), timeout=max(0.0, next_progress - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            else:
+                if res is None:
+                    break
+                yield _frame(fmt, "result", {"result": res})
+            if time.monotonic() >= next_progress:
+                yield _frame(fmt, "progress", progress.frame())
+                next_progress = time.monotonic() + API_STREAM_PROGRESS_SECONDS
+        try:
+            await feeder
+        except Exception as e:
+            log.error("/batch/stream error: %s", e)
+            yield _frame(fmt, "error", {"detail": str(e)})
+        yield _frame(fmt, "end", progress.frame())
+        log.info("/batch/stream completed -> %s results (%s failed)", progress.done, progress.failed)
+    finally:
+        # Client went away (or we are done): stop the remaining analyses
+        if not feeder.done():
+            log.info("/batch/stream closed early after %s/%s results", progress.done, progress.total)
+            feeder.cancel()
+
+
+@api.post("/batch/stream")
+async def batch_stream(job: BatchJob, format: str = Query(default="ndjson", pattern="^(ndjson|sse)$")):
+    """
+    /api/batch, streamed: one frame per result as soon as it completes, plus progress frames
+    ({done, failed, in_flight, limit, total, elapsed_s, eta_s}) every API_STREAM_PROGRESS_SECONDS,
+    limit being the chain's current adaptive concurrency.
+    NDJSON (one JSON object per line) or Server-Sent Events; every frame has a "type":
+    start | result | progress | error | end.
+    """
+    log.info("POST /api/batch/stream -> chain=%s count=%s conc=%s qps=%s format=%s",
+             job.chain, len(job.addresses), job.concurrency, job.etherscan_qps, format)
+    _check_job(job, "/batch/stream")
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(_stream_batch(job, format), media_type=media_type,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+_UPLOAD_CHUNK = 1000   # addresses written to the job store per transaction while an upload streams in
+
+
+def _job_store():
+    store = get_job_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="background jobs are unavailable (job store can't be opened)")
+    return store
+
+
+def _line_addresses(line: str) -> List[str]:
+    """Addresses on one uploaded line (comma / space separated, '#' comments), checksummed when valid."""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return []
+    out = []
+    for raw in re.split(r"[\s,;]+", line):
+        if raw:
+            try:
+                out.append(normalize_evm_address(raw))
+            except ValueError:
+                out.append(raw)   # kept: it fails in the scan with the reason, like /api/batch
+    return out
+
+
+async def _uploaded_addresses(request: Request):
+    """Address chunks from a plain-text request body, parsed as it streams in."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    tail, chunk = "", []
+    async for data in request.stream():
+        lines = (tail + decoder.decode(data)).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            chunk.extend(_line_addresses(line))
+            if len(chunk) >= _UPLOAD_CHUNK:
+                yield chunk
+                chunk = []
+    chunk.extend(_line_addresses(tail + decoder.decode(b"", final=True)))
+    if chunk:
+        yield chunk
+
+
+async def _json_addresses(job: BatchJob):
+    for i in range(0, len(job.addresses), _UPLOAD_CHUNK):
+        yield [a for raw in job.addresses[i:i + _UPLOAD_CHUNK] for a in _line_addresses(raw)]
+
+
+def _job_view(job: dict) -> dict:
+    view = {k: job[k] for k in ("id", "chain", "status", "total", "done", "failed", "error",
+                                "created_at", "started_at", "finished_at")}
+    view["options"] = job["options"]
+    view["pending"] = job["total"] - job["done"]
+    view["rate_per_s"] = view["eta_s"] = None
+    if job["status"] == "running" and job["resumed_at"]:
+        elapsed = time.time() - job["resumed_at"]
+        done = job["done"] - job["resumed_done"]
+        if done > 0 and elapsed > 0:
+            view["rate_per_s"] = round(done / elapsed, 2)
+            view["eta_s"] = round(view["pending"] / (done / elapsed), 1)
+    return view
+
+
+@api.post("/jobs", status_code=202)
+async def create_job(request: Request, chain: str = Query(default="eth", pattern="^(eth|bsc)$"),
+                     concurrency: Optional[int] = Query(default=None, ge=1), etherscan_qps: float = Query(default=4.0, gt=0),
+                     pin_block: Optional[bool] = Query(default=None)):
+    """
+    Queue a background scan and return its id at once. Body: the /api/batch JSON, or a plain-text
+    address file (one or more addresses per line; options in the query string) that is read as
+    it streams in, e.g. curl --data-binary @tokens.txt -H 'Content-Type: text/plain' '/api/jobs?chain=bsc&concurrency=16'
+    """
+    store = _job_store()
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            job = BatchJob.model_validate(await request.json())
+        except (ValueError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        _check_job(job, "/jobs")
+        chain, concurrency, etherscan_qps, pin_block = job.chain, job.concurrency, job.etherscan_qps, job.pin_block
+        chunks = _json_addresses(job)
+    else:
+        chunks = _uploaded_addresses(request)
+
+    job_id = await asyncio.to_thread(store.create, chain, {"concurrency": concurrency, "etherscan_qps": etherscan_qps,
+                                                           "pin_block": pin_block})
+    received = total = 0
+    try:
+        async for chunk in chunks:
+            received += len(chunk)
+            total += await asyncio.to_thread(store.add_addresses, job_id, chunk)
+            if total > JOBS_MAX_ADDRESSES:
+                raise HTTPException(status_code=413, detail=f"more than JOBS_MAX_ADDRESSES={JOBS_MAX_ADDRESSES} addresses")
+        if not total:
+            raise HTTPException(status_code=400, detail="addresses list is empty")
+    except BaseException as e:
+        await asyncio.to_thread(store.fail, job_id, getattr(e, "detail", None) or f"upload interrupted: {e!r}")
+        raise
+    await asyncio.to_thread(store.seal, job_id)
+    log.info("POST /api/jobs -> %s chain=%s count=%s (+%s duplicates) conc=%s qps=%s",
+             job_id, chain, total, received - total, concurrency, etherscan_qps)
+    if _RUNNER is not None:
+        _RUNNER.wake()
+    return {"id": job_id, "status": "queued", "total": total, "duplicates": received - total,
+            "url": f"/api/jobs/{job_id}"}
+
+
+@api.get("/jobs")
+async def list_jobs(limit: int = Query(default=50, ge=1, le=500)):
+    store = _job_store()
+    return {"jobs": [_job_view(j) for j in await asyncio.to_thread(store.list, limit)]}
+
+
+@api.get("/jobs/{job_id}")
+async def get_job(job_id: str, after: int = Query(default=0, ge=0), limit: int = Query(default=100, ge=0, le=1000),
+                  only: Optional[str] = Query(default=None, pattern="^(done|failed)$")):
+    """
+    Progress plus one page of results in completion order. Poll with after=<next> to get only
+    results that finished since the last call; only=failed lists the errors.
+    """
+    store = _job_store()
+    job = await asyncio.to_thread(store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="no such job")
+    page = await asyncio.to_thread(store.results, job_id, after, limit, only) if limit else []
+    return {"job": _job_view(job), "results": [r for _, r in page],
+            "next": page[-1][0] if page else after}
+
+
+@api.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    store = _job_store()
+    if not await asyncio.to_thread(store.cancel, job_id):
+        job = await asyncio.to_thread(store.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="no such job")
+        raise HTTPException(status_code=409, detail=f"job is already {job['status']}")
+    log.info("POST /api/jobs/%s/cancel", job_id)
+    return {"id": job_id, "status": "cancelled"}
+
+
+# ---------- remote scan workers (worker_cli.py) ----------
+
+class LeaseRequest(BaseModel):
+    max_items: int = 50
+    host: Optional[str] = None
+
+
+class WorkerResult(BaseModel):
+    seq: int
+    result: dict
+    failed: bool = False
+
+
+class WorkerReport(BaseModel):
+    job_id: str
+    results: List[WorkerResult] = []
+    host: Optional[str] = None
+
+
+def _check_worker(request: Request):
+    # Workers can lease addresses and write results for any job: never open by accident
+    if not JOBS_WORKER_TOKEN:
+        if JOBS_WORKERS_INSECURE:
+            return
+        raise HTTPException(status_code=403, detail="remote workers are disabled: set JOBS_WORKER_TOKEN")
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {JOBS_WORKER_TOKEN}"):
+        raise HTTPException(status_code=401, detail="worker token required")
+
+
+@api.post("/workers/{name}/lease")
+async def worker_lease(name: str, body: LeaseRequest, request: Request):
+    """
+    Up to max_items addresses of the oldest job with unleased work, leased to this worker for
+    lease_seconds (renewed by every report). 204 when there is nothing to do.
+    """
+    _check_worker(request)
+    store = _job_store()
+    leased = await asyncio.to_thread(store.lease_next, name, max(1, min(body.max_items, 1000)), body.host)
+    if leased is None:
+        return Response(status_code=204)
+    job, items = leased
+    log.debug("worker %s leased %s items of job %s", name, len(items), job["id"])
+    return {"job": {"id": job["id"], "chain": job["chain"], "options": job["options"]},
+            "items": [{"seq": seq, "address": addr} for seq, addr in items],
+            "lease_seconds": JOBS_LEASE_SECONDS}
+
+
+@api.post("/workers/{name}/report")
+async def worker_report(name: str, body: WorkerReport, request: Request):
+    """Store results and renew the worker's leases on the job; active=false means drop the job's work."""
+    _check_worker(request)
+    store = _job_store()
+    results = [(r.seq, r.result, r.failed) for r in body.results]
+    active = await asyncio.to_thread(store.worker_report, name, body.job_id, results, body.host)
+    return {"active": active}
+
+
+@api.post("/workers/{name}/release")
+async def worker_release(name: str, request: Request):
+    """The worker is stopping: its unfinished addresses go back to the queue right away."""
+    _check_worker(request)
+    store = _job_store()
+    await asyncio.to_thread(store.release_worker, name)
+    log.info("worker %s released its leases", name)
+    return {"ok": True}
+
+
+@api.get("/workers")
+async def list_workers():
+    """Per-worker totals and throughput, plus the addresses each one holds right now."""
+    store = _job_store()
+    now = time.time()
+    out = []
+    for w in await asyncio.to_thread(store.workers):
+        span = w["last_seen"] - w["first_seen"]
+        w["rate_per_s"] = round(w["done"] / span, 2) if span > 0 else None
+        w["alive"] = now - w["last_seen"] <= JOBS_LEASE_SECONDS
+        out.append(w)
+    return {"workers": out}
+
+
 # Register API first, then static site at /
 app.include_router(api)
-print("[API] Router included.")
+log.debug("Router included.")
 
 # Safe static mount: prefer ./web, fall back to current dir if missing
 static_dir = Path("web")
 try:
     if static_dir.exists():
         app.mount("/", StaticFiles(directory=str(static_dir), html=True), name="web")
-        print("[API] Static mount: / -> web/")
+        log.debug("Static mount: / -> web/")
     else:
         app.mount("/", StaticFiles(directory=".", html=True), name="web")
-        print("[API] ⚠️ web/ not found; mounted current directory '.' instead.")
+        log.warning("web/ not found; mounted current directory '.' instead.")
 except Exception as e:
-    print("[API] Static mount FAILED:", e)
+    log.error("Static mount FAILED: %s", e)
@@ -1,11 +1,38 @@
 # backend/chains.py
-# Purpose: Chain config + web3 factory (Web3 v7). Injects POA middleware for BSC.
+# Purpose: Chain config + pooled web3 client registry (Web3 v7). Injects POA middleware for BSC.
+#
+# Clients are built once per chain and shared by every thread in the process:
+# one keep-alive requests.Session (sized by RPC_POOL_SIZE) per chain, and the
+# chain id is verified once when the client is created, never per call.
+# Each chain may list several endpoints; requests are routed by RpcRouter
+# (backend/utils/rpc_router.py) with failover and optional hedged reads.
+#
+# The asyncio pipeline gets an AsyncWeb3 per chain (and per event loop) via
+# get_async_w3_for_chain(); it posts through an aiohttp session but shares the
+# sync client's RpcRouter, so endpoint health is tracked once.
 
+import asyncio
 import os
-from web3 import Web3
+import threading
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from web3 import AsyncWeb3, Web3
 from web3.middleware.proof_of_authority import ExtraDataToPOAMiddleware
+from web3.providers.rpc import AsyncHTTPProvider
+
+from backend.utils.callstats import record_rpc_call
+from backend.utils.log import get_logger
+from backend.utils.metrics import endpoint_label
+from backend.utils.rpc_router import RpcRouter
+from backend.utils.trace import annotate, span
 
-print("[CHAINS] module loaded (web3 v7)")
+log = get_logger("CHAINS")
+log.debug("module loaded (web3 v7)")
 
 # One Etherscan V2 base works for multi-chain keys
 EXPLORER_V2_BASE = "https://api.etherscan.io/v2/api"
@@ -39,35 +66,290 @@ CHAINS = {
     },
 }
 
-def get_w3_for_chain(chain_key: str) -> Web3:
-    print(f"[CHAINS] get_w3_for_chain({chain_key})")
-    if chain_key not in CHAINS:
-        raise ValueError(f"Unknown chain: {chain_key}")
+# Connection pool sizing (per chain). Should be >= the number of worker threads
+# that share a client (batch concurrency, FastAPI threadpool).
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", "32"))
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "30"))
+
+# Used only when WEB3_PROVIDER_BSC is unset (several, so the router can fail over)
+BSC_PUBLIC_RPCS = [
+    "https://bsc-dataseed.binance.org",
+    "https://bsc-dataseed1.defibit.io",
+    "https://bsc-dataseed1.ninicoin.io",
+]
+
+_CLIENTS: Dict[str, Web3] = {}
+_CHAIN_IDS: Dict[str, int] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+# loop -> {chain_key: AsyncWeb3}; aiohttp sessions are bound to the loop that created them
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncWeb3]]" = weakref.WeakKeyDictionary()
+
+
+class PooledHTTPProvider(Web3.HTTPProvider):
+    """
+    HTTPProvider that posts through one shared keep-alive session and routes each
+    request across the chain's endpoints (RpcRouter: health scoring, failover,
+    optional hedging). The stock provider caches a session per thread, so every
+    executor worker would open its own connections. Once the chain id is verified,
+    eth_chainId is answered locally.
+    """
+
+    def __init__(self, endpoint_uris: List[str], session: requests.Session, **kwargs):
+        super().__init__(endpoint_uris[0], **kwargs)
+        self.endpoint_uris = list(endpoint_uris)
+        self.router = RpcRouter(
+            self.endpoint_uris, session, timeout=self._request_kwargs.get("timeout", RPC_TIMEOUT),
+            headers=self.get_request_headers(), max_concurrency=RPC_POOL_SIZE,
+        )
+        self.verified_chain_id: Optional[int] = None
+
+    def __str__(self) -> str:
+        return f"RPC connection {', '.join(e.label for e in self.router.endpoints)}"
+
+    def make_request(self, method, params):
+        if method == "eth_chainId" and self.verified_chain_id is not None:
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(self.verified_chain_id)}
+        return super().make_request(method, params)
+
+    def post_raw(self, request_data: bytes, method: str = "batch") -> bytes:
+        """POST an already-encoded JSON-RPC body (single or array) via the endpoint router."""
+        record_rpc_call(method)
+        with span(f"rpc {method}", kind="rpc", bytes_out=len(request_data)):
+            raw = self.router.post(request_data)
+            annotate(bytes_in=len(raw))
+            return raw
+
+    def _make_request(self, method, request_data: bytes) -> bytes:
+        return self.post_raw(request_data, method)
+
+    def make_batch_request(self, batch_requests):
+        raw = self.post_raw(self.encode_batch_rpc_request(batch_requests))
+        response = self.decode_rpc_response(raw)
+        if isinstance(response, list):
+            response.sort(key=lambda r: r.get("id", 0))
+        return response
+
+
+class AsyncPooledHTTPProvider(AsyncHTTPProvider):
+    """
+    Async twin of PooledHTTPProvider: one aiohttp session (connection pool of
+    RPC_POOL_SIZE) per chain, routed by the sync client's RpcRouter.
+    """
+
+    def __init__(self, router: RpcRouter, session: aiohttp.ClientSession, chain_id: int, **kwargs):
+        super().__init__(router.endpoints[0].url, **kwargs)
+        self.router = router
+        self.session = session
+        self.verified_chain_id = chain_id
+
+    def __str__(self) -> str:
+        return f"Async RPC connection {', '.join(e.label for e in self.router.endpoints)}"
+
+    async def make_request(self, method, params):
+        if method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(self.verified_chain_id)}
+        raw = await self.post_raw(self.encode_rpc_request(method, params), method)
+        return self.decode_rpc_response(raw)
+
+    async def post_raw(self, request_data: bytes, method: str = "batch") -> bytes:
+        """POST an already-encoded JSON-RPC body (single or array) via the endpoint router."""
+        record_rpc_call(method)
+        with span(f"rpc {method}", kind="rpc", bytes_out=len(request_data)):
+            raw = await self.router.post_async(self.session, request_data)
+            annotate(bytes_in=len(raw))
+            return raw
+
+    async def _make_request(self, method, request_data: bytes) -> bytes:
+        return await self.post_raw(request_data, method)
+
+    async def make_batch_request(self, batch_requests):
+        raw = await self.post_raw(self.encode_batch_rpc_request(batch_requests))
+        response = self.decode_rpc_response(raw)
+        if isinstance(response, list):
+            response.sort(key=lambda r: r.get("id", 0))
+        return response
+
+    async def disconnect(self) -> None:
+        await self.session.close()
+
+
+def _build_session(pool_size: int) -> requests.Session:
+    """Keep-alive session with a bounded connection pool and connect-level retries."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=max(1, pool_size),
+        max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 
+def _resolve_rpc_urls(chain_key: str) -> List[str]:
+    """
+    Endpoints from the chain's env var; several may be given, separated by commas or
+    whitespace (e.g. WEB3_PROVIDER_ETH="https://a,https://b").
+    """
     cfg = CHAINS[chain_key]
-    rpc = os.getenv(cfg["rpc_env"]) or (os.getenv("WEB3_PROVIDER") if chain_key == "eth" else "")
-    rpc = (rpc or "").strip().rstrip("\r")
+    raw = os.getenv(cfg["rpc_env"]) or (os.getenv("WEB3_PROVIDER") if chain_key == "eth" else "")
+    urls = (raw or "").replace(",", " ").split()
+    urls = [u for u in urls if u and u not in {"https://", "http://"}]
 
-    if not rpc or rpc in {"https://", "http://"}:
-        if chain_key == "bsc":
-            rpc = "https://bsc-dataseed.binance.org"
-            print(f"[CHAINS] Using default BSC RPC: {rpc}")
-        else:
-            raise ValueError(f"Missing/invalid RPC URL for {chain_key}. Set {cfg['rpc_env']} in .env")
+    if not urls:
+        if chain_key == "bsc" and BSC_PUBLIC_RPCS:
+            log.warning("%s not set; using PUBLIC BSC endpoints %s (rate-limited, set your own RPC for production)",
+                        cfg["rpc_env"], BSC_PUBLIC_RPCS)
+            return list(BSC_PUBLIC_RPCS)
+        raise ValueError(f"Missing/invalid RPC URL for {chain_key}. Set {cfg['rpc_env']} in .env")
+    return list(dict.fromkeys(urls))
 
-    print(f"[CHAINS] HTTPProvider -> {rpc}")
-    w3 = Web3(Web3.HTTPProvider(rpc, request_kwargs={"timeout": 30}))
+
+def _verify_endpoints(chain_key: str, urls: List[str], session: requests.Session) -> Tuple[List[str], List[str]]:
+    """
+    Check eth_chainId on every endpoint once. Endpoints on the wrong chain are dropped;
+    unreachable ones are kept but returned separately so the router starts them ejected.
+    Returns (endpoints_to_use, unreachable).
+    """
+    expected = CHAINS[chain_key]["chainid"]
+    keep: List[str] = []
+    unreachable: List[str] = []
+    verified = 0
+    for url in urls:
+        try:
+            resp = session.post(url, json={"jsonrpc": "2.0", "id": 1, "method": "eth_chainId", "params": []},
+                                timeout=RPC_TIMEOUT)
+            resp.raise_for_status()
+            cid = int(resp.json()["result"], 16)
+        except Exception as e:
+            # Class name only: request errors repeat the URL, key included
+            log.warning("%s endpoint unreachable at startup: %s (%s)", chain_key, endpoint_label(url),
+                        e.__class__.__name__)
+            keep.append(url)
+            unreachable.append(url)
+            continue
+        if cid != expected:
+            log.error("dropping %s: reports chainId=%s, expected %s", endpoint_label(url), cid, expected)
+            continue
+        verified += 1
+        keep.append(url)
+    if not verified:
+        raise ValueError(f"No RPC endpoint for {chain_key} answered with chainId={expected}")
+    return keep, unreachable
+
+
+def _build_w3(chain_key: str) -> Web3:
+    cfg = CHAINS[chain_key]
+    session = _build_session(RPC_POOL_SIZE)
+    urls, unreachable = _verify_endpoints(chain_key, _resolve_rpc_urls(chain_key), session)
+
+    log.info("PooledHTTPProvider -> %s (pool=%s, timeout=%ss)", [endpoint_label(u) for u in urls], RPC_POOL_SIZE,
+             RPC_TIMEOUT)
+    provider = PooledHTTPProvider(
+        urls,
+        session=session,
+        request_kwargs={"timeout": RPC_TIMEOUT},
+    )
+    for url in unreachable:
+        provider.router.eject(url)
+    w3 = Web3(provider)
 
     # Inject POA middleware for PoA-like chains (BSC, etc.)
     if cfg["chainid"] in (56, 97):
         try:
             w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
-            print(f"[CHAINS] POA middleware injected (ExtraDataToPOAMiddleware) for {chain_key}")
+            log.debug("POA middleware injected (ExtraDataToPOAMiddleware) for %s", chain_key)
         except Exception as e:
-            print(f"[CHAINS] POA inject failed for {chain_key}: {e}")
+            log.error("POA inject failed for %s: %s", chain_key, e)
+
+    provider.verified_chain_id = cfg["chainid"]
+    _CHAIN_IDS[chain_key] = cfg["chainid"]
+    log.info("Connected chainId=%s endpoints=%d", cfg["chainid"], len(urls))
+    return w3
+
+
+def get_w3_for_chain(chain_key: str) -> Web3:
+    """Return the shared Web3 client for a chain, building it on first use (thread-safe)."""
+    w3 = _CLIENTS.get(chain_key)
+    if w3 is not None:
+        return w3
+    if chain_key not in CHAINS:
+        raise ValueError(f"Unknown chain: {chain_key}")
 
-    cid = w3.eth.chain_id
-    print(f"[CHAINS] Connected chainId={cid}")
+    with _CLIENTS_LOCK:
+        w3 = _CLIENTS.get(chain_key)
+        if w3 is None:
+            log.debug("get_w3_for_chain(%s) -> building client", chain_key)
+            w3 = _build_w3(chain_key)
+            _CLIENTS[chain_key] = w3
+        return w3
+
+
+async def get_async_w3_for_chain(chain_key: str) -> AsyncWeb3:
+    """
+    AsyncWeb3 client for a chain on the running event loop. Endpoint resolution and
+    chain-id verification happen once, in the sync client (built off-loop on first use).
+    """
+    loop = asyncio.get_running_loop()
+    per_loop = _ASYNC_CLIENTS.get(loop)
+    if per_loop is None:
+        per_loop = _ASYNC_CLIENTS.setdefault(loop, {})
+    w3 = per_loop.get(chain_key)
+    if w3 is not None:
+        return w3
+
+    sync_w3 = _CLIENTS.get(chain_key) or await asyncio.to_thread(get_w3_for_chain, chain_key)
+    w3 = per_loop.get(chain_key)
+    if w3 is not None:
+        # Another task finished building it while we waited on the sync client
+        return w3
+
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=max(1, RPC_POOL_SIZE)),
+        timeout=aiohttp.ClientTimeout(total=RPC_TIMEOUT),
+    )
+    provider = AsyncPooledHTTPProvider(sync_w3.provider.router, session, _CHAIN_IDS[chain_key])
+    w3 = AsyncWeb3(provider)
+    if _CHAIN_IDS[chain_key] in (56, 97):
+        w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+    per_loop[chain_key] = w3
+    log.info("AsyncPooledHTTPProvider ready for %s (pool=%s)", chain_key, RPC_POOL_SIZE)
     return w3
 
-__all__ = ["EXPLORER_V2_BASE", "CHAINS", "get_w3_for_chain"]
+
+async def close_async_clients() -> None:
+    """Close the aiohttp sessions of the running loop's async clients (app shutdown)."""
+    per_loop = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), {})
+    for w3 in per_loop.values():
+        await w3.provider.disconnect()
+
+
+def get_chain_id(chain_key: str) -> int:
+    """Chain id verified when the client was built (no network call)."""
+    get_w3_for_chain(chain_key)
+    return _CHAIN_IDS[chain_key]
+
+
+def get_rpc_status() -> Dict[str, Any]:
+    """Per-endpoint health for every client built so far (latency, error rate, ejection)."""
+    return {key: w3.provider.router.status() for key, w3 in list(_CLIENTS.items())}
+
+
+def warm_up_clients(chain_keys: Optional[Iterable[str]] = None) -> Dict[str, Optional[str]]:
+    """
+    Build + verify clients up front (startup), so the first request doesn't pay for it.
+    Returns {chain_key: None | error string}; failures are reported, not raised.
+    """
+    status: Dict[str, Optional[str]] = {}
+    for key in (chain_keys or CHAINS.keys()):
+        try:
+            get_w3_for_chain(key)
+            status[key] = None
+        except Exception as e:
+            status[key] = str(e)
+            log.error("warm-up failed for %s: %s", key, e)
+    return status
+
+__all__ = ["EXPLORER_V2_BASE", "CHAINS", "PooledHTTPProvider", "AsyncPooledHTTPProvider", "get_w3_for_chain",
+           "get_async_w3_for_chain", "close_async_clients", "get_chain_id", "get_rpc_status", "warm_up_clients"]
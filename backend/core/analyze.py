@@ -2,26 +2,57 @@
 from __future__ import annotations
 
 import os
-from typing import Dict, Any, Optional, List, Tuple
+import threading
+import time
+from typing import Dict, Any, Callable, Optional, List, Tuple
 from web3 import Web3
 
 
-print("[ANALYZE] Module import start")
 
-from backend.chains import get_w3_for_chain, CHAINS
+from backend.chains import get_w3_for_chain, get_async_w3_for_chain, get_chain_id, CHAINS
 from backend.utils.addr import normalize_evm_address
-from backend.utils.ownership import check_ownership
-from backend.utils.abi_loader import fetch_contract_abi, scan_for_suspicious_functions
-from backend.utils.mint_check import check_mint_function
-from backend.utils.fee_check import read_fees
-from backend.utils.liquidity import get_deepest_v2_pool
-from backend.utils.context import get_contract_age_days
+from backend.utils.ownership import check_ownership, check_ownership_async
+from backend.utils.abi_features import analyze_abi
+from backend.utils.abi_loader import fetch_contract_abi, fetch_contract_abi_async
+from backend.utils.fee_check import read_fees, read_fees_async
+from backend.utils.liquidity import get_deepest_v2_pool, get_deepest_v2_pool_async
+from backend.utils.context import get_contract_age_days, get_contract_age_days_async
+from backend.core.dag import Step, run_steps, run_steps_async
 from backend.core.score import score_token
-from backend.utils.honeypot import probe_honeypot
+from backend.utils.honeypot import probe_honeypot, probe_honeypot_async
+from backend.utils.cache import TTLCache
+from backend.utils.callstats import call_accounting
+from backend.utils.keypool import KeyPool, explorer_api_key
+from backend.utils.log import get_logger
+from backend.utils.metrics import ANALYZE_INFLIGHT, ANALYZE_SECONDS, ANALYZE_STAGE_SECONDS, ANALYZE_TOTAL
+from backend.utils.trace import event, span, tracing
 _ENABLE_HONEYPOT = os.getenv("HONEYPOT_PROBE", "0").strip().lower() not in {"0","false","no","off",""}
 
+# Block-pinned snapshots: resolve one block up front and read every check at it
+_PIN_BLOCK = os.getenv("ANALYZE_PIN_BLOCK", "0").strip().lower() not in {"0","false","no","off",""}
+_CONFIRMATIONS = int(os.getenv("ANALYZE_CONFIRMATIONS", "0"))       # pin head-N (reorg safety)
+_HEAD_TTL = float(os.getenv("ANALYZE_HEAD_TTL", "1.0"))             # reuse the resolved head for N s
+_SNAPSHOT_TTL = float(os.getenv("ANALYZE_SNAPSHOT_TTL", "600"))
+_SNAPSHOT_MAX = int(os.getenv("ANALYZE_SNAPSHOT_MAX", "2048"))
 
-print("[ANALYZE] Imports OK")
+# Tiered step cache for unpinned analyses: each step's result is reused while its group is
+# fresh; stale steps (and steps depending on them) re-run and the score is recomputed.
+_FRESH_STATIC = float(os.getenv("ANALYZE_FRESH_STATIC", "3600"))    # abi, mint, context
+_FRESH_SLOW = float(os.getenv("ANALYZE_FRESH_SLOW", "300"))          # ownership, fees
+_FRESH_VOLATILE = float(os.getenv("ANALYZE_FRESH_VOLATILE", "0"))    # liquidity, honeypot (change every block)
+_STEP_FRESHNESS = {"abi": _FRESH_STATIC, "mint": _FRESH_STATIC, "context": _FRESH_STATIC,
+                   "ownership": _FRESH_SLOW, "fees": _FRESH_SLOW,
+                   "liquidity": _FRESH_VOLATILE, "honeypot": _FRESH_VOLATILE}
+
+_HEADS: Dict[str, Tuple[float, int, str]] = {}                      # chain -> (fetched_at, number, hash)
+_SNAPSHOTS = TTLCache("analyze_snapshot", ttl_seconds=_SNAPSHOT_TTL, max_entries=_SNAPSHOT_MAX)  # (chain, addr, number, hash)
+_SNAPSHOT_LOCK = threading.Lock()
+# (chain, addr) -> {step: (computed_at, result)}
+_STEP_RESULTS = TTLCache("analyze_steps", ttl_seconds=max(_STEP_FRESHNESS.values()),
+                         max_entries=int(os.getenv("ANALYZE_STEP_CACHE_MAX", "4096")))
+
+
+log = get_logger("ANALYZE")
 
 def _risk_tier(score: int) -> str:
     # Mirror the tier logic in score.py for safety
@@ -33,117 +64,323 @@ def _lp_pct_to_percent(lp_burn_pct: Optional[float]) -> Optional[float]:
         return None
     return lp_burn_pct * 100.0 if lp_burn_pct <= 1.0 else lp_burn_pct
 
-def analyze_token(chain_key: str, token_address: str) -> Dict[str, Any]:
-    print(f"[ANALYZE] analyze_token start chain={chain_key} addr={token_address}")
+def _resolve_snapshot_block(chain_key: str, w3: Web3) -> Tuple[int, str]:
+    """
+    Block to pin this analysis to: head minus ANALYZE_CONFIRMATIONS, as (number, hash).
+    The head is reused for ANALYZE_HEAD_TTL seconds so a batch scan resolves it once per block.
+    """
+    cached = _cached_head(chain_key)
+    if cached:
+        return cached
+    blk = w3.eth.get_block("latest")
+    if _CONFIRMATIONS > 0:
+        blk = w3.eth.get_block(max(0, blk["number"] - _CONFIRMATIONS))
+    return _store_head(chain_key, blk)
+
+async def _resolve_snapshot_block_async(chain_key: str, w3) -> Tuple[int, str]:
+    cached = _cached_head(chain_key)
+    if cached:
+        return cached
+    blk = await w3.eth.get_block("latest")
+    if _CONFIRMATIONS > 0:
+        blk = await w3.eth.get_block(max(0, blk["number"] - _CONFIRMATIONS))
+    return _store_head(chain_key, blk)
+
+def _cached_head(chain_key: str) -> Optional[Tuple[int, str]]:
+    with _SNAPSHOT_LOCK:
+        cached = _HEADS.get(chain_key)
+    if cached and time.monotonic() - cached[0] < _HEAD_TTL:
+        return cached[1], cached[2]
+    return None
+
+def _store_head(chain_key: str, blk) -> Tuple[int, str]:
+    number, bhash = int(blk["number"]), Web3.to_hex(blk["hash"])
+    with _SNAPSHOT_LOCK:
+        _HEADS[chain_key] = (time.monotonic(), number, bhash)
+    return number, bhash
+
+def _snapshot_get(key) -> Optional[Dict[str, Any]]:
+    hit = _SNAPSHOTS.get(key)
+    event("analyze_snapshot", kind="cache", cache_hit=hit is not None, block=key[2])
+    return hit
+
+def _snapshot_put(key, result: Dict[str, Any]) -> None:
+    _SNAPSHOTS.put(key, result)
+
+def analyze_token(chain_key: str, token_address: str, pin_block: Optional[bool] = None,
+                  trace: bool = False) -> Dict[str, Any]:
+    """
+    Full risk analysis of one token. With pin_block (default: ANALYZE_PIN_BLOCK) every
+    on-chain read is made at one resolved block, and the result is cached per
+    (chain, address, block number, block hash), so rescans within a block are free and
+    a reorged block never serves a stale entry.
+    With trace=True the result gets a "_trace" section: timed spans for every step,
+    RPC/explorer call and cache lookup (backend/utils/trace.py).
+    """
+    start = time.monotonic()
+    ANALYZE_INFLIGHT.inc(mode="sync")
+    outcome = "error"
+    try:
+        result = _analyze_token_entry(chain_key, token_address, pin_block, trace)
+        outcome = "ok"
+        return result
+    finally:
+        ANALYZE_INFLIGHT.dec(mode="sync")
+        ANALYZE_TOTAL.inc(mode="sync", outcome=outcome)
+        ANALYZE_SECONDS.observe(time.monotonic() - start, mode="sync")
+
+def _analyze_token_entry(chain_key: str, token_address: str, pin_block: Optional[bool],
+                         trace: bool = False) -> Dict[str, Any]:
+    pin = _PIN_BLOCK if pin_block is None else pin_block
+    # Count every RPC request this analysis sends (reported as result["rpc_calls"])
+    with tracing(trace) as tr, call_accounting() as rpc_calls:
+        with span("analyze_token", kind="analysis", chain=chain_key, address=token_address, pin=pin):
+            if pin:
+                token = normalize_evm_address(token_address)
+                with span("snapshot block", kind="step"):
+                    number, bhash = _resolve_snapshot_block(chain_key, get_w3_for_chain(chain_key))
+                key = (chain_key, token, number, bhash)
+                cached = _snapshot_get(key)
+                if cached is not None:
+                    log.debug("Snapshot cache hit: %s @ block %s", token, number)
+                    result = dict(cached)
+                else:
+                    result = _analyze_token(chain_key, token, block_identifier=number)
+                    _snapshot_put(key, dict(result))
+                result["snapshot"] = _snapshot_meta(number, bhash, cached is not None)
+            else:
+                result = _analyze_token(chain_key, token_address)
+    result["rpc_calls"] = dict(rpc_calls)
+    log.debug("RPC requests for %s: %s", result['address'], result['rpc_calls'])
+    if tr is not None:
+        result["_trace"] = tr.to_dict()
+    return result
+
+async def analyze_token_async(chain_key: str, token_address: str, pin_block: Optional[bool] = None,
+                              trace: bool = False) -> Dict[str, Any]:
+    """
+    analyze_token() on the event loop: AsyncWeb3 + aiohttp, independent checks run
+    concurrently, no thread is blocked on I/O. Same result shape, snapshot cache and
+    RPC accounting as the threaded path.
+    """
+    start = time.monotonic()
+    ANALYZE_INFLIGHT.inc(mode="async")
+    outcome = "error"
+    try:
+        result = await _analyze_token_async_entry(chain_key, token_address, pin_block, trace)
+        outcome = "ok"
+        return result
+    finally:
+        ANALYZE_INFLIGHT.dec(mode="async")
+        ANALYZE_TOTAL.inc(mode="async", outcome=outcome)
+        ANALYZE_SECONDS.observe(time.monotonic() - start, mode="async")
+
+async def _analyze_token_async_entry(chain_key: str, token_address: str, pin_block: Optional[bool],
+                                     trace: bool = False) -> Dict[str, Any]:
+    pin = _PIN_BLOCK if pin_block is None else pin_block
+    with tracing(trace) as tr, call_accounting() as rpc_calls:
+        with span("analyze_token", kind="analysis", chain=chain_key, address=token_address, pin=pin):
+            if pin:
+                token = normalize_evm_address(token_address)
+                with span("snapshot block", kind="step"):
+                    number, bhash = await _resolve_snapshot_block_async(chain_key, await get_async_w3_for_chain(chain_key))
+                key = (chain_key, token, number, bhash)
+                cached = _snapshot_get(key)
+                if cached is not None:
+                    log.debug("Snapshot cache hit: %s @ block %s", token, number)
+                    result = dict(cached)
+                else:
+                    result = await _analyze_token_async(chain_key, token, block_identifier=number)
+                    _snapshot_put(key, dict(result))
+                result["snapshot"] = _snapshot_meta(number, bhash, cached is not None)
+            else:
+                result = await _analyze_token_async(chain_key, token_address)
+    result["rpc_calls"] = dict(rpc_calls)
+    log.debug("RPC requests for %s: %s", result['address'], result['rpc_calls'])
+    if tr is not None:
+        result["_trace"] = tr.to_dict()
+    return result
+
+def _reusable_steps(chain_key: str, token: str, steps: List[Step], block_identifier) -> Tuple[Dict, Dict, Dict]:
+    """
+    (cache entry, seed results, {step: age s}) for step results that are still fresh.
+    Only "latest" analyses use the step cache: pinned ones have the snapshot cache.
+    """
+    if block_identifier != "latest" or _STEP_RESULTS.ttl <= 0:
+        return {}, {}, {}
+    entry = _STEP_RESULTS.get((chain_key, token)) or {}
+    now = time.monotonic()
+    seed, ages = {}, {}
+    for s in steps:   # dependency order: a step is reused only if its deps are
+        hit = entry.get(s.name)
+        if hit and now - hit[0] < _STEP_FRESHNESS.get(s.name, 0) and all(d in seed for d in s.deps):
+            seed[s.name] = hit[1]
+            ages[s.name] = round(now - hit[0], 1)
+            event(s.name, kind="step", reused=True, age_s=ages[s.name])
+    return entry, seed, ages
+
+def _remember_steps(chain_key: str, token: str, block_identifier, entry: Dict, seed: Dict,
+                    results: Dict[str, Any], failed: set) -> None:
+    """Store freshly computed step results (failed ones are dropped, reused ones keep their age)."""
+    if block_identifier != "latest" or _STEP_RESULTS.ttl <= 0:
+        return
+    now = time.monotonic()
+    updated = dict(entry)
+    for name, value in results.items():
+        if name in seed:
+            continue
+        if name in failed:
+            updated.pop(name, None)
+        else:
+            updated[name] = (now, value)
+    _STEP_RESULTS.put((chain_key, token), updated)
+
+def _run_analysis_steps(chain_key: str, token: str, block_identifier, steps: List[Step]) -> Dict[str, Any]:
+    entry, seed, ages = _reusable_steps(chain_key, token, steps, block_identifier)
+    failed: set = set()
+    results = run_steps(steps, seed=seed, failed=failed)
+    _remember_steps(chain_key, token, block_identifier, entry, seed, results, failed)
+    return _with_reused(_assemble_steps(chain_key, token, results), ages)
+
+async def _run_analysis_steps_async(chain_key: str, token: str, block_identifier, steps: List[Step]) -> Dict[str, Any]:
+    entry, seed, ages = _reusable_steps(chain_key, token, steps, block_identifier)
+    failed: set = set()
+    results = await run_steps_async(steps, seed=seed, failed=failed)
+    _remember_steps(chain_key, token, block_identifier, entry, seed, results, failed)
+    return _with_reused(_assemble_steps(chain_key, token, results), ages)
+
+def _with_reused(result: Dict[str, Any], ages: Dict[str, float]) -> Dict[str, Any]:
+    if ages:
+        result["reused_steps"] = ages   # step -> age (s) of the cached result merged into this one
+    return result
+
+def _snapshot_meta(number: int, bhash: str, cached: bool) -> Dict[str, Any]:
+    return {"block": number, "block_hash": bhash, "confirmations": _CONFIRMATIONS, "cached": cached}
+
+def _explorer_args(chain_key: str) -> Tuple["KeyPool | str", int, Optional[str]]:
+    """(api key pool, chainid, v1_host) for ABI fetches."""
+    api_key = (explorer_api_key("etherscan") if chain_key == "eth"
+               else (explorer_api_key("bscscan") or explorer_api_key("etherscan")))
+    return api_key, CHAINS[chain_key]["chainid"], CHAINS[chain_key].get("explorer_v1_host")
+
+def _on_error(label: str, fallback: Callable[[Exception], Any]) -> Callable[[Exception], Any]:
+    """Per-step error isolation: log and turn the exception into the step's result."""
+    def handle(e: Exception) -> Any:
+        log.warning("%s FAIL: %s", label, e)
+        return fallback(e)
+    return handle
+
+def _abi_result(abi: Optional[List[dict]], error: Optional[str] = None) -> Dict[str, Any]:
+    # One pass over the ABI for every name-based check (fees/honeypot reuse it via the same cache)
+    features = analyze_abi(abi) if abi is not None else None
+    flagged = list(features.suspicious) if features is not None else []
+    if features is not None:
+        log.debug("Suspicious scan -> %s", flagged)
+    return {"abi": abi, "verified": abi is not None, "error": error, "flagged": flagged, "features": features}
+
+def _mint_step(r: Dict[str, Any]) -> bool:
+    features = r["abi"].get("features")
+    if not r["abi"]["abi"] or features is None:
+        log.debug("Mint check skipped (no ABI)")
+        return False
+    has_mint = features.has_mint
+    log.debug("Mint check: %s", has_mint)
+    return has_mint
+
+def _assemble_steps(chain_key: str, token: str, r: Dict[str, Any]) -> Dict[str, Any]:
+    abi_info = r["abi"]
+    return _score_and_assemble(chain_key, token, r["ownership"], abi_info["verified"], abi_info["error"],
+                               abi_info["flagged"], r["mint"], r["fees"], r["liquidity"], r["context"], r["honeypot"])
+
+def _analyze_token(chain_key: str, token_address: str, block_identifier="latest") -> Dict[str, Any]:
+    log.debug("analyze_token start chain=%s addr=%s block=%s", chain_key, token_address, block_identifier)
 
     # 1) Normalize address
     try:
         token = normalize_evm_address(token_address)
-        print(f"[ANALYZE] Address normalized: {token}")
+        log.debug("Address normalized: %s", token)
     except Exception as e:
-        print(f"[ANALYZE] Address normalize FAIL: {e}")
+        log.error("Address normalize FAIL: %s", e)
         raise
 
     # 2) Web3 for chain
     try:
         w3 = get_w3_for_chain(chain_key)
-        print(f"[ANALYZE] Web3 ready. chainId={w3.eth.chain_id}")
+        log.debug("Web3 ready. chainId=%s", get_chain_id(chain_key))
     except Exception as e:
-        print(f"[ANALYZE] get_w3_for_chain FAIL: {e}")
+        log.error("get_w3_for_chain FAIL: %s", e)
         raise
 
-    # 3) Ownership
-    ownership = None
-    try:
-        ownership = check_ownership(w3, token)
-        print(f"[ANALYZE] Ownership OK: {ownership}")
-    except Exception as e:
-        ownership = f"error: {e}"
-        print(f"[ANALYZE] Ownership FAIL: {e}")
-
-    # 4) ABI fetch + scans
-    abi_verified = False
-    abi_error: Optional[str] = None
-    abi: Optional[List[dict]] = None
-    flagged_functions: List[str] = []
-    try:
-        api_key = (os.getenv("ETHERSCAN_API_KEY") if chain_key == "eth"
-                   else (os.getenv("BSCSCAN_API_KEY") or os.getenv("ETHERSCAN_API_KEY", "")))
-        chainid = CHAINS[chain_key]["chainid"]
-        v1_host = CHAINS[chain_key].get("explorer_v1_host")
-        print(f"[ANALYZE] ABI fetch params -> chainid={chainid} v1_host={v1_host} key={'yes' if api_key else 'no'}")
-        abi = fetch_contract_abi(token, api_key, chainid, v1_host)
-        abi_verified = True
-        print(f"[ANALYZE] ABI fetch OK. items={len(abi)}")
-        flagged_functions = scan_for_suspicious_functions(abi)
-        print(f"[ANALYZE] Suspicious scan -> {flagged_functions}")
-    except Exception as e:
-        abi_error = str(e)
-        abi_verified = False
-        print(f"[ANALYZE] ABI fetch/scan FAIL: {e}")
+    def ownership(r):
+        out = check_ownership(w3, token, block_identifier)
+        log.debug("Ownership OK: %s", out)
+        return out
 
-    # 5) Mint check (only if we have ABI)
-    has_mint = False
-    try:
-        if abi_verified and abi:
-            has_mint = check_mint_function(abi)
-            print(f"[ANALYZE] Mint check: {has_mint}")
-        else:
-            print("[ANALYZE] Mint check skipped (no ABI)")
-    except Exception as e:
-        print(f"[ANALYZE] Mint check FAIL: {e}")
+    def abi(r):
+        api_key, chainid, v1_host = _explorer_args(chain_key)
+        log.debug("ABI fetch params -> chainid=%s v1_host=%s key=%s", chainid, v1_host, 'yes' if api_key else 'no')
+        fetched = fetch_contract_abi(token, api_key, chainid, v1_host)
+        log.debug("ABI fetch OK. items=%s", len(fetched))
+        return _abi_result(fetched)
 
-    # 6) Fee getters (only if we have ABI)
-    fees: Dict[str, float] | Dict[str, Any] = {}
-    try:
-        if abi_verified and abi:
-            fees = read_fees(w3, token, abi) or {}
-            print(f"[ANALYZE] Fees OK: {fees}")
-        else:
-            print("[ANALYZE] Fees skipped (no ABI)")
-    except Exception as e:
-        fees = {"error": str(e)}
-        print(f"[ANALYZE] Fees FAIL: {e}")
+    def fees(r):
+        abi_ = r["abi"]["abi"]
+        if not abi_:
+            log.debug("Fees skipped (no ABI)")
+            return {}
+        out = read_fees(w3, token, abi_, block_identifier) or {}
+        log.debug("Fees OK: %s", out)
+        return out
 
-    # 7) Liquidity
-    lp_info = None
-    try:
-        lp_info = get_deepest_v2_pool(w3, chain_key, token)
-        print(f"[ANALYZE] Liquidity OK: keys={list(lp_info.keys()) if isinstance(lp_info, dict) else None}")
-    except Exception as e:
-        lp_info = None
-        print(f"[ANALYZE] Liquidity FAIL: {e}")
+    def liquidity(r):
+        out = get_deepest_v2_pool(w3, chain_key, token, block_identifier)
+        log.debug("Liquidity OK: keys=%s", list(out.keys()) if isinstance(out, dict) else None)
+        return out
 
-    # 8) Context
-    context = {}
-    try:
+    def context(r):
         ctx = get_contract_age_days(chain_key, token)
-        context = ctx if isinstance(ctx, dict) else {"age_days": ctx}
-        print(f"[ANALYZE] Context OK: age_days={context.get('age_days')}")
-    except Exception as e:
-        context = {"age_days": None, "error": str(e)}
-        print(f"[ANALYZE] Context FAIL: {e}")
+        out = ctx if isinstance(ctx, dict) else {"age_days": ctx}
+        log.debug("Context OK: age_days=%s", out.get('age_days'))
+        return out
 
-    # 9) Honeypot probe (best-effort)
-    hp = {"skipped": True, "reason": "disabled"}
-    try:
-        if _ENABLE_HONEYPOT:
-            base_addr = (lp_info or {}).get("base_address")
-            if base_addr and (abi is not None):
-                print(f"[ANALYZE] Honeypot probe -> base={base_addr}")
-                # NOTE: expected signature: probe_honeypot(w3, chain_key, token, base_token, abi)
-                hp = probe_honeypot(w3, chain_key, token, base_addr, abi)
-                print(f"[ANALYZE] Honeypot OK: {hp}")
-            else:
-                hp = {"skipped": True, "reason": "needs base pair + abi"}
-                print("[ANALYZE] Honeypot skipped (needs base pair + abi)")
-        else:
-            print("[ANALYZE] Honeypot skipped (disabled via HONEYPOT_PROBE)")
-    except Exception as e:
-        hp = {"error": str(e)}
-        print(f"[ANALYZE] Honeypot FAIL: {e}")
+    def honeypot(r):
+        # Best-effort; needs the deepest pair's base token + an ABI
+        if not _ENABLE_HONEYPOT:
+            log.debug("Honeypot skipped (disabled via HONEYPOT_PROBE)")
+            return {"skipped": True, "reason": "disabled"}
+        base_addr = (r["liquidity"] or {}).get("base_address")
+        abi_ = r["abi"]["abi"]
+        if not (base_addr and abi_ is not None):
+            log.debug("Honeypot skipped (needs base pair + abi)")
+            return {"skipped": True, "reason": "needs base pair + abi"}
+        log.debug("Honeypot probe -> base=%s", base_addr)
+        out = probe_honeypot(w3, chain_key, token, base_addr, abi_, block_identifier)
+        log.debug("Honeypot OK: %s", out)
+        return out
+
+    # 3) Steps as a DAG: ownership, ABI, liquidity and context start together;
+    #    mint/fees wait for the ABI, the honeypot probe for ABI + liquidity.
+    steps = _analysis_steps(ownership, abi, fees, liquidity, context, honeypot, _mint_step)
 
-    # 10) Score
+    # 4) Run (reusing fresh cached step results) and score
+    return _run_analysis_steps(chain_key, token, block_identifier, steps)
+
+def _analysis_steps(ownership, abi, fees, liquidity, context, honeypot, mint) -> List[Step]:
+    """The analysis graph (same for the threaded and asyncio pipelines)."""
+    return [
+        Step("ownership", ownership, on_error=_on_error("Ownership", lambda e: f"error: {e}")),
+        Step("abi", abi, on_error=_on_error("ABI fetch/scan", lambda e: _abi_result(None, str(e)))),
+        Step("mint", mint, deps=("abi",), on_error=_on_error("Mint check", lambda e: False)),
+        Step("fees", fees, deps=("abi",), on_error=_on_error("Fees", lambda e: {"error": str(e)})),
+        Step("liquidity", liquidity, on_error=_on_error("Liquidity", lambda e: None)),
+        Step("context", context, on_error=_on_error("Context", lambda e: {"age_days": None, "error": str(e)})),
+        Step("honeypot", honeypot, deps=("liquidity", "abi"),
+             on_error=_on_error("Honeypot", lambda e: {"error": str(e)})),
+    ]
+
+def _score_and_assemble(chain_key: str, token: str, ownership, abi_verified: bool, abi_error: Optional[str],
+                        flagged_functions: List[str], has_mint: bool, fees, lp_info, context, hp) -> Dict[str, Any]:
+    start = time.monotonic()
     try:
         usd_liq = (lp_info or {}).get("usd_liquidity_est") if isinstance(lp_info, dict) else None
         lp_burn_pct = _lp_pct_to_percent((lp_info or {}).get("lp_burn_pct") if isinstance(lp_info, dict) else None)
@@ -158,10 +395,12 @@ def analyze_token(chain_key: str, token_address: str) -> Dict[str, Any]:
             lp_burn_pct=lp_burn_pct,
             age_days=age_days,
         )
-        print(f"[ANALYZE] Score OK: score={score} tier={tier}")
+        log.debug("Score OK: score=%s tier=%s", score, tier)
     except Exception as e:
-        print(f"[ANALYZE] Score FAIL: {e}")
+        log.error("Score FAIL: %s", e)
         raise
+    finally:
+        ANALYZE_STAGE_SECONDS.observe(time.monotonic() - start, stage="score")
 
     result = {
         "chain": chain_key,
@@ -178,5 +417,45 @@ def analyze_token(chain_key: str, token_address: str) -> Dict[str, Any]:
         "score": int(score),
         "risk_tier": tier if isinstance(tier, str) else _risk_tier(int(score)),
     }
-    print(f"[ANALYZE] analyze_token done chain={chain_key} addr={token} score={result['score']} tier={result['risk_tier']}")
+    log.info("analyze_token done chain=%s addr=%s score=%s tier=%s", chain_key, token, result["score"], result["risk_tier"],
+             extra={"fields": {"chain": chain_key, "address": token, "score": result["score"], "tier": result["risk_tier"]}})
     return result
+
+async def _analyze_token_async(chain_key: str, token_address: str, block_identifier="latest") -> Dict[str, Any]:
+    log.debug("analyze_token_async start chain=%s addr=%s block=%s", chain_key, token_address, block_identifier)
+    token = normalize_evm_address(token_address)
+    w3 = await get_async_w3_for_chain(chain_key)
+
+    async def ownership(r):
+        return await check_ownership_async(w3, token, block_identifier)
+
+    async def abi(r):
+        fetched = await fetch_contract_abi_async(token, *_explorer_args(chain_key))
+        log.debug("ABI fetch OK. items=%s", len(fetched))
+        return _abi_result(fetched)
+
+    async def mint(r):
+        return _mint_step(r)
+
+    async def fees(r):
+        abi_ = r["abi"]["abi"]
+        return (await read_fees_async(w3, token, abi_, block_identifier) or {}) if abi_ else {}
+
+    async def liquidity(r):
+        return await get_deepest_v2_pool_async(w3, chain_key, token, block_identifier)
+
+    async def context(r):
+        ctx = await get_contract_age_days_async(chain_key, token)
+        return ctx if isinstance(ctx, dict) else {"age_days": ctx}
+
+    async def honeypot(r):
+        if not _ENABLE_HONEYPOT:
+            return {"skipped": True, "reason": "disabled"}
+        base_addr = (r["liquidity"] or {}).get("base_address")
+        abi_ = r["abi"]["abi"]
+        if not (base_addr and abi_ is not None):
+            return {"skipped": True, "reason": "needs base pair + abi"}
+        return await probe_honeypot_async(w3, chain_key, token, base_addr, abi_, block_identifier)
+
+    steps = _analysis_steps(ownership, abi, fees, liquidity, context, honeypot, mint)
+    return await _run_analysis_steps_async(chain_key, token, block_identifier, steps)
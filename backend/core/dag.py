@@ -0,0 +1,164 @@
+# backend/core/dag.py
+# Purpose: Run analysis steps as a small dependency graph with maximum concurrency.
+#
+#   steps = [
+#       Step("abi", lambda r: fetch_abi(...)),
+#       Step("fees", lambda r: read_fees(..., r["abi"]), deps=("abi",), on_error=lambda e: {"error": str(e)}),
+#   ]
+#   results = run_steps(steps)            # threads (shared pool)
+#   results = await run_steps_async(steps)  # same graph, coroutine steps
+#
+# Each step gets a dict of the results finished so far (at least its deps).
+# on_error turns a step's exception into its result, so one failing check never
+# sinks the others; without it the exception propagates to the caller.
+# seed= supplies results known up front (those steps don't run); failed= collects the
+# names of steps whose result came from on_error.
+# Thread steps run in a copy of the caller's contextvars (RPC accounting follows them).
+
+from __future__ import annotations
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+from backend.utils.metrics import ANALYZE_STAGE_SECONDS, track_executor
+from backend.utils.trace import annotate, span
+
+# Shared by every analyze_token call in the process; steps never submit into it
+# themselves, so nested use from batch worker threads can't deadlock.
+ANALYZE_STEP_WORKERS = int(os.getenv("ANALYZE_STEP_WORKERS", "32"))
+
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers=max(1, ANALYZE_STEP_WORKERS), thread_name_prefix="analyze-step")
+            track_executor("analyze-step", _POOL)
+        return _POOL
+
+
+class Step:
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Any], deps: Sequence[str] = (),
+                 on_error: Optional[Callable[[Exception], Any]] = None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.on_error = on_error
+
+    def __repr__(self) -> str:
+        return f"Step({self.name!r}, deps={self.deps})"
+
+
+def _validate(steps: Iterable[Step]) -> List[Step]:
+    """Unique names, known deps, no cycles. Returns the steps in a dependency-respecting order."""
+    by_name: Dict[str, Step] = {}
+    for s in steps:
+        if s.name in by_name:
+            raise ValueError(f"duplicate step {s.name!r}")
+        by_name[s.name] = s
+    for s in by_name.values():
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"step {s.name!r} depends on unknown {missing}")
+
+    ordered: List[Step] = []
+    state: Dict[str, int] = {}   # 1 = visiting, 2 = done
+
+    def visit(s: Step) -> None:
+        if state.get(s.name) == 2:
+            return
+        if state.get(s.name) == 1:
+            raise ValueError(f"dependency cycle at step {s.name!r}")
+        state[s.name] = 1
+        for d in s.deps:
+            visit(by_name[d])
+        state[s.name] = 2
+        ordered.append(s)
+
+    for s in by_name.values():
+        visit(s)
+    return ordered
+
+
+def _call(step: Step, done: Dict[str, Any], failed: Optional[Set[str]] = None) -> Any:
+    start = time.monotonic()
+    with span(step.name, kind="step"):
+        try:
+            return step.fn(done)
+        except Exception as e:
+            if step.on_error is None:
+                raise
+            annotate(error=f"{e.__class__.__name__}: {e}"[:200])
+            if failed is not None:
+                failed.add(step.name)
+            return step.on_error(e)
+        finally:
+            ANALYZE_STAGE_SECONDS.observe(time.monotonic() - start, stage=step.name)
+
+
+def run_steps(steps: Iterable[Step], executor: Optional[ThreadPoolExecutor] = None,
+              seed: Optional[Dict[str, Any]] = None, failed: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """Run thread steps as soon as their deps are done. Returns {step name: result}."""
+    results: Dict[str, Any] = dict(seed or {})
+    pending = [s for s in _validate(steps) if s.name not in results]
+    executor = executor or _pool()
+    running: Dict[Future, Step] = {}
+    try:
+        while pending or running:
+            ready = [s for s in pending if all(d in results for d in s.deps)]
+            for s in ready:
+                pending.remove(s)
+                ctx = contextvars.copy_context()
+                running[executor.submit(ctx.run, _call, s, dict(results), failed)] = s
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                results[running.pop(fut).name] = fut.result()
+    finally:
+        for fut in running:
+            fut.cancel()
+    return results
+
+
+async def run_steps_async(steps: Iterable[Step], seed: Optional[Dict[str, Any]] = None,
+                          failed: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """Coroutine-step variant of run_steps (every fn is an async function)."""
+    results: Dict[str, Any] = dict(seed or {})
+    ordered = [s for s in _validate(steps) if s.name not in results]
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(step: Step) -> Any:
+        for d in step.deps:
+            if d in tasks:   # seeded deps have no task
+                await tasks[d]
+        start = time.monotonic()
+        with span(step.name, kind="step"):
+            try:
+                value = await step.fn(dict(results))
+            except Exception as e:
+                if step.on_error is None:
+                    raise
+                annotate(error=f"{e.__class__.__name__}: {e}"[:200])
+                if failed is not None:
+                    failed.add(step.name)
+                value = step.on_error(e)
+            finally:
+                ANALYZE_STAGE_SECONDS.observe(time.monotonic() - start, stage=step.name)
+        results[step.name] = value
+        return value
+
+    # Created in dependency order, so every dep's task exists before it is awaited
+    for s in ordered:
+        tasks[s.name] = asyncio.ensure_future(run(s))
+    try:
+        await asyncio.gather(*tasks.values())
+    finally:
+        for t in tasks.values():
+            t.cancel()
+    return results
@@ -0,0 +1,165 @@
+# backend/core/jobs.py
+# Purpose: Background runner for batch jobs queued in backend/db/jobs.py (POST /api/jobs).
+#
+#   runner = JobRunner(get_job_store(), analyze)   # analyze(chain, address, pin_block) -> result dict
+#   runner.start()                                 # on the API's event loop
+#   runner.wake()                                  # a job was queued: don't wait for the next poll
+#   await runner.stop()                            # shutdown: running jobs go back to the queue
+#
+# Each of the JOBS_WORKERS loops leases one job at a time and scans it with at most the job's
+# concurrency in flight (below that, the chain's adaptive limit shared with /api/batch decides), leasing unfinished addresses from the store page by page (with the
+# contract-age prefetch per page), so a 100k-address job costs the same memory as a small one.
+# Remote workers (worker_cli.py) lease pages of the same job through the API meanwhile.
+# Every result is written as soon as it completes; a job that is cancelled, or whose lease was
+# lost, stops at the next lease renewal. The job's etherscan_qps is its own explorer budget in
+# the batch lane, like /api/batch.
+
+from __future__ import annotations
+import asyncio
+import os
+import socket
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from backend.db.jobs import JOBS_LEASE_SECONDS, JobStore
+from backend.utils.concurrency import concurrency_limit, default_ceiling
+from backend.utils.context import prefetch_contract_ages_async
+from backend.utils.log import get_logger
+from backend.utils.ratelimit import rate_budget
+
+log = get_logger("jobs")
+
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "1"))            # jobs run at once by this process (0 = none)
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "2"))  # how often idle workers look for jobs
+
+_PAGE = 200   # addresses leased from the store (and age-prefetched) at a time
+_RENEW_SECONDS = max(1.0, JOBS_LEASE_SECONDS / 3)
+
+Analyze = Callable[[str, str, Optional[bool]], Awaitable[Dict[str, Any]]]
+
+
+class JobRunner:
+    def __init__(self, store: JobStore, analyze: Analyze, workers: int = JOBS_WORKERS, max_concurrency: int = 256):
+        self.store = store
+        self.analyze = analyze
+        self.workers = workers
+        self.max_concurrency = max(1, max_concurrency)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._loops: List[asyncio.Task] = []
+        self._wake = asyncio.Event()
+
+    def start(self):
+        self._loops = [asyncio.create_task(self._loop()) for _ in range(max(0, self.workers))]
+        if self._loops:
+            log.info("job runner %s: %d worker(s)", self.owner, len(self._loops))
+
+    def wake(self):
+        self._wake.set()
+
+    async def stop(self):
+        for task in self._loops:
+            task.cancel()
+        await asyncio.gather(*self._loops, return_exceptions=True)
+        self._loops = []
+
+    async def _loop(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim, self.owner)
+            except Exception as e:
+                log.error("job claim failed: %s", e)
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOBS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        opts = job["options"]
+        log.info("job %s: %s on %s, %d/%d done, conc=%s qps=%s", job_id,
+                 "resuming" if job["done"] else "starting", job["chain"], job["done"], job["total"],
+                 opts.get("concurrency") or "auto", opts.get("etherscan_qps"))
+        # The scan task copies this context: the job's own explorer budget, behind interactive calls
+        with rate_budget(opts.get("etherscan_qps"), lane="batch"):
+            scan = asyncio.create_task(self._scan(job))
+        lease = asyncio.create_task(self._keep_lease(job_id, scan))
+        try:
+            await scan
+            if await asyncio.to_thread(self.store.complete, job_id, self.owner):
+                log.info("job %s: done", job_id)
+            else:
+                log.info("job %s: nothing left to lease, remote workers finish the rest", job_id)
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                # Shutting down: hand the job back so the next start (or another process) resumes it
+                await asyncio.to_thread(self.store.release, job_id, self.owner)
+                log.info("job %s: released on shutdown", job_id)
+                raise
+            log.info("job %s: stopped (cancelled or lease lost)", job_id)
+        except Exception as e:
+            log.error("job %s failed: %s", job_id, e)
+            await asyncio.to_thread(self.store.fail, job_id, str(e))
+        finally:
+            lease.cancel()
+
+    async def _keep_lease(self, job_id: str, scan: asyncio.Task):
+        while True:
+            await asyncio.sleep(_RENEW_SECONDS)
+            try:
+                ok = await asyncio.to_thread(self.store.renew, job_id, self.owner)
+            except Exception as e:
+                log.warning("job %s: lease renewal failed: %s", job_id, e)
+                continue
+            if not ok:
+                scan.cancel()
+                return
+
+    async def _scan(self, job: Dict[str, Any]):
+        job_id, chain = job["id"], job["chain"]
+        opts = job["options"]
+        pin_block = opts.get("pin_block")
+        queue: deque = deque()
+        lock = asyncio.Lock()
+        limit = concurrency_limit(chain)
+
+        async def next_item():
+            # Refill from the store when the current page runs out; workers keep their
+            # analyses in flight meanwhile, so one slow token never stalls the next page
+            async with lock:
+                if not queue:
+                    page = await asyncio.to_thread(self.store.lease_items, job_id, self.owner, _PAGE)
+                    if page:
+                        try:
+                            await prefetch_contract_ages_async(chain, [a for _, a in page])
+                        except Exception as e:
+                            log.warning("job %s: age prefetch failed, falling back to per-token lookups: %s", job_id, e)
+                        queue.extend(page)
+                return queue.popleft() if queue else None
+
+        async def worker():
+            while (item := await next_item()) is not None:
+                seq, addr = item
+                async with limit.slot():
+                    try:
+                        res, failed = await self.analyze(chain, addr, pin_block), False
+                    except Exception as e:
+                        log.debug("job %s: FAIL %s -> %s", job_id, addr, e)
+                        res, failed = {"chain": chain, "address": addr, "error": str(e)}, True
+                await asyncio.to_thread(self.store.finish_item, job_id, seq, res, failed)
+
+        concurrency = max(1, min(self.max_concurrency, int(opts.get("concurrency") or default_ceiling())))
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:   # one failed (store error): don't leave the others running
+                task.cancel()
+
+
+__all__ = ["JobRunner", "JOBS_WORKERS"]
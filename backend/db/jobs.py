@@ -0,0 +1,347 @@
+# backend/db/jobs.py
+# Purpose: Persistent SQLite queue for background batch jobs (POST /api/jobs): the job, its
+# addresses and every finished result, so a restart or a client disconnect loses nothing.
+#
+#   store = get_job_store()                           # None if the file can't be opened
+#   job_id = store.create("eth", {"concurrency": 8, "etherscan_qps": 4.0, "pin_block": None})
+#   store.add_addresses(job_id, ["0x...", ...])       # in chunks while an upload streams in
+#   store.seal(job_id)                                # input complete -> queued
+#   job = store.claim(owner)                          # a runner takes the oldest runnable job
+#   items = store.lease_items(job_id, owner, 200)     # [(seq, address)] nobody else is working on
+#   store.finish_item(job_id, seq, result, failed=False)
+#
+#   job, items = store.lease_next(worker, 50)         # remote workers (worker_cli.py): any job
+#   store.worker_report(worker, job_id, [(seq, result, failed), ...])   # store results + renew
+#
+# Work is handed out as item leases: a runner in an API process, or a remote worker, takes a
+# chunk of unfinished addresses for JOBS_LEASE_SECONDS and renews the lease while it works, so
+# several of them can share one job. Leases of a process that died simply run out and the
+# addresses are handed out again; the first result stored for an address wins.
+# A running job is also leased as a whole by one API runner (`heartbeat`), so a job interrupted
+# by a restart is picked up again. Same WAL / per-thread connection setup as the explorer store,
+# so several API processes can share one file.
+
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backend.utils.log import get_logger
+
+log = get_logger("jobs-db")
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH") or str(Path(__file__).resolve().parents[2] / "data" / "jobs.db")
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "30"))
+
+# uploading -> queued -> running -> done; cancelled / failed from any unfinished state
+ACTIVE = ("uploading", "queued", "running")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    chain        TEXT NOT NULL,
+    options_json TEXT NOT NULL,           -- {concurrency, etherscan_qps, pin_block}
+    status       TEXT NOT NULL,           -- uploading | queued | running | done | cancelled | failed
+    total        INTEGER NOT NULL DEFAULT 0,
+    done         INTEGER NOT NULL DEFAULT 0,   -- finished items, failed ones included
+    failed       INTEGER NOT NULL DEFAULT 0,
+    error        TEXT,
+    owner        TEXT,                    -- runner holding the lease
+    heartbeat    REAL,                    -- last lease renewal (wall clock)
+    created_at   REAL NOT NULL,
+    started_at   REAL,
+    resumed_at   REAL,                    -- start of the current run (ETA is measured from here)
+    resumed_done INTEGER NOT NULL DEFAULT 0,
+    finished_at  REAL
+);
+CREATE TABLE IF NOT EXISTS items (
+    job_id      TEXT NOT NULL,
+    seq         INTEGER NOT NULL,         -- input order
+    address     TEXT NOT NULL,
+    status      TEXT NOT NULL,            -- pending | done | failed
+    done_seq    INTEGER,                  -- completion order (result pages follow it)
+    result_json TEXT,
+    lease_owner TEXT,                     -- runner / worker scanning it right now
+    lease_until REAL,
+    PRIMARY KEY (job_id, seq),
+    UNIQUE (job_id, address)
+);
+CREATE INDEX IF NOT EXISTS items_pending ON items (job_id, status, seq);
+CREATE INDEX IF NOT EXISTS items_done ON items (job_id, done_seq);
+CREATE TABLE IF NOT EXISTS workers (
+    name       TEXT PRIMARY KEY,
+    host       TEXT,
+    first_seen REAL NOT NULL,
+    last_seen  REAL NOT NULL,
+    leases     INTEGER NOT NULL DEFAULT 0,
+    done       INTEGER NOT NULL DEFAULT 0,
+    failed     INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_JOB_COLUMNS = ("id", "chain", "options_json", "status", "total", "done", "failed", "error", "owner",
+                "heartbeat", "created_at", "started_at", "resumed_at", "resumed_done", "finished_at")
+
+
+def _job_dict(row: tuple) -> Dict[str, Any]:
+    job = dict(zip(_JOB_COLUMNS, row))
+    job["options"] = json.loads(job.pop("options_json"))
+    return job
+
+
+class JobStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    # ---- creating ----
+
+    def create(self, chain: str, options: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex[:16]
+        with self._conn() as conn:
+            conn.execute("INSERT INTO jobs (id, chain, options_json, status, created_at) VALUES (?, ?, ?, 'uploading', ?)",
+                         (job_id, chain, json.dumps(options), time.time()))
+        return job_id
+
+    def add_addresses(self, job_id: str, addresses: Iterable[str]) -> int:
+        """Append addresses (duplicates within the job are dropped); returns how many were new."""
+        with self._conn() as conn:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM items WHERE job_id=?", (job_id,)).fetchone()[0]
+            added = 0
+            for addr in addresses:
+                cur = conn.execute("INSERT OR IGNORE INTO items (job_id, seq, address, status) VALUES (?, ?, ?, 'pending')",
+                                   (job_id, seq + 1, addr))
+                if cur.rowcount:
+                    seq += 1
+                    added += 1
+            conn.execute("UPDATE jobs SET total = total + ? WHERE id=?", (added, job_id))
+        return added
+
+    def seal(self, job_id: str) -> bool:
+        """Input complete: the job may be run. False if it was cancelled meanwhile."""
+        with self._conn() as conn:
+            return conn.execute("UPDATE jobs SET status='queued' WHERE id=? AND status='uploading'",
+                                (job_id,)).rowcount == 1
+
+    def fail(self, job_id: str, error: str) -> None:
+        with self._conn() as conn:
+            conn.execute("UPDATE jobs SET status='failed', error=?, owner=NULL, finished_at=? WHERE id=? AND status IN (?, ?, ?)",
+                         (error, time.time(), job_id, *ACTIVE))
+
+    # ---- running ----
+
+    def claim(self, owner: str) -> Optional[Dict[str, Any]]:
+        """Lease the oldest queued job, or a running one whose lease expired; None if there is none."""
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # running jobs with a stale heartbeat: their runner died, or only remote workers had them;
+            # either way only while some of their addresses are not leased to anyone
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE (status='queued' OR (status='running' AND COALESCE(heartbeat, 0) < ?)) "
+                "AND EXISTS (SELECT 1 FROM items WHERE job_id=jobs.id AND status='pending' AND COALESCE(lease_until, 0) < ?) "
+                "ORDER BY created_at LIMIT 1", (now - JOBS_LEASE_SECONDS, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status='running', owner=?, heartbeat=?, started_at=COALESCE(started_at, ?), "
+                         "resumed_at=?, resumed_done=done WHERE id=?", (owner, now, now, now, row[0]))
+        return self.get(row[0])
+
+    def renew(self, job_id: str, owner: str) -> bool:
+        """Extend the job lease and owner's item leases; False once the job was cancelled or taken over."""
+        now = time.time()
+        with self._conn() as conn:
+            if conn.execute("UPDATE jobs SET heartbeat=? WHERE id=? AND owner=? AND status='running'",
+                            (now, job_id, owner)).rowcount != 1:
+                return False
+            self._renew_items(conn, job_id, owner, now)
+        return True
+
+    def release(self, job_id: str, owner: str) -> None:
+        """Give the job and owner's item leases back to the queue (this process is shutting down)."""
+        with self._conn() as conn:
+            conn.execute("UPDATE jobs SET status='queued', owner=NULL WHERE id=? AND owner=? AND status='running'",
+                         (job_id, owner))
+            conn.execute("UPDATE items SET lease_owner=NULL, lease_until=NULL WHERE job_id=? AND lease_owner=? AND status='pending'",
+                         (job_id, owner))
+
+    def complete(self, job_id: str, owner: str) -> bool:
+        """
+        owner has nothing left to lease: the job is done if every item has a result (True),
+        else the rest is still out with other workers.
+        """
+        with self._conn() as conn:
+            conn.execute("UPDATE jobs SET owner=NULL, status=CASE WHEN done >= total THEN 'done' ELSE status END, "
+                         "finished_at=CASE WHEN done >= total THEN ? ELSE finished_at END "
+                         "WHERE id=? AND owner=? AND status='running'", (time.time(), job_id, owner))
+            row = conn.execute("SELECT status FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return row is not None and row[0] == "done"
+
+    def lease_items(self, job_id: str, owner: str, limit: int) -> List[Tuple[int, str]]:
+        """Lease up to limit unfinished, unleased items (input order) to owner: [(seq, address)]."""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return self._lease(conn, job_id, owner, limit, time.time())
+
+    def _lease(self, conn: sqlite3.Connection, job_id: str, owner: str, limit: int, now: float) -> List[Tuple[int, str]]:
+        rows = conn.execute(
+            "SELECT seq, address FROM items WHERE job_id=? AND status='pending' AND COALESCE(lease_until, 0) < ? "
+            "ORDER BY seq LIMIT ?", (job_id, now, limit)).fetchall()
+        if rows:
+            conn.execute(f"UPDATE items SET lease_owner=?, lease_until=? WHERE job_id=? AND seq IN ({','.join('?' * len(rows))})",
+                         (owner, now + JOBS_LEASE_SECONDS, job_id, *(seq for seq, _ in rows)))
+        return rows
+
+    def _renew_items(self, conn: sqlite3.Connection, job_id: str, owner: str, now: float) -> None:
+        conn.execute("UPDATE items SET lease_until=? WHERE job_id=? AND lease_owner=? AND status='pending'",
+                     (now + JOBS_LEASE_SECONDS, job_id, owner))
+
+    def finish_item(self, job_id: str, seq: int, result: Dict[str, Any], failed: bool) -> None:
+        self.finish_items(job_id, [(seq, result, failed)])
+
+    def finish_items(self, job_id: str, results: List[Tuple[int, Dict[str, Any], bool]]) -> int:
+        """Store results [(seq, result, failed)]; returns how many were new. The job is done with its last item."""
+        stored = 0
+        with self._conn() as conn:
+            for seq, result, failed in results:
+                # Only the first result for an item counts (after an expired lease two workers may race)
+                cur = conn.execute(
+                    "UPDATE items SET status=?, done_seq=(SELECT done + 1 FROM jobs WHERE id=?), result_json=?, "
+                    "lease_owner=NULL, lease_until=NULL WHERE job_id=? AND seq=? AND status='pending'",
+                    ("failed" if failed else "done", job_id, json.dumps(result, default=str), job_id, seq))
+                if cur.rowcount:
+                    conn.execute("UPDATE jobs SET done = done + 1, failed = failed + ? WHERE id=?",
+                                 (1 if failed else 0, job_id))
+                    stored += 1
+            conn.execute("UPDATE jobs SET status='done', owner=NULL, finished_at=? WHERE id=? AND status='running' AND done >= total",
+                         (time.time(), job_id))
+        return stored
+
+    # ---- remote workers ----
+
+    def lease_next(self, worker: str, limit: int, host: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], List[Tuple[int, str]]]]:
+        """Lease up to limit items of the oldest active job that has unleased work: (job, items) or None."""
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._touch_worker(conn, worker, host, now)
+            for (job_id,) in conn.execute("SELECT id FROM jobs WHERE status IN ('queued', 'running') "
+                                          "ORDER BY created_at").fetchall():
+                items = self._lease(conn, job_id, worker, limit, now)
+                if items:
+                    conn.execute("UPDATE jobs SET status='running', started_at=COALESCE(started_at, ?), "
+                                 "resumed_at=?, resumed_done=done WHERE id=? AND status='queued'",
+                                 (now, now, job_id))
+                    conn.execute("UPDATE workers SET leases = leases + 1 WHERE name=?", (worker,))
+                    break
+            else:
+                return None
+        return self.get(job_id), items
+
+    def worker_report(self, worker: str, job_id: str, results: List[Tuple[int, Dict[str, Any], bool]],
+                      host: Optional[str] = None) -> bool:
+        """Store a worker's results and renew its leases on the job; False once the job is no longer active."""
+        stored = self.finish_items(job_id, results) if results else 0
+        now = time.time()
+        with self._conn() as conn:
+            self._touch_worker(conn, worker, host, now)
+            conn.execute("UPDATE workers SET done = done + ?, failed = failed + ? WHERE name=?",
+                         (len(results), sum(1 for _, _, failed in results if failed), worker))
+            self._renew_items(conn, job_id, worker, now)
+            row = conn.execute("SELECT status FROM jobs WHERE id=?", (job_id,)).fetchone()
+        if stored < len(results):
+            log.debug("worker %s: %d of %d results for job %s were already stored", worker, len(results) - stored, len(results), job_id)
+        return row is not None and row[0] in ACTIVE
+
+    def release_worker(self, worker: str) -> None:
+        """Hand back every item leased by worker (it is shutting down)."""
+        with self._conn() as conn:
+            conn.execute("UPDATE items SET lease_owner=NULL, lease_until=NULL WHERE lease_owner=? AND status='pending'", (worker,))
+
+    def _touch_worker(self, conn: sqlite3.Connection, worker: str, host: Optional[str], now: float) -> None:
+        conn.execute("INSERT INTO workers (name, host, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+                     "ON CONFLICT(name) DO UPDATE SET last_seen=excluded.last_seen, host=COALESCE(excluded.host, host)",
+                     (worker, host, now, now))
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """Per-worker totals plus the items each one holds right now."""
+        now = time.time()
+        conn = self._conn()
+        leased = dict(conn.execute("SELECT lease_owner, COUNT(*) FROM items WHERE status='pending' AND lease_until >= ? "
+                                   "GROUP BY lease_owner", (now,)).fetchall())
+        rows = conn.execute("SELECT name, host, first_seen, last_seen, leases, done, failed FROM workers "
+                            "ORDER BY last_seen DESC").fetchall()
+        return [dict(zip(("name", "host", "first_seen", "last_seen", "leases", "done", "failed"), r),
+                     leased=leased.get(r[0], 0)) for r in rows]
+
+    # ---- reading / cancelling ----
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return _job_dict(row) if row else None
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs ORDER BY created_at DESC LIMIT ?",
+                                    (limit,)).fetchall()
+        return [_job_dict(r) for r in rows]
+
+    def results(self, job_id: str, after: int, limit: int, status: Optional[str] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """(done_seq, result) of finished items in completion order, after the cursor `after`."""
+        sql = "SELECT done_seq, result_json FROM items WHERE job_id=? AND done_seq>?"
+        args: list = [job_id, after]
+        if status is not None:
+            sql += " AND status=?"
+            args.append(status)
+        rows = self._conn().execute(sql + " ORDER BY done_seq LIMIT ?", (*args, limit)).fetchall()
+        return [(n, json.loads(r)) for n, r in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop an unfinished job (a running one stops at its runner's next lease renewal)."""
+        with self._conn() as conn:
+            return conn.execute("UPDATE jobs SET status='cancelled', owner=NULL, finished_at=? WHERE id=? AND status IN (?, ?, ?)",
+                                (time.time(), job_id, *ACTIVE)).rowcount == 1
+
+
+_STORE: Optional[JobStore] = None
+_STORE_FAILED = False
+_STORE_LOCK = threading.Lock()
+
+
+def get_job_store() -> Optional[JobStore]:
+    """Process-wide job store, opened on first use. None if the file can't be opened."""
+    global _STORE, _STORE_FAILED
+    if _STORE is not None or _STORE_FAILED:
+        return _STORE
+    with _STORE_LOCK:
+        if _STORE is None and not _STORE_FAILED:
+            try:
+                _STORE = JobStore(JOBS_DB_PATH)
+                log.debug("job store at %s", JOBS_DB_PATH)
+            except (OSError, sqlite3.Error) as e:
+                _STORE_FAILED = True
+                log.error("background jobs disabled, can't open %s: %s", JOBS_DB_PATH, e)
+    return _STORE
+
+
+__all__ = ["JobStore", "get_job_store", "ACTIVE", "JOBS_LEASE_SECONDS"]
@@ -0,0 +1,169 @@
+# backend/db/store.py
+# Purpose: Persistent SQLite store for explorer data that never changes once known:
+# verified ABIs and contract creation info (tx hash, block, timestamp), keyed by (chainid, address).
+#
+# One file shared by the API, cli.py and batch_cli.py (WAL mode: readers never block, one
+# writer at a time across processes). Each thread gets its own connection.
+#
+#   store = get_store()                 # None when EXPLORER_DB=0
+#   rec = store.get_abi(1, addr)        # {"status": "ok", "abi": [...], "abi_json": "...", "parsed": {...}} | unverified | None
+#   store.put_creation(1, addr, tx_hash="0x..", block_number=123, timestamp=1700000000, source="v2")
+#
+# "Not verified" ABI answers are kept too, but only for EXPLORER_DB_UNVERIFIED_TTL seconds
+# (a contract can get verified later); everything else is kept forever.
+
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from backend.utils.log import get_logger
+
+log = get_logger("store")
+
+EXPLORER_DB = os.getenv("EXPLORER_DB", "1").strip().lower() not in {"0", "false", "no", "off", ""}
+EXPLORER_DB_PATH = os.getenv("EXPLORER_DB_PATH") or str(Path(__file__).resolve().parents[2] / "data" / "explorer.db")
+EXPLORER_DB_UNVERIFIED_TTL = float(os.getenv("EXPLORER_DB_UNVERIFIED_TTL", "86400"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS abis (
+    chainid     INTEGER NOT NULL,
+    address     TEXT    NOT NULL,
+    status      TEXT    NOT NULL,          -- 'ok' | 'unverified'
+    abi_json    TEXT,
+    parsed_json TEXT,
+    error       TEXT,
+    fetched_at  REAL    NOT NULL,
+    PRIMARY KEY (chainid, address)
+);
+CREATE TABLE IF NOT EXISTS creations (
+    chainid      INTEGER NOT NULL,
+    address      TEXT    NOT NULL,
+    tx_hash      TEXT,
+    block_number INTEGER,
+    timestamp    INTEGER NOT NULL,
+    source       TEXT,                     -- 'v2' | 'v1' | 'tokentx'
+    fetched_at   REAL    NOT NULL,
+    PRIMARY KEY (chainid, address)
+);
+"""
+
+
+def parse_abi(abi: List[dict]) -> Dict[str, Any]:
+    """Compact pre-parsed view stored next to the raw ABI (function names, no-arg view getters, events)."""
+    functions, getters, events = [], [], []
+    for item in abi:
+        kind = item.get("type")
+        name = item.get("name")
+        if kind == "function" and name:
+            functions.append(name)
+            if not item.get("inputs") and item.get("stateMutability") in ("view", "pure"):
+                getters.append(name)
+        elif kind == "event" and name:
+            events.append(name)
+    return {"functions": functions, "getters": getters, "events": events}
+
+
+class ExplorerStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql: str, args: tuple) -> None:
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute(sql, args)
+        except sqlite3.Error as e:
+            # The store is an optimization: a failed write just means we fetch again next time
+            log.warning("write failed (%s): %s", self.path, e)
+
+    # ---- ABIs ----
+
+    def get_abi(self, chainid: int, address: str) -> Optional[Dict[str, Any]]:
+        try:
+            row = self._conn().execute(
+                "SELECT status, abi_json, parsed_json, error, fetched_at FROM abis WHERE chainid=? AND address=?",
+                (int(chainid), address.lower())).fetchone()
+        except sqlite3.Error as e:
+            log.warning("read failed (%s): %s", self.path, e)
+            return None
+        if row is None:
+            return None
+        status, abi_json, parsed_json, error, fetched_at = row
+        if status == "unverified":
+            if time.time() - fetched_at > EXPLORER_DB_UNVERIFIED_TTL:
+                return None
+            return {"status": status, "error": error}
+        return {"status": status, "abi": json.loads(abi_json), "abi_json": abi_json,
+                "parsed": json.loads(parsed_json) if parsed_json else None}
+
+    def put_abi(self, chainid: int, address: str, abi: List[dict], abi_json: Optional[str] = None) -> None:
+        """abi_json: the explorer's raw text, kept as-is so its hash matches a fresh fetch."""
+        self._write("INSERT OR REPLACE INTO abis VALUES (?, ?, 'ok', ?, ?, NULL, ?)",
+                    (int(chainid), address.lower(), abi_json or json.dumps(abi), json.dumps(parse_abi(abi)), time.time()))
+
+    def put_unverified(self, chainid: int, address: str, error: str) -> None:
+        self._write("INSERT OR REPLACE INTO abis VALUES (?, ?, 'unverified', NULL, NULL, ?, ?)",
+                    (int(chainid), address.lower(), error, time.time()))
+
+    # ---- contract creation ----
+
+    def get_creation(self, chainid: int, address: str) -> Optional[Dict[str, Any]]:
+        try:
+            row = self._conn().execute(
+                "SELECT tx_hash, block_number, timestamp, source FROM creations WHERE chainid=? AND address=?",
+                (int(chainid), address.lower())).fetchone()
+        except sqlite3.Error as e:
+            log.warning("read failed (%s): %s", self.path, e)
+            return None
+        if row is None:
+            return None
+        return {"tx_hash": row[0], "block_number": row[1], "timestamp": row[2], "source": row[3]}
+
+    def put_creation(self, chainid: int, address: str, tx_hash: Optional[str], block_number: Optional[int],
+                     timestamp: int, source: str) -> None:
+        self._write("INSERT OR REPLACE INTO creations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (int(chainid), address.lower(), tx_hash, block_number, int(timestamp), source, time.time()))
+
+
+_STORE: Optional[ExplorerStore] = None
+_STORE_FAILED = False
+_STORE_LOCK = threading.Lock()
+
+
+def get_store() -> Optional[ExplorerStore]:
+    """Process-wide store, opened on first use. None if disabled or the file can't be opened."""
+    global _STORE, _STORE_FAILED
+    if _STORE is not None or _STORE_FAILED or not EXPLORER_DB:
+        return _STORE
+    with _STORE_LOCK:
+        if _STORE is None and not _STORE_FAILED:
+            try:
+                _STORE = ExplorerStore(EXPLORER_DB_PATH)
+                log.debug("explorer store at %s", EXPLORER_DB_PATH)
+            except (OSError, sqlite3.Error) as e:
+                _STORE_FAILED = True
+                log.error("explorer store disabled, can't open %s: %s", EXPLORER_DB_PATH, e)
+    return _STORE
+
+
+__all__ = ["ExplorerStore", "get_store", "parse_abi"]
@@ -0,0 +1,215 @@
+# backend/utils/abi_features.py
+# Purpose: One pass over an ABI for every name-based check (suspicious functions, mint,
+# fee/denominator getters, honeypot keywords) plus function selectors.
+#
+#   f = analyze_abi(abi)
+#   f.suspicious, f.has_mint, f.fee_getters, f.denom_getters, f.getter_types,
+#   f.honeypot_hits, f.selectors
+#
+# All keyword lists are compiled into a single regex; each function name is lowercased and
+# scanned once. Results are memoized by ABI content hash, so copy-paste tokens sharing an
+# ABI are analyzed once per process. abi_loader passes the hash of the explorer's raw ABI
+# text (much cheaper than re-serializing the parsed list). AbiFeatures is shared between
+# callers: don't mutate it.
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from eth_utils import abi_to_signature, function_abi_to_4byte_selector
+
+from backend.utils.metrics import CACHE_REQUESTS
+
+ABI_FEATURES_CACHE_MAX = int(os.getenv("ABI_FEATURES_CACHE_MAX", "4096"))
+
+SUSPICIOUS_KEYWORDS = [
+    "blacklist", "whitelist", "bot", "restrict",
+    "settrading", "enabletrading", "opentrading", "starttrading",
+    "setfee", "settax", "maxtx", "maxwallet", "cooldown"
+]
+MINT_KEYWORDS = ["mint"]
+FEE_KEYWORDS = ["fee", "tax", "buy", "sell", "transfer"]
+DENOM_KEYWORDS = ["denominator", "feeDenominator", "taxDenominator", "feesDenominator"]
+# name-based heuristics that often gate trading/selling
+HP_KEYWORDS = [
+    "blacklist","whitelist","bot","maxwallet","maxtx","maxtxamount","cooldown",
+    "enabletrading","opentrading","settrading","starttrading","tradingopen",
+    "swapenabled","setfees","settax","excludeFromFees","setlimits"
+]
+
+_SUSPICIOUS, _MINT, _FEE, _DENOM, _HONEYPOT = 1, 2, 4, 8, 16
+
+# Names are matched lowercased. Fee/denominator keywords were always compared case-insensitively;
+# the other lists are used as written (so mixed-case "excludeFromFees" never matches, as before).
+_GROUPS = (
+    (_SUSPICIOUS, SUSPICIOUS_KEYWORDS),
+    (_MINT, MINT_KEYWORDS),
+    (_FEE, [k.lower() for k in FEE_KEYWORDS]),
+    (_DENOM, [k.lower() for k in DENOM_KEYWORDS]),
+    (_HONEYPOT, HP_KEYWORDS),
+)
+
+
+def _compile() -> Tuple["re.Pattern[str]", Dict[str, int]]:
+    masks: Dict[str, int] = {}
+    for bit, words in _GROUPS:
+        for w in words:
+            masks[w] = masks.get(w, 0) | bit
+    # The lookahead finds the longest keyword starting at each position; a keyword's mask also
+    # carries every keyword it contains, so shorter overlapping matches are never lost.
+    closed = {w: m for w, m in masks.items()}
+    for w in masks:
+        for other, m in masks.items():
+            if other != w and other in w:
+                closed[w] |= m
+    alternation = "|".join(re.escape(w) for w in sorted(masks, key=len, reverse=True))
+    return re.compile(f"(?=({alternation}))"), closed
+
+
+_MATCHER, _MASKS = _compile()
+
+
+def _match_mask(name_lower: str) -> int:
+    mask = 0
+    for m in _MATCHER.finditer(name_lower):
+        mask |= _MASKS[m.group(1)]
+    return mask
+
+
+class AbiFeatures:
+    __slots__ = ("digest", "suspicious", "has_mint", "fee_getters", "denom_getters",
+                 "getter_types", "honeypot_hits", "_functions", "_selectors")
+
+    def __init__(self, digest: str):
+        self.digest = digest
+        self.suspicious: Tuple[str, ...] = ()      # function names hitting SUSPICIOUS_KEYWORDS (ABI order)
+        self.has_mint = False
+        self.fee_getters: Tuple[str, ...] = ()     # zero-arg single-uint getters named like a fee
+        self.denom_getters: Tuple[str, ...] = ()   # same, named like a denominator
+        self.getter_types: Dict[str, str] = {}     # name -> uint type, every zero-arg single-uint getter
+        self.honeypot_hits: Tuple[str, ...] = ()   # function names hitting HP_KEYWORDS
+        self._functions: List[Dict[str, Any]] = []
+        self._selectors: Dict[str, str] | None = None
+
+    @property
+    def honeypot_hit(self) -> bool:
+        return bool(self.honeypot_hits)
+
+    @property
+    def selectors(self) -> Dict[str, str]:
+        """"name(types)" -> "0x12345678". Keccak per function is the costly part, so it's computed on first use."""
+        if self._selectors is None:
+            out: Dict[str, str] = {}
+            for item in self._functions:
+                try:
+                    out[abi_to_signature(item)] = "0x" + function_abi_to_4byte_selector(item).hex()
+                except Exception:
+                    pass   # malformed entry: no selector
+            self._selectors = out
+        return self._selectors
+
+    def __repr__(self) -> str:
+        return (f"AbiFeatures({self.digest[:10]}, suspicious={list(self.suspicious)}, mint={self.has_mint}, "
+                f"fees={list(self.fee_getters)}, denoms={list(self.denom_getters)}, hp={list(self.honeypot_hits)})")
+
+
+def _uint_output(item: Dict[str, Any]) -> str | None:
+    outputs = item.get("outputs") or []
+    if len(outputs) == 1 and (outputs[0].get("type") or "").startswith("uint"):
+        return outputs[0]["type"]
+    return None
+
+
+def _build(abi: List[Dict[str, Any]], digest: str) -> AbiFeatures:
+    f = AbiFeatures(digest)
+    suspicious: List[str] = []
+    hp: List[str] = []
+    fees: Dict[str, None] = {}
+    denoms: Dict[str, None] = {}
+    for item in abi:
+        if item.get("type") != "function":
+            continue
+        name = item.get("name") or ""
+        f._functions.append(item)
+
+        getter_type = None if item.get("inputs") else _uint_output(item)
+        if getter_type is not None:
+            f.getter_types.setdefault(name, getter_type)
+
+        mask = _match_mask(name.lower())
+        if not mask:
+            continue
+        if mask & _SUSPICIOUS:
+            suspicious.append(name)
+        if mask & _MINT:
+            f.has_mint = True
+        if mask & _HONEYPOT:
+            hp.append(name)
+        if getter_type is not None:
+            if mask & _FEE:
+                fees[name] = None
+            if mask & _DENOM:
+                denoms[name] = None
+    f.suspicious, f.honeypot_hits = tuple(suspicious), tuple(hp)
+    f.fee_getters, f.denom_getters = tuple(fees), tuple(denoms)
+    return f
+
+
+_BY_DIGEST: "OrderedDict[str, AbiFeatures]" = OrderedDict()
+# Same list object seen again (the ABI cache hands out one object per address): skip re-hashing.
+# The entry keeps the list alive, so its id() can't be reused while cached.
+_BY_ID: "OrderedDict[int, Tuple[list, AbiFeatures]]" = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def abi_digest(abi: List[Dict[str, Any]]) -> str:
+    """Content hash of a parsed ABI (key order and whitespace don't matter)."""
+    return hashlib.sha256(json.dumps(abi, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def abi_text_digest(text: str) -> str:
+    """Content hash of raw ABI JSON text, as returned by the explorer."""
+    return "t:" + hashlib.sha256(text.encode()).hexdigest()
+
+
+def _remember(cache: OrderedDict, key: Any, value: Any) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > ABI_FEATURES_CACHE_MAX:
+        cache.popitem(last=False)
+
+
+def analyze_abi(abi: List[Dict[str, Any]] | None, digest: str | None = None) -> AbiFeatures:
+    """Features of an ABI, memoized by content hash (abi_digest() unless given). None/[] gives empty features."""
+    abi = abi or []
+    with _LOCK:
+        hit = _BY_ID.get(id(abi))
+        if hit is not None and hit[0] is abi:
+            CACHE_REQUESTS.inc(cache="abi_features", result="hit")
+            return hit[1]
+
+    digest = digest or abi_digest(abi)
+    with _LOCK:
+        f = _BY_DIGEST.get(digest)
+        if f is not None:
+            _BY_DIGEST.move_to_end(digest)
+    if f is None:
+        CACHE_REQUESTS.inc(cache="abi_features", result="miss")
+        f = _build(abi, digest)
+        with _LOCK:
+            f = _BY_DIGEST.setdefault(digest, f)
+            _remember(_BY_DIGEST, digest, f)
+    else:
+        CACHE_REQUESTS.inc(cache="abi_features", result="hit")
+    with _LOCK:
+        _remember(_BY_ID, id(abi), (abi, f))
+    return f
+
+
+__all__ = ["AbiFeatures", "analyze_abi", "abi_digest", "abi_text_digest",
+           "SUSPICIOUS_KEYWORDS", "MINT_KEYWORDS", "FEE_KEYWORDS", "DENOM_KEYWORDS", "HP_KEYWORDS"]
@@ -1,15 +1,13 @@
 # backend/utils/abi_loader.py
+import asyncio
 import json
 from typing import List
 from backend.chains import EXPLORER_V2_BASE
-from backend.utils.ratelimit import http_get_json
-from backend.utils.cache import memoize_ttl
-
-SUSPICIOUS_KEYWORDS = [
-    "blacklist", "whitelist", "bot", "restrict",
-    "settrading", "enabletrading", "opentrading", "starttrading",
-    "setfee", "settax", "maxtx", "maxwallet", "cooldown"
-]
+from backend.db.store import get_store
+from backend.utils.abi_features import SUSPICIOUS_KEYWORDS, abi_text_digest, analyze_abi
+from backend.utils.keypool import KeyPool
+from backend.utils.explorer import ExplorerError, http_get_json, http_get_json_async
+from backend.utils.cache import TTLCache
 
 def _host_key_for_v1(v1_host: str | None) -> str:
     if not v1_host:
@@ -20,29 +18,116 @@ def _host_key_for_v1(v1_host: str | None) -> str:
         return "etherscan_v1"
     return "explorer_v1"
 
-@memoize_ttl(ttl_seconds=600)
-def fetch_contract_abi(address: str, api_key: str, chainid: int, v1_host: str | None = None) -> List[dict]:
-    # V2 multichain first
-    v2_params = {"chainid": chainid, "module": "contract", "action": "getabi", "address": address, "apikey": api_key}
-    data = http_get_json("etherscan_v2", EXPLORER_V2_BASE, v2_params)
-    if data.get("status") == "1":
-        return json.loads(data["result"])
+def _v2_abi_params(address: str, api_key: "KeyPool | str", chainid: int) -> dict:
+    return {"chainid": chainid, "module": "contract", "action": "getabi", "address": address, "apikey": api_key}
+
+def _v1_abi_params(address: str, api_key: "KeyPool | str") -> dict:
+    return {"module": "contract", "action": "getabi", "address": address, "apikey": api_key}
+
+# Verified ABIs never change, so they're kept in the on-disk explorer store (backend/db/store.py)
+# across restarts and processes; _ABIS stays in front as the in-process layer (keyed by
+# (chainid, address): the API key and V1 host don't change the answer).
+# Every loaded ABI is run through analyze_abi() keyed by its raw text hash, so later checks on
+# the same list (mint/fees/honeypot) hit the features cache without re-hashing.
+
+_ABIS = TTLCache("abi_loader.contract_abi", ttl_seconds=600)
+
+def _abi_key(address: str, api_key: "KeyPool | str", chainid: int, v1_host: str | None = None):
+    return int(chainid), address.lower()
+
+def _loaded(abi: List[dict], raw: str) -> List[dict]:
+    analyze_abi(abi, abi_text_digest(raw))
+    return abi
+
+def _stored_abi(address: str, chainid: int) -> List[dict] | None:
+    store = get_store()
+    rec = store.get_abi(chainid, address) if store is not None else None
+    if rec is None:
+        return None
+    if rec["status"] == "unverified":
+        raise ValueError("❌ ABI fetch failed: " + (rec.get("error") or "Contract source code not verified"))
+    return _loaded(rec["abi"], rec["abi_json"])
+
+def _store_abi(address: str, chainid: int, abi: List[dict] | None, error: str | None = None, raw: str | None = None) -> None:
+    store = get_store()
+    if store is None:
+        return
+    if abi is not None:
+        store.put_abi(chainid, address, abi, raw)
+    elif error and "not verified" in error.lower():
+        # Only a definite "not verified" is remembered (for a while); transient errors are not
+        store.put_unverified(chainid, address, error)
+
+def _fetched(address: str, chainid: int, data: dict) -> List[dict] | None:
+    """Parsed ABI from a getabi answer (stored), or None when the explorer has none."""
+    if data.get("status") != "1":
+        return None
+    abi = json.loads(data["result"])
+    _store_abi(address, chainid, abi, raw=data["result"])
+    return _loaded(abi, data["result"])
+
+@_ABIS.memoize(key=_abi_key)
+def fetch_contract_abi(address: str, api_key: "KeyPool | str", chainid: int, v1_host: str | None = None) -> List[dict]:
+    stored = _stored_abi(address, chainid)
+    if stored is not None:
+        return stored
+
+    # V2 multichain first (an error answer still falls back to V1)
+    try:
+        data = http_get_json("etherscan_v2", EXPLORER_V2_BASE, _v2_abi_params(address, api_key, chainid))
+        abi = _fetched(address, chainid, data)
+        if abi is not None:
+            return abi
+    except ExplorerError as e:
+        if not v1_host:
+            raise ValueError(f"❌ ABI fetch failed: {e}") from e
+        data = {}
 
     # V1 fallback
     if v1_host:
-        v1_params = {"module": "contract", "action": "getabi", "address": address, "apikey": api_key}
-        data = http_get_json(_host_key_for_v1(v1_host), v1_host, v1_params)
-        if data.get("status") == "1":
-            return json.loads(data["result"])
+        try:
+            data = http_get_json(_host_key_for_v1(v1_host), v1_host, _v1_abi_params(address, api_key))
+        except ExplorerError as e:
+            raise ValueError(f"❌ ABI fetch failed: {e}") from e
+        abi = _fetched(address, chainid, data)
+        if abi is not None:
+            return abi
+        _store_abi(address, chainid, None, str(data.get("result", "")))
+        raise ValueError("❌ ABI fetch failed: " + data.get("result", "Unknown error"))
+
+    _store_abi(address, chainid, None, str(data.get("result", "")))
+    raise ValueError("❌ ABI fetch failed via V2 (no V1 fallback configured)")
+
+@_ABIS.memoize(key=_abi_key)
+async def fetch_contract_abi_async(address: str, api_key: "KeyPool | str", chainid: int, v1_host: str | None = None) -> List[dict]:
+    """fetch_contract_abi() over aiohttp (same limiter host keys, so both paths share the budget)."""
+    stored = await asyncio.to_thread(_stored_abi, address, chainid)
+    if stored is not None:
+        return stored
+
+    try:
+        data = await http_get_json_async("etherscan_v2", EXPLORER_V2_BASE, _v2_abi_params(address, api_key, chainid))
+        abi = await asyncio.to_thread(_fetched, address, chainid, data)
+        if abi is not None:
+            return abi
+    except ExplorerError as e:
+        if not v1_host:
+            raise ValueError(f"❌ ABI fetch failed: {e}") from e
+        data = {}
+
+    if v1_host:
+        try:
+            data = await http_get_json_async(_host_key_for_v1(v1_host), v1_host, _v1_abi_params(address, api_key))
+        except ExplorerError as e:
+            raise ValueError(f"❌ ABI fetch failed: {e}") from e
+        abi = await asyncio.to_thread(_fetched, address, chainid, data)
+        if abi is not None:
+            return abi
+        await asyncio.to_thread(_store_abi, address, chainid, None, str(data.get("result", "")))
         raise ValueError("❌ ABI fetch failed: " + data.get("result", "Unknown error"))
 
+    await asyncio.to_thread(_store_abi, address, chainid, None, str(data.get("result", "")))
     raise ValueError("❌ ABI fetch failed via V2 (no V1 fallback configured)")
 
 def scan_for_suspicious_functions(abi: list) -> list:
-    flagged = []
-    for item in abi:
-        if item.get("type") == "function":
-            name = (item.get("name") or "").lower()
-            if any(kw in name for kw in SUSPICIOUS_KEYWORDS):
-                flagged.append(item.get("name"))
-    return flagged
+    return list(analyze_abi(abi).suspicious)
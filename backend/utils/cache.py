@@ -1,31 +1,250 @@
 # backend/utils/cache.py
+# Purpose: Bounded in-process caches: LRU + TTL eviction, max entries and/or approximate
+# bytes, single-flight misses and hit/miss/eviction stats (also exported as metrics).
+#
+#   @memoize_ttl(600, key=lambda address, api_key, chainid, v1_host=None: (chainid, address.lower()))
+#   def fetch_contract_abi(...): ...
+#
+#   _POOLS = TTLCache("liquidity.deepest_v2_pool", ttl_seconds=10)   # shared by a sync/async pair
+#   @_POOLS.memoize(key=...)
+#
+# key= maps the call's arguments to the cache key, so per-call objects (Web3 clients, API
+# keys) can be left out; w3_key(w3) identifies a client by chain id. Concurrent misses for
+# one key run the function once: other threads (or tasks on the same loop) wait for it.
+# Exceptions are never cached, and neither is a value rejected by cache_if=.
+
+import asyncio
+import inspect
+import os
+import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import Future
 from functools import wraps
-from typing import Callable, Any, Tuple
+from typing import Any, Callable, Dict, Optional, Tuple
 
-def memoize_ttl(ttl_seconds: int = 300):
-    """
-    Super-simple in-process TTL cache decorator.
-    Uses (args, sorted(kwargs)) as the key.
-    """
-    def deco(fn: Callable):
-        cache: dict[Tuple[Any, ...], Tuple[Any, float]] = {}
-
-        @wraps(fn)
-        def wrapped(*args, **kwargs):
-            key = (args, tuple(sorted(kwargs.items())))
-            now = time.time()
-            if key in cache:
-                val, exp = cache[key]
-                if now < exp:
+from backend.utils.metrics import CACHE_EVICTIONS, CACHE_REQUESTS, track_cache
+from backend.utils.trace import event, span
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "4096"))   # default bound per cache
+
+_MISSING = object()
+
+
+def approx_size(value: Any, _depth: int = 0) -> int:
+    """Rough deep size in bytes of JSON-like values (dict/list/tuple/str/bytes/numbers)."""
+    size = sys.getsizeof(value)
+    if _depth > 6:
+        return size
+    if isinstance(value, dict):
+        size += sum(approx_size(k, _depth + 1) + approx_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approx_size(v, _depth + 1) for v in value)
+    return size
+
+
+def w3_key(w3: Any) -> Any:
+    """Stable cache-key part for a Web3/AsyncWeb3 client: its verified chain id (a new client
+    object for the same chain maps to the same key)."""
+    provider = getattr(w3, "provider", None)
+    chain_id = getattr(provider, "verified_chain_id", None)
+    return ("chain", chain_id) if chain_id is not None else ("provider", id(provider))
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ttl_seconds."""
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: Optional[int] = CACHE_MAX_ENTRIES,
+                 max_bytes: Optional[int] = None, sizeof: Callable[[Any], int] = approx_size):
+        self.name = name
+        self.ttl = float(ttl_seconds)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Any, Tuple[Any, float, int]]" = OrderedDict()   # key -> (value, expires, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "coalesced": 0, "evicted_lru": 0,
+                                       "evicted_expired": 0, "evicted_bytes": 0}
+        track_cache(self)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _drop(self, key: Any, reason: str) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+        self._stats[f"evicted_{reason}"] += 1
+        CACHE_EVICTIONS.inc(cache=self.name, reason=reason)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Cached value (refreshing its LRU position) or default. Counts a hit or miss."""
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None:
+                if hit[1] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    CACHE_REQUESTS.inc(cache=self.name, result="hit")
+                    return hit[0]
+                self._drop(key, "expired")
+            self._stats["misses"] += 1
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        return default
+
+    def put(self, key: Any, value: Any) -> None:
+        if self.ttl <= 0:
+            return   # ttl 0: single-flight only, nothing is kept
+        size = self._sizeof(value) if self.max_bytes else 0
+        now = time.monotonic()
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[2]
+            self._data[key] = (value, now + self.ttl, size)
+            self._bytes += size
+            # The LRU end is also the most likely to have expired; clear those first
+            while self._data:
+                oldest = next(iter(self._data))
+                if self._data[oldest][1] <= now:
+                    self._drop(oldest, "expired")
+                elif self.max_entries is not None and len(self._data) > self.max_entries:
+                    self._drop(oldest, "lru")
+                elif self.max_bytes and self._bytes > self.max_bytes and len(self._data) > 1:
+                    self._drop(oldest, "bytes")
+                else:
+                    break
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """hits + misses = lookups; "coalesced" misses waited on another caller instead of running fn."""
+        with self._lock:
+            return {"name": self.name, "entries": len(self._data), "bytes": self._bytes, **self._stats}
+
+    def _coalesced(self) -> None:
+        with self._lock:
+            self._stats["coalesced"] += 1
+        CACHE_REQUESTS.inc(cache=self.name, result="coalesced")
+
+    def memoize(self, key: Optional[Callable[..., Any]] = None,
+                cache_if: Optional[Callable[[Any], bool]] = None) -> Callable[[Callable], Callable]:
+        """
+        Decorator caching fn's results here. key(*args, **kwargs) builds the cache key
+        (default: the raw arguments). Works on coroutine functions too (the awaited
+        result is cached, not the coroutine).
+        """
+        def deco(fn: Callable) -> Callable:
+            short = fn.__qualname__
+
+            def make_key(args, kwargs):
+                return key(*args, **kwargs) if key is not None else (args, tuple(sorted(kwargs.items())))
+
+            def keep(val) -> bool:
+                return cache_if is None or cache_if(val)
+
+            if inspect.iscoroutinefunction(fn):
+                # Single-flight per event loop: asyncio futures can't be awaited across loops
+                inflight_async: Dict[Tuple[int, Any], asyncio.Future] = {}
+
+                @wraps(fn)
+                async def wrapped_async(*args, **kwargs):
+                    k = make_key(args, kwargs)
+                    loop = asyncio.get_running_loop()
+                    slot = (id(loop), k)
+                    while True:
+                        val = self.get(k, _MISSING)
+                        if val is not _MISSING:
+                            event(short, kind="cache", cache_hit=True)
+                            return val
+                        leader = inflight_async.get(slot)
+                        if leader is None:
+                            break
+                        self._coalesced()
+                        try:
+                            with span(short, kind="cache", cache_hit=False, coalesced=True):
+                                return await asyncio.shield(leader)
+                        except asyncio.CancelledError:
+                            if leader.cancelled() and not asyncio.current_task().cancelling():
+                                continue   # the leading task was cancelled, not this one: retry
+                            raise
+
+                    fut = loop.create_future()
+                    fut.add_done_callback(lambda f: f.cancelled() or f.exception())   # no "never retrieved" noise
+                    inflight_async[slot] = fut
+                    try:
+                        with span(short, kind="cache", cache_hit=False):
+                            val = await fn(*args, **kwargs)
+                        if keep(val):
+                            self.put(k, val)
+                        fut.set_result(val)
+                        return val
+                    except Exception as e:
+                        fut.set_exception(e)
+                        raise
+                    finally:
+                        fut.cancel()   # no-op once settled; wakes followers if this task was cancelled
+                        inflight_async.pop(slot, None)
+
+                wrapped_async.cache = self  # type: ignore[attr-defined]
+                wrapped_async.cache_clear = self.clear  # type: ignore[attr-defined]
+                wrapped_async.cache_stats = self.stats  # type: ignore[attr-defined]
+                return wrapped_async
+
+            inflight: Dict[Any, Future] = {}
+            inflight_lock = threading.Lock()
+
+            @wraps(fn)
+            def wrapped(*args, **kwargs):
+                k = make_key(args, kwargs)
+                val = self.get(k, _MISSING)
+                if val is not _MISSING:
+                    event(short, kind="cache", cache_hit=True)
                     return val
-            val = fn(*args, **kwargs)
-            cache[key] = (val, now + ttl_seconds)
-            return val
+                with inflight_lock:
+                    leader = inflight.get(k)
+                    if leader is None:
+                        fut: Future = Future()
+                        inflight[k] = fut
+                if leader is not None:
+                    self._coalesced()
+                    with span(short, kind="cache", cache_hit=False, coalesced=True):
+                        return leader.result()
+                try:
+                    with span(short, kind="cache", cache_hit=False):
+                        val = fn(*args, **kwargs)
+                    if keep(val):
+                        self.put(k, val)
+                    fut.set_result(val)
+                    return val
+                except BaseException as e:
+                    fut.set_exception(e)
+                    raise
+                finally:
+                    with inflight_lock:
+                        inflight.pop(k, None)
+
+            wrapped.cache = self  # type: ignore[attr-defined]
+            wrapped.cache_clear = self.clear  # type: ignore[attr-defined]
+            wrapped.cache_stats = self.stats  # type: ignore[attr-defined]
+            return wrapped
+        return deco
 
-        def cache_clear():
-            cache.clear()
 
-        wrapped.cache_clear = cache_clear  # type: ignore[attr-defined]
-        return wrapped
+def memoize_ttl(ttl_seconds: float = 300, max_entries: Optional[int] = CACHE_MAX_ENTRIES,
+                max_bytes: Optional[int] = None, key: Optional[Callable[..., Any]] = None,
+                cache_if: Optional[Callable[[Any], bool]] = None, name: Optional[str] = None):
+    """
+    In-process TTL + LRU cache decorator with its own TTLCache (see TTLCache.memoize).
+    Uses (args, sorted(kwargs)) as the key unless key= is given.
+    """
+    def deco(fn: Callable) -> Callable:
+        cache = TTLCache(name or f"{fn.__module__}.{fn.__qualname__}", ttl_seconds, max_entries, max_bytes)
+        return cache.memoize(key=key, cache_if=cache_if)(fn)
     return deco
+
+
+__all__ = ["TTLCache", "memoize_ttl", "w3_key", "approx_size", "CACHE_MAX_ENTRIES"]
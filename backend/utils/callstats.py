@@ -0,0 +1,59 @@
+# backend/utils/callstats.py
+# Purpose: Per-analysis accounting of outbound RPC requests.
+#
+# analyze_token opens a call_accounting() scope; the pooled provider records every
+# HTTP request it actually sends (by JSON-RPC method) into the active scope.
+# Reads that ride in a shared JSON-RPC array are counted as "batched:<method>"
+# (they don't add to "total", since the array POST is shared across tokens).
+# A ContextVar is used so the counts follow the analysis, not the thread.
+
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, Iterator, Optional
+
+from backend.utils.metrics import RPC_REQUESTS
+
+_COUNTS: ContextVar[Optional[Dict[str, int]]] = ContextVar("rpc_call_counts", default=None)
+_LOCK = Lock()
+
+
+@contextmanager
+def call_accounting() -> Iterator[Dict[str, int]]:
+    """Collect RPC request counts for the enclosed block. Yields the live counts dict."""
+    counts: Dict[str, int] = {}
+    token = _COUNTS.set(counts)
+    try:
+        yield counts
+    finally:
+        _COUNTS.reset(token)
+
+
+def record_rpc_call(method: str, n: int = 1) -> None:
+    """Count one HTTP request (method = JSON-RPC method name, or 'batch')."""
+    RPC_REQUESTS.inc(n, method=method)
+    counts = _COUNTS.get()
+    if counts is None:
+        return
+    with _LOCK:
+        counts[method] = counts.get(method, 0) + n
+        counts["total"] = counts.get("total", 0) + n
+
+
+def record_batched_call(method: str) -> None:
+    """Count one request that rode in a shared JSON-RPC array (not its own HTTP request)."""
+    counts = _COUNTS.get()
+    if counts is None:
+        return
+    with _LOCK:
+        key = f"batched:{method}"
+        counts[key] = counts.get(key, 0) + 1
+
+
+def current_counts() -> Dict[str, int]:
+    counts = _COUNTS.get()
+    if counts is None:
+        return {}
+    with _LOCK:
+        return dict(counts)
@@ -0,0 +1,257 @@
+# backend/utils/concurrency.py
+# Purpose: Adaptive limit on analyses in flight per chain (AIMD), shared by every scanner in
+# the process: /api/batch(/stream), background jobs, batch_cli.py and worker_cli.py.
+#
+#   limit = concurrency_limit("bsc")
+#   async with limit.slot():          # coroutines: waits while limit.limit analyses are running
+#       await analyze_token_async(...)
+#   if limit.try_acquire():           # thread pools: the dispatcher asks, the worker thread
+#       ...; limit.release(seconds)   # gives the slot back with the analysis' latency
+#
+# Decisions are made per window of about `limit` finished analyses (one round of in-flight work).
+# The limit starts at CONCURRENCY_START and grows while it is fully used (doubling per window
+# until the first sign of trouble, then +1 per window). It is cut by CONCURRENCY_BACKOFF when a
+# window saw explorer 429s / "rate limit" answers, more than CONCURRENCY_ERROR_RATE failed
+# RPC/explorer requests (timeouts, 5xx), or a median latency over CONCURRENCY_LATENCY_RATIO x the
+# baseline (work queueing in rate limiters or at the node instead of getting done). The baseline
+# follows window medians down quickly and up barely at all, unless several cuts in a row did not
+# bring latency down: latency that stays high with less and less work in flight is heavier
+# tokens, not congestion, and the baseline then catches up fast. Upstream signals come from the
+# process-wide counters in metrics.py, so a 429 storm on a shared explorer key slows every chain
+# of the process.
+#
+# A caller's own concurrency (--concurrency, BatchJob.concurrency) is a ceiling on top of this.
+# CONCURRENCY_ADAPTIVE=0 turns the controller off: the ceiling (default CONCURRENCY_START) is then
+# the fixed concurrency, as before. Current limits: GET /api/concurrency, scan_concurrency_limit.
+
+from __future__ import annotations
+import asyncio
+import math
+import os
+import statistics
+import threading
+import time
+from contextlib import asynccontextmanager
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from backend.utils.log import get_logger
+from backend.utils.metrics import (EXPLORER_429, EXPLORER_REQUESTS, EXPLORER_RETRIES, RPC_ENDPOINT_REQUESTS,
+                                   SCAN_CONCURRENCY_CHANGES, track_concurrency)
+
+log = get_logger("concurrency")
+
+CONCURRENCY_ADAPTIVE = os.getenv("CONCURRENCY_ADAPTIVE", "1").strip().lower() not in {"0", "false", "no", "off", ""}
+CONCURRENCY_START = max(1, int(os.getenv("CONCURRENCY_START", "2")))
+CONCURRENCY_MIN = max(1, int(os.getenv("CONCURRENCY_MIN", "1")))
+CONCURRENCY_MAX = max(CONCURRENCY_MIN, int(os.getenv("CONCURRENCY_MAX", "64")))
+CONCURRENCY_BACKOFF = min(0.95, max(0.1, float(os.getenv("CONCURRENCY_BACKOFF", "0.7"))))
+CONCURRENCY_LATENCY_RATIO = max(1.1, float(os.getenv("CONCURRENCY_LATENCY_RATIO", "2.0")))
+CONCURRENCY_ERROR_RATE = float(os.getenv("CONCURRENCY_ERROR_RATE", "0.05"))
+
+_MIN_WINDOW = 8            # finished analyses before a window may close ...
+_MAX_WINDOW_SECONDS = 10.0  # ... or this long with at least one
+_MIN_REQUESTS = 20         # upstream requests in a window before its error rate counts
+_BASELINE_FALL = 0.5      # EWMA weight of a window median below the latency baseline ...
+_BASELINE_RISE_SECONDS = 120.0   # ... above it: time constant (windows may be short or long)
+_BASELINE_RISE_STUCK = 0.25   # ... above it, after _STUCK_CUTS latency cuts that didn't lower it
+_STUCK_CUTS = 3
+_THROTTLE_REASONS = ("429", "key_rate")   # explorer retries that mean "too fast"
+
+
+def default_ceiling() -> int:
+    """Concurrency for a caller that did not ask for one."""
+    return CONCURRENCY_MAX if CONCURRENCY_ADAPTIVE else CONCURRENCY_START
+
+
+def _upstream() -> Tuple[float, float, float]:
+    """(throttled, failed, total) upstream requests so far, all chains of this process."""
+    throttled = EXPLORER_429.total() + sum(EXPLORER_RETRIES.total(reason=r) for r in _THROTTLE_REASONS)
+    failed = EXPLORER_REQUESTS.total(status="error") + RPC_ENDPOINT_REQUESTS.total(outcome="error")
+    return throttled, failed, EXPLORER_REQUESTS.total() + RPC_ENDPOINT_REQUESTS.total()
+
+
+class AdaptiveLimit:
+    """AIMD limit on analyses in flight; usable from threads and coroutines (any event loop)."""
+
+    def __init__(self, name: str, start: int = CONCURRENCY_START, min_limit: int = CONCURRENCY_MIN,
+                 max_limit: int = CONCURRENCY_MAX, adaptive: bool = CONCURRENCY_ADAPTIVE):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.adaptive = adaptive
+        # Off: no gate of its own, callers' ceilings are the concurrency
+        self._limit = min(self.max_limit, max(self.min_limit, start)) if adaptive else self.max_limit
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._waiters: deque = deque()     # asyncio futures of coroutines waiting for a slot
+        self._slow_start = True
+        self._baseline: Optional[float] = None
+        self._latency_cuts = 0             # latency cuts in a row that did not lower latency ...
+        self._cut_median = 0.0             # ... and the window median at the last of them
+        self._hold_until = 0.0             # no second cut before the work started under the old limit is done
+        self._last_change = ""
+        self._new_window(time.monotonic())
+        track_concurrency(self)
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _new_window(self, now: float):
+        self._samples: List[float] = []
+        self._peak = self._inflight
+        self._window_start = now
+        self._seen = _upstream()
+
+    # ---- slots ----
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._inflight >= self._limit:
+                return False
+            self._take()
+            return True
+
+    def _take(self):
+        self._inflight += 1
+        self._peak = max(self._peak, self._inflight)
+
+    async def acquire(self):
+        with self._lock:
+            if self._inflight < self._limit and not self._waiters:
+                self._take()
+                return
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = fut.done() and not fut.cancelled()
+                if not granted and fut in self._waiters:
+                    self._waiters.remove(fut)
+            if granted:
+                self.release()
+            raise
+
+    def release(self, latency: Optional[float] = None):
+        """Give a slot back; latency (seconds) of a finished analysis feeds the controller."""
+        with self._lock:
+            self._inflight -= 1
+            if latency is not None and self.adaptive:
+                self._samples.append(latency)
+                now = time.monotonic()
+                if len(self._samples) >= max(_MIN_WINDOW, self._limit) or \
+                        now - self._window_start >= _MAX_WINDOW_SECONDS:
+                    self._adjust(now)
+            self._wake()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        started = time.monotonic()
+        latency = None
+        try:
+            yield
+            latency = time.monotonic() - started
+        except Exception:
+            latency = time.monotonic() - started   # a failed analysis took its time too
+            raise
+        finally:
+            self.release(latency)
+
+    def _wake(self):
+        # Called with the lock held
+        while self._waiters and self._inflight < self._limit:
+            fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            self._take()
+            fut.get_loop().call_soon_threadsafe(self._grant, fut)
+
+    def _grant(self, fut: asyncio.Future):
+        if fut.cancelled():   # its waiter gave up after the slot was taken for it
+            self.release()
+        else:
+            fut.set_result(None)
+
+    # ---- control ----
+
+    def _adjust(self, now: float):
+        # Called with the lock held, when a window of finished analyses closes
+        throttled, failed, total = (a - b for a, b in zip(_upstream(), self._seen))
+        median = statistics.median(self._samples)
+        if self._baseline is None:
+            self._baseline = median
+        else:
+            weight = (_BASELINE_FALL if median < self._baseline else
+                      _BASELINE_RISE_STUCK if self._latency_cuts >= _STUCK_CUTS else
+                      1 - math.exp(-(now - self._window_start) / _BASELINE_RISE_SECONDS))
+            self._baseline += weight * (median - self._baseline)
+
+        if throttled > 0:
+            reason = "throttled"
+        elif total >= _MIN_REQUESTS and failed / total > CONCURRENCY_ERROR_RATE:
+            reason = "errors"
+        elif median > self._baseline * CONCURRENCY_LATENCY_RATIO:
+            reason = "latency"
+        else:
+            reason = ""
+
+        if reason != "latency":
+            self._latency_cuts, self._cut_median = 0, 0.0
+        old = self._limit
+        if reason:
+            if now >= self._hold_until:
+                self._limit = max(self.min_limit, math.floor(old * CONCURRENCY_BACKOFF))
+                self._slow_start = False
+                self._hold_until = now + median
+                if reason == "latency":
+                    self._latency_cuts = self._latency_cuts + 1 if median >= 0.9 * self._cut_median else 1
+                    self._cut_median = median
+        elif self._peak >= old:   # only grow a limit that is actually the bottleneck
+            step = len(self._samples) if self._slow_start else 1
+            self._limit = min(self.max_limit, old + step, 2 * old)
+            reason = "slow start" if self._slow_start else "increase"
+        if self._limit != old:
+            self._last_change = reason
+            SCAN_CONCURRENCY_CHANGES.inc(chain=self.name, direction="up" if self._limit > old else "down",
+                                         reason=reason)
+            log.debug("%s: concurrency %s -> %s (%s; median %.2fs, baseline %.2fs, %d throttled, %d/%d failed)",
+                      self.name, old, self._limit, reason, median, self._baseline, throttled, failed, total)
+        self._new_window(now)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {"limit": self._limit, "in_flight": self._inflight, "waiting": len(self._waiters),
+                    "adaptive": self.adaptive, "min": self.min_limit, "max": self.max_limit,
+                    "baseline_s": round(self._baseline, 3) if self._baseline is not None else None,
+                    "last_change": self._last_change or None}
+
+
+_LIMITS: Dict[str, AdaptiveLimit] = {}
+_LIMITS_LOCK = threading.Lock()
+
+
+def concurrency_limit(chain: str) -> AdaptiveLimit:
+    """The process-wide limit for scans on chain."""
+    with _LIMITS_LOCK:
+        limit = _LIMITS.get(chain)
+        if limit is None:
+            limit = _LIMITS[chain] = AdaptiveLimit(chain)
+        return limit
+
+
+def concurrency_stats() -> Dict[str, Dict[str, object]]:
+    with _LIMITS_LOCK:
+        limits = dict(_LIMITS)
+    return {chain: limit.stats() for chain, limit in sorted(limits.items())}
+
+
+__all__ = ["AdaptiveLimit", "concurrency_limit", "concurrency_stats", "default_ceiling",
+           "CONCURRENCY_ADAPTIVE", "CONCURRENCY_MAX"]
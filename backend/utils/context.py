@@ -6,86 +6,181 @@
 #   3) Earliest token transfer timestamp (ETH via V1; BSC only if BSCSCAN_API_KEY)
 #   4) Give up (return created_tx_unknown)
 #
+# Batch scans call prefetch_contract_ages() first: getcontractcreation takes up to
+# EXPLORER_CREATION_BATCH comma-separated addresses, so N tokens cost ~N/5 explorer calls
+# instead of N; each token's lookup then finds its answer in the cache/store.
+#
+# Creation info never changes: once found it is kept in the on-disk explorer store
+# (backend/db/store.py) and age is computed locally from the stored timestamp.
+#
 # Note: POA middleware is handled in backend/chains.get_w3_for_chain().
 
 from __future__ import annotations
+import asyncio
 import os
 import time
-from typing import Dict, Any, Optional
-import requests
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from backend.chains import get_w3_for_chain, get_async_w3_for_chain, get_chain_id, CHAINS, EXPLORER_V2_BASE
+from backend.db.store import get_store
+from backend.utils.cache import TTLCache
+from backend.utils.keypool import KeyPool, explorer_api_key
+from backend.utils.abi_loader import _host_key_for_v1
+from backend.utils.log import get_logger
+from backend.utils.explorer import http_get_json, http_get_json_async
+from backend.utils.rpc_batch import batch_requests, batch_requests_async
+from backend.utils.trace import span
 
-from backend.chains import get_w3_for_chain, CHAINS, EXPLORER_V2_BASE
+log = get_logger("CONTEXT")
+log.debug("module loaded")
 
-print("[CONTEXT] module loaded")
+# Addresses per getcontractcreation call (Etherscan's limit is 5)
+EXPLORER_CREATION_BATCH = max(1, int(os.getenv("EXPLORER_CREATION_BATCH", "5")))
 
 # ---------- helpers ----------
+# Each explorer lookup is split into request building + response parsing so the
+# sync (requests) and async (aiohttp) paths share both; both go through backend/utils/explorer.py.
 
-def _etherscan_v2_creation(chain_key: str, address: str, api_key: str) -> Optional[dict]:
-    """
-    Returns {"txHash": str|None, "timestamp": int|None} or None if not found.
-    """
+def _v2_creation_request(chain_key: str, address: str, api_key: "KeyPool | str") -> Tuple[str, str, dict]:
+    params = {"chainid": CHAINS[chain_key]["chainid"], "module": "contract", "action": "getcontractcreation",
+              "contractaddresses": address, "apikey": api_key}
+    return "etherscan_v2", EXPLORER_V2_BASE, params
+
+
+def _opt_int(value: Any) -> Optional[int]:
+    if value is None:
+        return None
     try:
-        chainid = CHAINS[chain_key]["chainid"]
-        url = (
-            f"{EXPLORER_V2_BASE}"
-            f"?chainid={chainid}"
-            f"&module=contract&action=getcontractcreation"
-            f"&contractaddresses={address}"
-            f"&apikey={api_key}"
-        )
-        print(f"[CONTEXT] V2 creation -> {url}")
-        r = requests.get(url, timeout=15)
-        r.raise_for_status()
-        data = r.json()
-        res = data.get("result") or []
-        if isinstance(res, list) and res:
-            item = res[0]
-            txh = item.get("txHash") or item.get("txhash")
-            ts = item.get("timestamp")
-            if ts is not None:
-                try:
-                    ts = int(ts)
-                except Exception:
-                    ts = None
-            print(f"[CONTEXT] V2 creation hit tx={txh} ts={ts}")
-            return {"txHash": txh, "timestamp": ts}
-        print(f"[CONTEXT] V2 creation miss: {data}")
-    except Exception as e:
-        print(f"[CONTEXT] V2 creation error: {e}")
+        return int(value)
+    except Exception:
+        return None
+
+
+def _creation_item(item: dict) -> dict:
+    return {"txHash": item.get("txHash") or item.get("txhash"), "timestamp": _opt_int(item.get("timestamp")),
+            "blockNumber": _opt_int(item.get("blockNumber"))}
+
+
+def _parse_creation_items(data: dict) -> Dict[str, dict]:
+    """Multi-address response -> {contract address (lower): _creation_item}."""
+    res = data.get("result") or []
+    out: Dict[str, dict] = {}
+    if isinstance(res, list):
+        for item in res:
+            addr = str(item.get("contractAddress") or "").lower() if isinstance(item, dict) else ""
+            if addr:
+                out[addr] = _creation_item(item)
+    return out
+
+
+def _parse_v2_creation(data: dict) -> Optional[dict]:
+    res = data.get("result") or []
+    if isinstance(res, list) and res:
+        item = _creation_item(res[0])
+        log.debug("V2 creation hit tx=%s ts=%s", item["txHash"], item["timestamp"])
+        return item
+    log.debug("V2 creation miss: %s", data)
     return None
 
 
+def _v1_key(chain_key: str, what: str) -> "KeyPool | str | None":
+    """Etherscan keys on ETH; BSC needs BscScan keys, otherwise the V1 lookup is skipped."""
+    if chain_key == "eth":
+        return explorer_api_key("etherscan")
+    key = explorer_api_key("bscscan")
+    if not key:
+        log.debug("skip %s on non-eth without chain-specific key", what)
+        return None
+    return key
+
+
+def _v1_creation_request(chain_key: str, address: str) -> Optional[Tuple[str, str, dict]]:
+    key = _v1_key(chain_key, "V1 creation")
+    if key is None:
+        return None
+    host = CHAINS[chain_key]["explorer_v1_host"]
+    params = {"module": "contract", "action": "getcontractcreation", "contractaddresses": address, "apikey": key}
+    return _host_key_for_v1(host), host, params
+
+
+def _parse_v1_creation(data: dict) -> Optional[str]:
+    res = data.get("result") or []
+    if isinstance(res, list) and res:
+        txh = res[0].get("txHash") or res[0].get("txhash")
+        if txh:
+            log.debug("V1 creation tx = %s", txh)
+            return txh
+    log.debug("V1 creation miss: %s", data)
+    return None
+
+
+def _tokentx_request(chain_key: str, address: str) -> Optional[Tuple[str, str, dict]]:
+    key = _v1_key(chain_key, "earliest tokentx")
+    if key is None:
+        return None
+    host = CHAINS[chain_key]["explorer_v1_host"]
+    params = {"module": "account", "action": "tokentx", "contractaddress": address,
+              "page": 1, "offset": 1, "sort": "asc", "apikey": key}
+    return _host_key_for_v1(host), host, params
+
+
+def _parse_tokentx(data: dict) -> Optional[int]:
+    res = data.get("result") or []
+    if isinstance(res, list) and res:
+        ts = res[0].get("timeStamp") or res[0].get("timestamp")
+        if ts:
+            try:
+                ts_int = int(ts)
+                log.debug("earliest tokentx timestamp = %s", ts_int)
+                return ts_int
+            except Exception as e:
+                log.debug("ts parse error: %s", e)
+    log.debug("earliest tokentx miss: %s", data)
+    return None
+
+
+def _explorer_get(label: str, req: Optional[Tuple[str, str, dict]]) -> Optional[dict]:
+    """Rate-limited GET through the explorer client (sync path). None when the lookup is skipped or fails."""
+    if req is None:
+        return None
+    host_key, url, params = req
+    try:
+        log.debug("%s -> %s %s", label, url, params.get('action'))
+        return http_get_json(host_key, url, params)
+    except Exception as e:
+        log.warning("%s error: %s", label, e)
+        return None
+
+
+async def _explorer_get_async(label: str, req: Optional[Tuple[str, str, dict]]) -> Optional[dict]:
+    """Rate-limited aiohttp GET (async path). None when the lookup is skipped or fails."""
+    if req is None:
+        return None
+    host_key, url, params = req
+    try:
+        log.debug("%s (async) -> %s %s", label, url, params.get('action'))
+        return await http_get_json_async(host_key, url, params)
+    except Exception as e:
+        log.warning("%s error: %s", label, e)
+        return None
+
+
+def _etherscan_v2_creation(chain_key: str, address: str, api_key: "KeyPool | str") -> Optional[dict]:
+    """
+    Returns {"txHash": str|None, "timestamp": int|None, "blockNumber": int|None} or None if not found.
+    """
+    data = _explorer_get("V2 creation", _v2_creation_request(chain_key, address, api_key))
+    return _parse_v2_creation(data) if data is not None else None
+
+
 def _etherscan_v1_creation(chain_key: str, address: str) -> Optional[str]:
     """
     Legacy v1 creation lookup.
     - Uses ETHERSCAN_API_KEY on ETH
     - Uses BSCSCAN_API_KEY on BSC (if present), otherwise skips
     """
-    try:
-        host = CHAINS[chain_key]["explorer_v1_host"]
-        if chain_key == "eth":
-            key = os.getenv("ETHERSCAN_API_KEY", "")
-        else:
-            key = os.getenv("BSCSCAN_API_KEY", "")
-            if not key:
-                print("[CONTEXT] skip V1 creation on non-eth without chain-specific key")
-                return None
-
-        url = f"{host}?module=contract&action=getcontractcreation&contractaddresses={address}&apikey={key}"
-        print(f"[CONTEXT] V1 creation -> {url}")
-        r = requests.get(url, timeout=15)
-        r.raise_for_status()
-        data = r.json()
-        res = data.get("result") or []
-        if isinstance(res, list) and res:
-            txh = res[0].get("txHash") or res[0].get("txhash")
-            if txh:
-                print(f"[CONTEXT] V1 creation tx = {txh}")
-                return txh
-        print(f"[CONTEXT] V1 creation miss: {data}")
-    except Exception as e:
-        print(f"[CONTEXT] V1 creation error: {e}")
-    return None
+    data = _explorer_get("V1 creation", _v1_creation_request(chain_key, address))
+    return _parse_v1_creation(data) if data is not None else None
 
 
 def _etherscan_earliest_tokentx_timestamp(chain_key: str, address: str) -> Optional[int]:
@@ -94,106 +189,360 @@ def _etherscan_earliest_tokentx_timestamp(chain_key: str, address: str) -> Optio
     - ETH uses Etherscan V1 with ETHERSCAN_API_KEY
     - BSC requires BSCSCAN_API_KEY; otherwise skip
     """
-    try:
-        if chain_key == "eth":
-            host = CHAINS[chain_key]["explorer_v1_host"]
-            key = os.getenv("ETHERSCAN_API_KEY", "")
-        else:
-            key = os.getenv("BSCSCAN_API_KEY", "")
-            if not key:
-                print("[CONTEXT] skip earliest tokentx on non-eth without chain-specific key")
-                return None
-            host = CHAINS[chain_key]["explorer_v1_host"]
-
-        url = (
-            f"{host}?module=account&action=tokentx"
-            f"&contractaddress={address}&page=1&offset=1&sort=asc&apikey={key}"
-        )
-        print(f"[CONTEXT] earliest tokentx -> {url}")
-        r = requests.get(url, timeout=15)
-        r.raise_for_status()
-        data = r.json()
-        res = data.get("result") or []
-        if isinstance(res, list) and res:
-            ts = res[0].get("timeStamp") or res[0].get("timestamp")
-            if ts:
-                try:
-                    ts_int = int(ts)
-                    print(f"[CONTEXT] earliest tokentx timestamp = {ts_int}")
-                    return ts_int
-                except Exception as e:
-                    print(f"[CONTEXT] ts parse error: {e}")
-        print(f"[CONTEXT] earliest tokentx miss: {data}")
-    except Exception as e:
-        print(f"[CONTEXT] earliest tokentx error: {e}")
-    return None
+    data = _explorer_get("earliest tokentx", _tokentx_request(chain_key, address))
+    return _parse_tokentx(data) if data is not None else None
+
+
+def _receipt_block(receipt, tx_hash: str) -> str:
+    if isinstance(receipt, Exception):
+        raise receipt
+    if not receipt or receipt.get("blockNumber") is None:
+        raise ValueError(f"receipt not found for {tx_hash}")
+    return receipt["blockNumber"]
+
+
+def _block_timestamp(block, number: str) -> int:
+    if isinstance(block, Exception):
+        raise block
+    if not block or block.get("timestamp") is None:
+        raise ValueError(f"block {number} not found")
+    return int(block["timestamp"], 16)
+
+
+def _tx_block_timestamp(w3, tx_hash: str) -> Tuple[int, int]:
+    """
+    Creation tx -> (block number, block timestamp) via raw JSON-RPC (receipt, then block header).
+    Both go through the chain's batcher, so concurrent tokens share array POSTs.
+    """
+    number = _receipt_block(batch_requests(w3, [("eth_getTransactionReceipt", [tx_hash])])[0], tx_hash)
+    return int(number, 16), _block_timestamp(batch_requests(w3, [("eth_getBlockByNumber", [number, False])])[0], number)
+
+
+async def _tx_block_timestamp_async(w3, tx_hash: str) -> Tuple[int, int]:
+    number = _receipt_block((await batch_requests_async(w3, [("eth_getTransactionReceipt", [tx_hash])]))[0], tx_hash)
+    return int(number, 16), _block_timestamp((await batch_requests_async(w3, [("eth_getBlockByNumber", [number, False])]))[0], number)
+
+
+def _age_days(ts: int) -> float:
+    return float((time.time() - int(ts)) / 86400.0)
+
+
+def _stored_creation(chain_key: str, address: str) -> Optional[Dict[str, Any]]:
+    """Result from the explorer store (no network), or None if this contract hasn't been seen."""
+    store = get_store()
+    rec = store.get_creation(CHAINS[chain_key]["chainid"], address) if store is not None else None
+    if rec is None:
+        return None
+    log.debug("stored creation tx=%s ts=%s (%s)", rec["tx_hash"], rec["timestamp"], rec["source"])
+    return {"age_days": _age_days(rec["timestamp"]), "created_tx": rec["tx_hash"]}
+
+
+def _remember_creation(chain_key: str, address: str, tx_hash: Optional[str], block_number: Optional[int],
+                       timestamp: int, source: str) -> Dict[str, Any]:
+    """Persist a found creation and return the usual result dict."""
+    store = get_store()
+    if store is not None:
+        store.put_creation(CHAINS[chain_key]["chainid"], address, tx_hash, block_number, timestamp, source)
+    return {"age_days": _age_days(timestamp), "created_tx": tx_hash}
 
 
 # ---------- main ----------
 
+# In front of the store: repeat lookups skip SQLite and concurrent ones share one explorer round.
+# Age drifts by at most ttl/86400 days; a failed client init is not cached.
+_AGES = TTLCache("context.contract_age", ttl_seconds=600)
+# (chain, address) -> sources ("v2", "v1") a batch prefetch asked that had no record for it
+_UNANSWERED = TTLCache("context.creation_unanswered", ttl_seconds=600)
+
+
+def _age_key(chain_key: str, token_address: str):
+    return chain_key, token_address.lower()
+
+
+def _cacheable_age(result: Dict[str, Any]) -> bool:
+    return not str(result.get("error") or "").startswith("w3_init_failed")
+
+
+@_AGES.memoize(key=_age_key, cache_if=_cacheable_age)
 def get_contract_age_days(chain_key: str, token_address: str) -> Dict[str, Any]:
     """
     Return:
       { "age_days": float, "created_tx": "0x..." }  on success
       { "age_days": None,  "error": "..." }         on failure
     """
-    print(f"[CONTEXT] start chain={chain_key} addr={token_address}")
+    log.debug("start chain=%s addr=%s", chain_key, token_address)
+    stored = _stored_creation(chain_key, token_address)
+    if stored is not None:
+        return stored
 
-    # web3 (only needed if we must fetch block timestamp via tx receipt)
+    # web3 (only needed if we must fetch block timestamp via tx receipt; shared pooled client)
     try:
         w3 = get_w3_for_chain(chain_key)
-        print(f"[CONTEXT] web3 ok chainId={w3.eth.chain_id}")
+        log.debug("web3 ok chainId=%s", get_chain_id(chain_key))
     except Exception as e:
         msg = f"w3_init_failed: {e}"
-        print(f"[CONTEXT] {msg}")
+        log.warning("%s", msg)
         return {"age_days": None, "error": msg}
 
+    # Sources a batch prefetch already asked without an answer aren't asked again
+    asked = _UNANSWERED.get(_age_key(chain_key, token_address), ())
+
     # 1) Etherscan V2 (single key, works for ETH + BSC via chainid)
-    v2 = _etherscan_v2_creation(chain_key, token_address, os.getenv("ETHERSCAN_API_KEY", ""))
+    v2 = None if "v2" in asked else _etherscan_v2_creation(chain_key, token_address,
+                                                            explorer_api_key("etherscan"))
     if v2:
         ts = v2.get("timestamp")
         txh = v2.get("txHash")
         # Prefer direct timestamp if provided
         if ts is not None:
-            try:
-                age_days = (time.time() - int(ts)) / 86400.0
-                print(f"[CONTEXT] V2 timestamp age_days={age_days}")
-                return {"age_days": float(age_days), "created_tx": txh}
-            except Exception as e:
-                print(f"[CONTEXT] V2 ts parse error: {e}")
+            log.debug("V2 timestamp age_days=%s", _age_days(ts))
+            return _remember_creation(chain_key, token_address, txh, v2.get("blockNumber"), ts, "v2")
         # Else compute from block via receipt
         if txh:
             try:
-                txr = w3.eth.get_transaction_receipt(txh)
-                blk = w3.eth.get_block(txr.blockNumber)
-                age_days = (time.time() - blk.timestamp) / 86400.0
-                print(f"[CONTEXT] V2 tx age_days={age_days}")
-                return {"age_days": float(age_days), "created_tx": txh}
+                block, ts = _tx_block_timestamp(w3, txh)
+                log.debug("V2 tx age_days=%s", _age_days(ts))
+                return _remember_creation(chain_key, token_address, txh, block, ts, "v2")
             except Exception as e:
-                print(f"[CONTEXT] V2 tx age lookup failed: {e}")
+                log.warning("V2 tx age lookup failed: %s", e)
 
     # 2) Legacy V1 creation (ETH or if chain-specific key exists)
-    tx_v1 = _etherscan_v1_creation(chain_key, token_address)
+    tx_v1 = None if "v1" in asked else _etherscan_v1_creation(chain_key, token_address)
     if tx_v1:
         try:
-            txr = w3.eth.get_transaction_receipt(tx_v1)
-            blk = w3.eth.get_block(txr.blockNumber)
-            age_days = (time.time() - blk.timestamp) / 86400.0
-            print(f"[CONTEXT] V1 tx age_days={age_days}")
-            return {"age_days": float(age_days), "created_tx": tx_v1}
+            block, ts = _tx_block_timestamp(w3, tx_v1)
+            log.debug("V1 tx age_days=%s", _age_days(ts))
+            return _remember_creation(chain_key, token_address, tx_v1, block, ts, "v1")
         except Exception as e:
-            print(f"[CONTEXT] V1 tx age lookup failed: {e}")
+            log.warning("V1 tx age lookup failed: %s", e)
 
     # 3) Earliest transfer timestamp (when supported)
     ts2 = _etherscan_earliest_tokentx_timestamp(chain_key, token_address)
     if ts2:
+        log.debug("Fallback age_days=%s (earliest tokentx)", _age_days(ts2))
+        return _remember_creation(chain_key, token_address, None, None, ts2, "tokentx")
+
+    # 4) Give up
+    log.debug("created_tx_unknown (all fallbacks failed)")
+    return {"age_days": None, "error": "created_tx_unknown"}
+
+
+@_AGES.memoize(key=_age_key, cache_if=_cacheable_age)
+async def get_contract_age_days_async(chain_key: str, token_address: str) -> Dict[str, Any]:
+    """get_contract_age_days() on the event loop (aiohttp explorer calls, AsyncWeb3 receipts)."""
+    log.debug("start (async) chain=%s addr=%s", chain_key, token_address)
+    stored = await asyncio.to_thread(_stored_creation, chain_key, token_address)
+    if stored is not None:
+        return stored
+    try:
+        w3 = await get_async_w3_for_chain(chain_key)
+    except Exception as e:
+        msg = f"w3_init_failed: {e}"
+        log.warning("%s", msg)
+        return {"age_days": None, "error": msg}
+
+    asked = _UNANSWERED.get(_age_key(chain_key, token_address), ())
+    data = None if "v2" in asked else await _explorer_get_async(
+        "V2 creation", _v2_creation_request(chain_key, token_address, explorer_api_key("etherscan")))
+    v2 = _parse_v2_creation(data) if data is not None else None
+    if v2:
+        ts = v2.get("timestamp")
+        txh = v2.get("txHash")
+        if ts is not None:
+            return await asyncio.to_thread(_remember_creation, chain_key, token_address, txh,
+                                           v2.get("blockNumber"), ts, "v2")
+        if txh:
+            try:
+                block, ts = await _tx_block_timestamp_async(w3, txh)
+                return await asyncio.to_thread(_remember_creation, chain_key, token_address, txh, block, ts, "v2")
+            except Exception as e:
+                log.warning("V2 tx age lookup failed: %s", e)
+
+    data = None if "v1" in asked else await _explorer_get_async(
+        "V1 creation", _v1_creation_request(chain_key, token_address))
+    tx_v1 = _parse_v1_creation(data) if data is not None else None
+    if tx_v1:
         try:
-            age_days = (time.time() - int(ts2)) / 86400.0
-            print(f"[CONTEXT] Fallback age_days={age_days} (earliest tokentx)")
-            return {"age_days": float(age_days), "created_tx": None}
+            block, ts = await _tx_block_timestamp_async(w3, tx_v1)
+            return await asyncio.to_thread(_remember_creation, chain_key, token_address, tx_v1, block, ts, "v1")
         except Exception as e:
-            print(f"[CONTEXT] tokentx age calc error: {e}")
+            log.warning("V1 tx age lookup failed: %s", e)
 
-    # 4) Give up
-    print("[CONTEXT] created_tx_unknown (all fallbacks failed)")
+    data = await _explorer_get_async("earliest tokentx", _tokentx_request(chain_key, token_address))
+    ts2 = _parse_tokentx(data) if data is not None else None
+    if ts2:
+        return await asyncio.to_thread(_remember_creation, chain_key, token_address, None, None, ts2, "tokentx")
+
+    log.debug("created_tx_unknown (all fallbacks failed)")
     return {"age_days": None, "error": "created_tx_unknown"}
+
+
+# ---------- batch prefetch ----------
+
+def _pending_creations(chain_key: str, addresses: Iterable[str]) -> List[str]:
+    """Unique lowercased addresses with nothing in the store yet (malformed ones are left to the scan)."""
+    out: List[str] = []
+    seen = set()
+    for a in addresses:
+        addr = str(a or "").strip().lower()
+        if len(addr) != 42 or not addr.startswith("0x") or addr in seen:
+            continue
+        seen.add(addr)
+        if _stored_creation(chain_key, addr) is None:
+            out.append(addr)
+    return out
+
+
+def _creation_batches(chain_key: str, source: str, addresses: List[str]) -> List[Tuple[str, str, dict]]:
+    """One getcontractcreation request per EXPLORER_CREATION_BATCH addresses ([] if the source is skipped)."""
+    reqs = []
+    for i in range(0, len(addresses), EXPLORER_CREATION_BATCH):
+        joined = ",".join(addresses[i:i + EXPLORER_CREATION_BATCH])
+        if source == "v2":
+            req = _v2_creation_request(chain_key, joined, explorer_api_key("etherscan"))
+        else:
+            req = _v1_creation_request(chain_key, joined)
+        if req is None:
+            return []
+        reqs.append(req)
+    return reqs
+
+
+def _batch_answered(req: Tuple[str, str, dict], data: Optional[dict]) -> List[str]:
+    """Addresses a chunk's response speaks for: all of them on a real answer or "No data found",
+    none on a failed request or an error (rate limit, bad key) that says nothing about them."""
+    if data is None:
+        return []
+    res = data.get("result")
+    if isinstance(res, list) or "no data found" in f"{data.get('message')} {res}".lower():
+        return req[2]["contractaddresses"].split(",")
+    log.warning("creation batch error: %s", res or data.get("message"))
+    return []
+
+
+def _missing_timestamps(items: Dict[str, dict]) -> List[str]:
+    return sorted({it["txHash"] for it in items.values() if it["timestamp"] is None and it["txHash"]})
+
+
+def _receipt_numbers(txs: List[str], receipts: list) -> Dict[str, str]:
+    numbers = {}
+    for tx, receipt in zip(txs, receipts):
+        try:
+            numbers[tx] = _receipt_block(receipt, tx)
+        except Exception as e:
+            log.debug("prefetch: %s", e)
+    return numbers
+
+
+def _tx_times(numbers: Dict[str, str], uniq: List[str], blocks: list) -> Dict[str, Tuple[int, int]]:
+    stamps = {}
+    for number, block in zip(uniq, blocks):
+        try:
+            stamps[number] = _block_timestamp(block, number)
+        except Exception as e:
+            log.debug("prefetch: %s", e)
+    return {tx: (int(n, 16), stamps[n]) for tx, n in numbers.items() if n in stamps}
+
+
+def _tx_block_timestamps(w3, txs: List[str]) -> Dict[str, Tuple[int, int]]:
+    """_tx_block_timestamp for many txs: one receipts batch, then one batch of distinct blocks."""
+    if not txs:
+        return {}
+    numbers = _receipt_numbers(txs, batch_requests(w3, [("eth_getTransactionReceipt", [t]) for t in txs]))
+    uniq = sorted(set(numbers.values()))
+    blocks = batch_requests(w3, [("eth_getBlockByNumber", [n, False]) for n in uniq]) if uniq else []
+    return _tx_times(numbers, uniq, blocks)
+
+
+async def _tx_block_timestamps_async(w3, txs: List[str]) -> Dict[str, Tuple[int, int]]:
+    if not txs:
+        return {}
+    numbers = _receipt_numbers(txs, await batch_requests_async(w3, [("eth_getTransactionReceipt", [t]) for t in txs]))
+    uniq = sorted(set(numbers.values()))
+    blocks = await batch_requests_async(w3, [("eth_getBlockByNumber", [n, False]) for n in uniq]) if uniq else []
+    return _tx_times(numbers, uniq, blocks)
+
+
+def _record_creations(chain_key: str, source: str, asked: List[str], items: Dict[str, dict],
+                      times: Dict[str, Tuple[int, int]]) -> Dict[str, Dict[str, Any]]:
+    """Persist + cache what one source answered; note the asked addresses it had no record for."""
+    found: Dict[str, Dict[str, Any]] = {}
+    for addr, it in items.items():
+        block, ts = it["blockNumber"], it["timestamp"]
+        if ts is None and it["txHash"] in times:
+            block, ts = times[it["txHash"]]
+        if ts is None:
+            continue
+        found[addr] = _remember_creation(chain_key, addr, it["txHash"], block, ts, source)
+        _AGES.put(_age_key(chain_key, addr), found[addr])
+    for addr in asked:
+        if addr not in items:
+            key = _age_key(chain_key, addr)
+            _UNANSWERED.put(key, _UNANSWERED.get(key, ()) + (source,))
+    return found
+
+
+def prefetch_contract_ages(chain_key: str, addresses: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolve creation info for a whole batch up front, EXPLORER_CREATION_BATCH addresses per
+    explorer call (V2, then V1 for what V2 didn't know). Results are stored and cached, so
+    get_contract_age_days() for these tokens needs no explorer call; addresses nobody knew
+    go straight to the earliest-tokentx fallback. Returns {address (lower): result}.
+    """
+    pending = _pending_creations(chain_key, addresses)
+    if not pending:
+        return {}
+    w3 = get_w3_for_chain(chain_key)
+    found: Dict[str, Dict[str, Any]] = {}
+    with span("prefetch_contract_ages", kind="step", tokens=len(pending)):
+        for source in ("v2", "v1"):
+            todo = [a for a in pending if a not in found]
+            reqs = _creation_batches(chain_key, source, todo)
+            if not reqs:
+                continue
+            items: Dict[str, dict] = {}
+            asked: List[str] = []
+            for req in reqs:
+                data = _explorer_get(f"{source.upper()} creation batch", req)
+                asked += _batch_answered(req, data)
+                if data is not None:
+                    items.update(_parse_creation_items(data))
+            try:
+                times = _tx_block_timestamps(w3, _missing_timestamps(items))
+            except Exception as e:
+                log.warning("%s batch tx age lookup failed: %s", source.upper(), e)
+                times = {}
+            found.update(_record_creations(chain_key, source, asked, items, times))
+    log.info("prefetched creation info for %d/%d tokens", len(found), len(pending))
+    return found
+
+
+async def prefetch_contract_ages_async(chain_key: str, addresses: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """prefetch_contract_ages() on the event loop; a source's chunks are requested concurrently."""
+    pending = await asyncio.to_thread(_pending_creations, chain_key, list(addresses))
+    if not pending:
+        return {}
+    w3 = await get_async_w3_for_chain(chain_key)
+    found: Dict[str, Dict[str, Any]] = {}
+    with span("prefetch_contract_ages", kind="step", tokens=len(pending)):
+        for source in ("v2", "v1"):
+            todo = [a for a in pending if a not in found]
+            reqs = _creation_batches(chain_key, source, todo)
+            if not reqs:
+                continue
+            items: Dict[str, dict] = {}
+            asked: List[str] = []
+            responses = await asyncio.gather(*(_explorer_get_async(f"{source.upper()} creation batch", req)
+                                               for req in reqs))
+            for req, data in zip(reqs, responses):
+                asked += _batch_answered(req, data)
+                if data is not None:
+                    items.update(_parse_creation_items(data))
+            try:
+                times = await _tx_block_timestamps_async(w3, _missing_timestamps(items))
+            except Exception as e:
+                log.warning("%s batch tx age lookup failed: %s", source.upper(), e)
+                times = {}
+            found.update(await asyncio.to_thread(_record_creations, chain_key, source, asked, items, times))
+    log.info("prefetched creation info for %d/%d tokens", len(found), len(pending))
+    return found
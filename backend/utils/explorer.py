@@ -0,0 +1,263 @@
+# backend/utils/explorer.py
+# Purpose: The one HTTP client for explorer APIs (Etherscan V2, Etherscan/BscScan V1).
+#
+#   data = http_get_json("etherscan_v2", EXPLORER_V2_BASE, params)              # threads
+#   data = await http_get_json_async("etherscan_v2", EXPLORER_V2_BASE, params)  # event loop
+#
+# - Keep-alive connections: one requests.Session per process (shared by threads) and one
+#   aiohttp session per event loop, EXPLORER_POOL_SIZE connections each.
+# - Rate limiting through ratelimit.acquire(): lanes, per-job budgets, API key pools and the
+#   cross-process buckets. params["apikey"] may be a KeyPool; each attempt picks a key.
+# - Retries (up to EXPLORER_ATTEMPTS tries) on 429/5xx, connection errors, bodies that aren't JSON
+#   (HTML error pages, cut-off answers) and transient NOTOK answers ("Max rate limit reached",
+#   query timeouts), waiting at least the server's Retry-After.
+# - Decoding: a status "0" answer that means "nothing here" (no data found, no transactions,
+#   source not verified) is returned like any other; every other NOTOK raises ExplorerError,
+#   so a rate-limit or bad-key message is never mistaken for a result.
+# - Errors name the host key and the exception class only: requests/aiohttp messages carry the
+#   request URL, API key included, and ExplorerError text ends up in API answers and job results.
+
+from __future__ import annotations
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional, Tuple
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.utils.keypool import ApiKey, KeyPool, key_error
+from backend.utils.metrics import EXPLORER_429, EXPLORER_REQUESTS, EXPLORER_RETRIES
+from backend.utils.ratelimit import acquire, acquire_async, bucket_name
+from backend.utils.shared_limit import shared_drain
+from backend.utils.trace import annotate, span
+
+EXPLORER_POOL_SIZE = int(os.getenv("EXPLORER_POOL_SIZE", "16"))   # keep-alive connections per session
+EXPLORER_ATTEMPTS = int(os.getenv("EXPLORER_ATTEMPTS", "6"))       # tries per request (first one included)
+
+_MAX_RETRY_AFTER = 60.0
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# status "0" answers that are results, not errors
+_EMPTY_HINTS = ("no data found", "no transactions found", "no records found", "not verified")
+# NOTOK answers worth retrying
+_TRANSIENT_HINTS = ("rate limit", "timeout", "unexpected error", "too busy", "try again")
+
+
+class ExplorerError(RuntimeError):
+    """An explorer request that failed for good: an error answer, or retries used up."""
+
+    def __init__(self, message: str, status: Optional[int] = None, data: Any = None):
+        super().__init__(message)
+        self.status = status
+        self.data = data
+
+
+def _notok(data: Any) -> Optional[Tuple[str, bool]]:
+    """(message, transient) when data is an error answer; None when it is a result."""
+    if not isinstance(data, dict) or str(data.get("status", "1")) != "0":
+        return None
+    text = f"{data.get('message')} {data.get('result')}".lower()
+    if any(h in text for h in _EMPTY_HINTS):
+        return None
+    message = str(data.get("result") or data.get("message") or "NOTOK")
+    return message, "daily" not in text and any(h in text for h in _TRANSIENT_HINTS)
+
+
+def _retry_after(headers: Any) -> float:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), 0 if absent."""
+    raw = headers.get("Retry-After") if headers is not None else None
+    if not raw:
+        return 0.0
+    try:
+        seconds = float(raw)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(raw).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return 0.0
+    return min(max(0.0, seconds), _MAX_RETRY_AFTER)
+
+
+def _split_key(params: dict) -> Tuple[Optional[KeyPool], dict]:
+    pool = params.get("apikey")
+    return (pool, params) if isinstance(pool, KeyPool) else (None, params)
+
+
+def _with_key(params: dict, key: Optional[ApiKey]) -> dict:
+    return params if key is None else {**params, "apikey": key.key}
+
+
+def _count_response(host_key: str, status: int, key: Optional[ApiKey]) -> None:
+    EXPLORER_REQUESTS.inc(host_key=host_key, status=str(status))
+    if status == 429:
+        EXPLORER_429.inc(host_key=host_key)
+        shared_drain(bucket_name(host_key, key))
+
+
+class _Retry:
+    def __init__(self, reason: str, wait: float, backoff: bool, error: ExplorerError):
+        self.reason, self.wait, self.backoff, self.error = reason, wait, backoff, error
+
+
+def _decide(host_key: str, pool: Optional[KeyPool], key: Optional[ApiKey], status: int,
+            headers: Any, body: bytes) -> Any:
+    """One response -> the decoded data, a _Retry, or an ExplorerError to raise."""
+    retry_after = _retry_after(headers)
+    if status == 200:
+        try:
+            data = json.loads(body)
+        except ValueError:   # also UnicodeDecodeError
+            return _Retry("bad_body", retry_after, True, ExplorerError(f"{host_key}: answer is not JSON", status))
+        reason = key_error(data) if key is not None else None
+        if reason is not None:
+            pool.bench(key, reason)   # the next attempt goes to another key
+            return _Retry(f"key_{reason}", retry_after, False, ExplorerError(f"{host_key}: {reason}", status, data))
+        if key is not None:
+            pool.ok(key)
+        err = _notok(data)
+        if err is None:
+            return data
+        message, transient = err
+        if not transient:
+            return ExplorerError(f"{host_key}: {message}", status, data)
+        return _Retry("notok", retry_after, True, ExplorerError(f"{host_key}: {message}", status, data))
+    error = ExplorerError(f"{host_key}: HTTP {status}", status)
+    if status == 429 and key is not None:
+        pool.bench(key, "rate")
+        return _Retry("429", retry_after, False, error)
+    if status in _RETRY_STATUSES:
+        return _Retry(str(status), retry_after, True, error)
+    return error
+
+
+# ---------- threads ----------
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _session() -> requests.Session:
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, EXPLORER_POOL_SIZE))
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _SESSION = session
+    return _SESSION
+
+
+def http_get_json(host_key: str, url: str, params: dict, max_qps: float | None = None, timeout: int = 15) -> Any:
+    """Rate-limited GET with retries; the decoded JSON answer, or raises ExplorerError."""
+    with span(f"explorer {host_key}", kind="explorer", module=params.get("module"), action=params.get("action")):
+        return _http_get_json(host_key, url, params, max_qps, timeout)
+
+
+def _http_get_json(host_key: str, url: str, params: dict, max_qps: float | None, timeout: int) -> Any:
+    pool, params = _split_key(params)
+    backoff = 0.5
+    for attempt in range(1, max(1, EXPLORER_ATTEMPTS) + 1):
+        last = attempt >= EXPLORER_ATTEMPTS
+        key = acquire(host_key, max_qps, pool)
+        try:
+            resp = _session().get(url, params=_with_key(params, key), timeout=timeout)
+            _count_response(host_key, resp.status_code, key)
+            annotate(status=resp.status_code, attempts=attempt, bytes_in=len(resp.content))
+            outcome = _decide(host_key, pool, key, resp.status_code, resp.headers, resp.content)
+        except requests.RequestException as e:
+            if getattr(e, "response", None) is None:
+                EXPLORER_REQUESTS.inc(host_key=host_key, status="error")
+            error = ExplorerError(f"{host_key}: {e.__class__.__name__}")   # not str(e): it holds the URL
+            if last:
+                raise error from e
+            outcome = _Retry(e.__class__.__name__, 0.0, True, error)
+        if isinstance(outcome, ExplorerError):
+            raise outcome
+        if not isinstance(outcome, _Retry):
+            return outcome
+        if last:
+            raise outcome.error
+        EXPLORER_RETRIES.inc(host_key=host_key, reason=outcome.reason)
+        wait = outcome.wait
+        if outcome.backoff:
+            wait = max(wait, backoff + random.uniform(0, 0.2))
+            backoff = min(backoff * 2, 4.0)
+        if wait > 0:
+            time.sleep(wait)
+    raise AssertionError("unreachable")
+
+
+# ---------- asyncio ----------
+
+# One aiohttp session per event loop (sessions can't be shared across loops)
+_ASYNC_SESSIONS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+
+def _get_async_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    session = _ASYNC_SESSIONS.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max(1, EXPLORER_POOL_SIZE)))
+        _ASYNC_SESSIONS[loop] = session
+    return session
+
+
+async def http_get_json_async(host_key: str, url: str, params: dict, max_qps: float | None = None,
+                              timeout: int = 15) -> Any:
+    """Async twin of http_get_json: same limiter, retry policy and decoding, no thread blocked."""
+    with span(f"explorer {host_key}", kind="explorer", module=params.get("module"), action=params.get("action")):
+        return await _http_get_json_async(host_key, url, params, max_qps, timeout)
+
+
+async def _http_get_json_async(host_key: str, url: str, params: dict, max_qps: float | None, timeout: int) -> Any:
+    pool, params = _split_key(params)
+    session = _get_async_session()
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    backoff = 0.5
+    for attempt in range(1, max(1, EXPLORER_ATTEMPTS) + 1):
+        last = attempt >= EXPLORER_ATTEMPTS
+        key = await acquire_async(host_key, max_qps, pool)
+        try:
+            async with session.get(url, params=_with_key(params, key), timeout=client_timeout) as resp:
+                body = await resp.read()
+                _count_response(host_key, resp.status, key)
+                annotate(status=resp.status, attempts=attempt, bytes_in=len(body))
+                outcome = _decide(host_key, pool, key, resp.status, resp.headers, body)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            EXPLORER_REQUESTS.inc(host_key=host_key, status="error")
+            error = ExplorerError(f"{host_key}: {e.__class__.__name__}")   # not str(e): it holds the URL
+            if last:
+                raise error from e
+            outcome = _Retry(e.__class__.__name__, 0.0, True, error)
+        if isinstance(outcome, ExplorerError):
+            raise outcome
+        if not isinstance(outcome, _Retry):
+            return outcome
+        if last:
+            raise outcome.error
+        EXPLORER_RETRIES.inc(host_key=host_key, reason=outcome.reason)
+        wait = outcome.wait
+        if outcome.backoff:
+            wait = max(wait, backoff + random.uniform(0, 0.2))
+            backoff = min(backoff * 2, 4.0)
+        if wait > 0:
+            await asyncio.sleep(wait)
+    raise AssertionError("unreachable")
+
+
+async def close_async_sessions():
+    """Close the explorer session of the running loop (app shutdown)."""
+    session = _ASYNC_SESSIONS.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+__all__ = ["ExplorerError", "http_get_json", "http_get_json_async", "close_async_sessions"]
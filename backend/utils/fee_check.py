@@ -1,50 +1,29 @@
 # backend/utils/fee_check.py
 from __future__ import annotations
-from typing import Dict, List, Tuple
+from typing import Dict, List
 from web3 import Web3
+from backend.utils.abi_features import DENOM_KEYWORDS, FEE_KEYWORDS, analyze_abi
+from backend.utils.multicall import Multicall, value_or_none
 
-FEE_KEYWORDS = ["fee", "tax", "buy", "sell", "transfer"]
-DENOM_KEYWORDS = ["denominator", "feeDenominator", "taxDenominator", "feesDenominator"]
 TOTAL_SUPPLY_NAMES = ["totalSupply"]
 
-def _is_uint_type(t: str) -> bool:
-    return t.startswith("uint")
+def _queue_getters(mc: Multicall, address: str, names: List[str], out_types: Dict[str, str]) -> Dict[str, int]:
+    return {name: mc.add(address, f"{name}()", returns=[out_types[name]]) for name in names}
 
-def _collect_getters(abi: list, name_keywords: List[str]) -> List[str]:
-    """
-    From ABI, return names of view functions with:
-      - 0 inputs
-      - 1 output (uint*)
-      - name contains any of name_keywords
-    """
-    out = []
-    for item in abi:
-        if item.get("type") != "function":
-            continue
-        name = (item.get("name") or "")
-        if not any(kw.lower() in name.lower() for kw in name_keywords):
-            continue
-        # only getters with no inputs and single uint output
-        inputs = item.get("inputs", [])
-        outputs = item.get("outputs", [])
-        if len(inputs) == 0 and len(outputs) == 1:
-            otype = outputs[0].get("type", "")
-            if _is_uint_type(otype):
-                out.append(name)
-    return list(dict.fromkeys(out))  # dedupe, keep order
-
-def _try_call_getter(contract, fn_name: str) -> int | None:
-    try:
-        fn = getattr(contract.functions, fn_name)
-        val = fn().call()
-        if isinstance(val, int):
-            return val
-        # Some ABIs return (int,) tuple
-        if isinstance(val, (list, tuple)) and len(val) == 1 and isinstance(val[0], int):
-            return val[0]
-    except Exception:
-        pass
-    return None
+def _getter_values(results, idx: Dict[str, int]) -> Dict[str, int | None]:
+    """Failed / non-int reads map to None."""
+    values: Dict[str, int | None] = {}
+    for name, i in idx.items():
+        val = value_or_none(results, i)
+        values[name] = val if isinstance(val, int) else None
+    return values
+
+def _read_getters(w3: Web3, address: str, names: List[str], out_types: Dict[str, str],
+                  block_identifier="latest") -> Dict[str, int | None]:
+    """Read all zero-arg uint getters in one multicall. Failed / non-int reads map to None."""
+    mc = Multicall(w3)
+    idx = _queue_getters(mc, address, names, out_types)
+    return _getter_values(mc.execute(block_identifier), idx)
 
 def _guess_denominators() -> List[int]:
     # common patterns: 100 (percent), 1000, 10000 (basis points), 1e6 (ppm)
@@ -55,27 +34,41 @@ def _normalize_with_denominators(raw: int, denom: int) -> float:
         return float(raw)
     return (raw / denom) * 100.0
 
-def read_fees(w3: Web3, address: str, abi: list) -> Dict[str, float]:
+def read_fees(w3: Web3, address: str, abi: list, block_identifier="latest") -> Dict[str, float]:
     """
     Returns dict of normalized fee percentages, e.g.:
       { "buyFee": 5.0, "sellTax": 12.5, "transferFee": 0.0, ... }
     If no fee getters or nothing callable → returns {}.
     """
     address = Web3.to_checksum_address(address)
-    contract = w3.eth.contract(address=address, abi=abi)
+    features = analyze_abi(abi)
+    fee_getters, denom_getters = list(features.fee_getters), list(features.denom_getters)
+    if not fee_getters:
+        return {}
 
-    # 1) Find candidate fee getters
-    fee_getters = _collect_getters(abi, FEE_KEYWORDS)
+    # Read every denominator + fee getter in a single multicall round trip
+    values = _read_getters(w3, address, list(dict.fromkeys(denom_getters + fee_getters)),
+                           features.getter_types, block_identifier)
+    return _normalize_fees(values, fee_getters, denom_getters)
+
+async def read_fees_async(w3, address: str, abi: list, block_identifier="latest") -> Dict[str, float]:
+    """read_fees() for AsyncWeb3 clients."""
+    address = Web3.to_checksum_address(address)
+    features = analyze_abi(abi)
+    fee_getters, denom_getters = list(features.fee_getters), list(features.denom_getters)
     if not fee_getters:
         return {}
 
-    # 2) Optional denominator getters
-    denom_getters = _collect_getters(abi, DENOM_KEYWORDS)
+    mc = Multicall(w3)
+    idx = _queue_getters(mc, address, list(dict.fromkeys(denom_getters + fee_getters)), features.getter_types)
+    values = _getter_values(await mc.execute_async(block_identifier), idx)
+    return _normalize_fees(values, fee_getters, denom_getters)
 
+def _normalize_fees(values: Dict[str, int | None], fee_getters: List[str], denom_getters: List[str]) -> Dict[str, float]:
     # Read denominators (prefer explicit)
     denom_values = []
     for g in denom_getters:
-        val = _try_call_getter(contract, g)
+        val = values.get(g)
         if isinstance(val, int) and val > 0:
             denom_values.append(val)
 
@@ -83,10 +76,10 @@ def read_fees(w3: Web3, address: str, abi: list) -> Dict[str, float]:
     if not denom_values:
         denom_values = _guess_denominators()
 
-    # 3) Read fee raw values and normalize against denominators
+    # Normalize fee raw values against denominators
     result: Dict[str, float] = {}
     for g in fee_getters:
-        raw = _try_call_getter(contract, g)
+        raw = values.get(g)
         if raw is None:
             continue
 
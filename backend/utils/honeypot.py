@@ -1,6 +1,8 @@
 # backend/utils/honeypot.py
 from typing import Dict, Any, List
 from web3 import Web3
+from backend.utils.abi_features import HP_KEYWORDS, analyze_abi
+from backend.utils.multicall import Multicall, value_or_none
 
 # Routers we query for quotes (read-only)
 ROUTERS = {
@@ -8,38 +10,32 @@ ROUTERS = {
     "bsc": Web3.to_checksum_address("0x10ED43C718714eb63d5aA57B78B54704E256024E"),  # Pancake V2
 }
 
-ROUTER_ABI = [{
-    "name": "getAmountsOut",
-    "type": "function",
-    "stateMutability": "view",
-    "inputs": [{"name": "amountIn", "type": "uint256"}, {"name": "path", "type": "address[]"}],
-    "outputs": [{"name": "amounts", "type": "uint256[]"}],
-}]
+def _has_hp_keywords(abi: List[Dict[str, Any]]) -> bool:
+    # name-based heuristics that often gate trading/selling (HP_KEYWORDS)
+    return analyze_abi(abi).honeypot_hit
 
-ERC20_DECIMALS_ABI = [{"name":"decimals","outputs":[{"type":"uint8"}],"inputs":[],"stateMutability":"view","type":"function"}]
+def _queue_buy(mc: Multicall, router_addr: str, base: str, tok: str) -> tuple:
+    # buy quote for a small base amount (0.01 in raw units, assumes 18-dec base like WETH/WBNB) + token decimals
+    buy_in = int(1e16)
+    buy_i = mc.add(router_addr, "getAmountsOut(uint256,address[])", [buy_in, [base, tok]], returns=["uint256[]"])
+    dec_i = mc.add(tok, "decimals()", returns=["uint8"])
+    return buy_i, dec_i
 
-# name-based heuristics that often gate trading/selling
-HP_KEYWORDS = [
-    "blacklist","whitelist","bot","maxwallet","maxtx","maxtxamount","cooldown",
-    "enabletrading","opentrading","settrading","starttrading","tradingopen",
-    "swapenabled","setfees","settax","excludeFromFees","setlimits"
-]
+def _queue_sell(mc: Multicall, router_addr: str, base: str, tok: str, r1, dec_i: int) -> int:
+    # sell quote, small token amount based on token decimals (0.001 token)
+    dec = value_or_none(r1, dec_i)
+    dec = 18 if dec is None else int(dec)  # default fallback
+    sell_in = max(1, 10 ** max(0, dec - 3))  # 0.001 token in raw units
+    return mc.add(router_addr, "getAmountsOut(uint256,address[])", [sell_in, [tok, base]], returns=["uint256[]"])
 
-def _has_hp_keywords(abi: List[Dict[str, Any]]) -> bool:
-    for it in abi or []:
-        if it.get("type") == "function":
-            name = (it.get("name") or "").lower()
-            if any(kw in name for kw in HP_KEYWORDS):
-                return True
-    return False
-
-def _safe_decimals(w3: Web3, token: str) -> int:
-    try:
-        return int(w3.eth.contract(address=token, abi=ERC20_DECIMALS_ABI).functions.decimals().call())
-    except Exception:
-        return 18  # default fallback
+def _quote_ok(out: Dict[str, Any], key: str, side: str, result) -> None:
+    ok, amounts = result
+    out[key] = bool(ok and len(amounts) == 2 and int(amounts[1]) > 0)
+    if not ok:
+        out["notes"].append(f"{side} quote failed: getAmountsOut reverted")
 
-def probe_honeypot(w3: Web3, chain_key: str, token: str, base_token: str, abi: List[Dict[str, Any]] | None) -> Dict[str, Any]:
+def probe_honeypot(w3: Web3, chain_key: str, token: str, base_token: str, abi: List[Dict[str, Any]] | None,
+                   block_identifier="latest") -> Dict[str, Any]:
     """
     Read-only probe:
       - ask router for buy quote (base->token) and sell quote (token->base)
@@ -51,29 +47,19 @@ def probe_honeypot(w3: Web3, chain_key: str, token: str, base_token: str, abi: L
 
     try:
         router_addr = ROUTERS[chain_key]
-        router = w3.eth.contract(address=router_addr, abi=ROUTER_ABI)
-
         base = Web3.to_checksum_address(base_token)
         tok = Web3.to_checksum_address(token)
 
-        # --- buy quote: small base (0.01 in raw units, assumes 18-dec base like WETH/WBNB)
-        buy_in = int(1e16)
-        try:
-            amounts = router.functions.getAmountsOut(buy_in, [base, tok]).call()
-            out["buy_quote_ok"] = (len(amounts) == 2 and int(amounts[1]) > 0)
-        except Exception as e:
-            out["buy_quote_ok"] = False
-            out["notes"].append(f"buy quote failed: {e}")
-
-        # --- sell quote: small token amount based on token decimals (0.001 token)
-        dec = _safe_decimals(w3, tok)
-        sell_in = max(1, 10 ** max(0, dec - 3))  # 0.001 token in raw units
-        try:
-            amounts = router.functions.getAmountsOut(sell_in, [tok, base]).call()
-            out["sell_quote_ok"] = (len(amounts) == 2 and int(amounts[1]) > 0)
-        except Exception as e:
-            out["sell_quote_ok"] = False
-            out["notes"].append(f"sell quote failed: {e}")
+        # --- round 1 (one multicall): buy quote + token decimals
+        mc = Multicall(w3)
+        buy_i, dec_i = _queue_buy(mc, router_addr, base, tok)
+        r1 = mc.execute(block_identifier)
+        _quote_ok(out, "buy_quote_ok", "buy", r1[buy_i])
+
+        # --- round 2: sell quote sized by the token's decimals
+        mc = Multicall(w3)
+        sell_i = _queue_sell(mc, router_addr, base, tok, r1, dec_i)
+        _quote_ok(out, "sell_quote_ok", "sell", mc.execute(block_identifier)[sell_i])
 
     except Exception as e:
         out["notes"].append(f"router probe skipped: {e}")
@@ -83,3 +69,30 @@ def probe_honeypot(w3: Web3, chain_key: str, token: str, base_token: str, abi: L
         out["suspicious_abi"] = _has_hp_keywords(abi)
 
     return out
+
+async def probe_honeypot_async(w3, chain_key: str, token: str, base_token: str, abi: List[Dict[str, Any]] | None,
+                               block_identifier="latest") -> Dict[str, Any]:
+    """probe_honeypot() for AsyncWeb3 clients."""
+    out = {"buy_quote_ok": None, "sell_quote_ok": None, "suspicious_abi": False, "notes": []}
+
+    try:
+        router_addr = ROUTERS[chain_key]
+        base = Web3.to_checksum_address(base_token)
+        tok = Web3.to_checksum_address(token)
+
+        mc = Multicall(w3)
+        buy_i, dec_i = _queue_buy(mc, router_addr, base, tok)
+        r1 = await mc.execute_async(block_identifier)
+        _quote_ok(out, "buy_quote_ok", "buy", r1[buy_i])
+
+        mc = Multicall(w3)
+        sell_i = _queue_sell(mc, router_addr, base, tok, r1, dec_i)
+        _quote_ok(out, "sell_quote_ok", "sell", (await mc.execute_async(block_identifier))[sell_i])
+
+    except Exception as e:
+        out["notes"].append(f"router probe skipped: {e}")
+
+    if abi:
+        out["suspicious_abi"] = _has_hp_keywords(abi)
+
+    return out
@@ -0,0 +1,177 @@
+# backend/utils/keypool.py
+# Purpose: Pools of explorer API keys, so explorer throughput scales with the number of keys.
+#
+#   ETHERSCAN_API_KEYS=k1,k2,k3      # ETHERSCAN_API_KEY (if set) joins the pool too
+#   BSCSCAN_API_KEYS=...             # same with BSCSCAN_API_KEY
+#
+#   api_key = explorer_api_key("etherscan")   # KeyPool, or "" when no key is configured
+#   params = {..., "apikey": api_key}         # explorer.http_get_json(_async) picks a key per attempt
+#
+# Requests go to the live key with the shortest line in its own rate bucket (ratelimit.py keeps
+# one per key, ETHERSCAN_QPS each, shared across local processes). A key answering 429 or
+# "Max rate limit reached" is benched (EXPLORER_KEY_BENCH_SECONDS, doubling on repeats, max
+# 10 min); one over its daily quota (EXPLORER_KEY_DAILY_QUOTA, counted across processes when
+# the shared rate-limit file is on) or reported invalid sits out until the next UTC day / an hour.
+# Keys never appear in logs or metrics: they are labelled by a short hash.
+
+from __future__ import annotations
+import datetime
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.utils.log import get_logger
+from backend.utils.metrics import EXPLORER_KEY_BENCHED, EXPLORER_KEY_REQUESTS
+from backend.utils.shared_limit import shared_count
+
+log = get_logger("keypool")
+
+EXPLORER_KEY_BENCH_SECONDS = float(os.getenv("EXPLORER_KEY_BENCH_SECONDS", "5"))
+EXPLORER_KEY_DAILY_QUOTA = int(os.getenv("EXPLORER_KEY_DAILY_QUOTA", "100000"))   # 0 = don't count
+
+_MAX_BENCH_SECONDS = 600.0
+_INVALID_BENCH_SECONDS = 3600.0
+
+
+def _utc_day() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+def _seconds_to_utc_midnight() -> float:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    tomorrow = (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
+
+
+def key_error(data: Any) -> Optional[str]:
+    """Why an explorer JSON answer blames the key ("rate" | "daily" | "invalid"), or None."""
+    if not isinstance(data, dict) or str(data.get("status")) != "0":
+        return None
+    text = f"{data.get('message')} {data.get('result')}".lower()
+    if "daily" in text and "limit" in text:
+        return "daily"
+    if "rate limit" in text:
+        return "rate"
+    if "invalid api key" in text or "missing/invalid api key" in text:
+        return "invalid"
+    return None
+
+
+class ApiKey:
+    def __init__(self, key: str):
+        self.key = key
+        self.label = "key:" + hashlib.sha1(key.encode()).hexdigest()[:8]
+        self.bucket = "explorer-" + self.label    # shared rate-limit bucket name
+        self.benched_until = 0.0
+        self.benches = 0
+        self.day = ""
+        self.used = 0                             # requests today (this process only)
+
+    def __repr__(self) -> str:
+        return f"ApiKey({self.label})"
+
+
+class KeyPool:
+    def __init__(self, family: str, keys: List[str]):
+        if not keys:
+            raise ValueError("KeyPool needs at least one key")
+        self.family = family
+        self.keys = [ApiKey(k) for k in keys]
+        self._lock = threading.Lock()
+        self._turn = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __repr__(self) -> str:
+        return f"KeyPool({self.family}, {len(self.keys)} keys)"
+
+    __str__ = __repr__
+
+    def pick(self, load: Callable[[ApiKey], float]) -> Tuple[Optional[ApiKey], float]:
+        """
+        (live key with the lowest load, 0.0), ties taken in turn; or (None, seconds until
+        the first benched key is back) when every key is benched.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._turn = (self._turn + 1) % len(self.keys)
+            order = self.keys[self._turn:] + self.keys[:self._turn]
+            live = [k for k in order if k.benched_until <= now]
+            if not live:
+                return None, min(k.benched_until for k in self.keys) - now
+        return min(live, key=load), 0.0
+
+    def spend(self, k: ApiKey) -> None:
+        """Count one request against k's daily quota (bench it for the rest of the UTC day once used up)."""
+        EXPLORER_KEY_REQUESTS.inc(family=self.family, key=k.label)
+        if EXPLORER_KEY_DAILY_QUOTA <= 0:
+            return
+        day = _utc_day()
+        with self._lock:
+            if k.day != day:
+                k.day, k.used = day, 0
+            k.used += 1
+            used = k.used
+        shared = shared_count(k.bucket, day)
+        if (shared if shared is not None else used) >= EXPLORER_KEY_DAILY_QUOTA:
+            self.bench(k, "quota")
+
+    def ok(self, k: ApiKey) -> None:
+        with self._lock:
+            k.benches = 0
+
+    def bench(self, k: ApiKey, reason: str) -> None:
+        """Take k out of rotation: backoff for rate limits, rest of the UTC day for quota, an hour if invalid."""
+        with self._lock:
+            if reason in ("quota", "daily"):
+                seconds = _seconds_to_utc_midnight()
+            elif reason == "invalid":
+                seconds = _INVALID_BENCH_SECONDS
+            else:
+                seconds = min(_MAX_BENCH_SECONDS, EXPLORER_KEY_BENCH_SECONDS * (2 ** k.benches))
+                k.benches += 1
+            until = time.monotonic() + seconds
+            if until <= k.benched_until:
+                return
+            k.benched_until = until
+        EXPLORER_KEY_BENCHED.inc(family=self.family, key=k.label, reason=reason)
+        log.warning("%s %s benched for %.0fs (%s)", self.family, k.label, seconds, reason)
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [{"key": k.label, "benched_s": round(max(0.0, k.benched_until - now), 1),
+                     "used_today": k.used} for k in self.keys]
+
+
+_ENV = {"etherscan": ("ETHERSCAN_API_KEYS", "ETHERSCAN_API_KEY"),
+        "bscscan": ("BSCSCAN_API_KEYS", "BSCSCAN_API_KEY")}
+_POOLS: Dict[str, Optional[KeyPool]] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _env_keys(family: str) -> List[str]:
+    many, one = _ENV[family]
+    keys: List[str] = []
+    for k in [os.getenv(one, "")] + os.getenv(many, "").split(","):
+        k = k.strip()
+        if k and k not in keys:
+            keys.append(k)
+    return keys
+
+
+def explorer_api_key(family: str) -> "KeyPool | str":
+    """The family's key pool ("etherscan" | "bscscan"), or "" when no key is configured."""
+    with _POOLS_LOCK:
+        if family not in _POOLS:
+            keys = _env_keys(family)
+            _POOLS[family] = KeyPool(family, keys) if keys else None
+            if keys:
+                log.info("%s key pool: %d key(s)", family, len(keys))
+        return _POOLS[family] or ""
+
+
+__all__ = ["ApiKey", "KeyPool", "explorer_api_key", "key_error"]
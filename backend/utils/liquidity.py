@@ -2,90 +2,129 @@
 from typing import Optional, Dict, Any, List
 from web3 import Web3
 from backend.chains import CHAINS
-from backend.utils.cache import memoize_ttl
+from backend.utils.cache import TTLCache, w3_key
+from backend.utils.log import get_logger
+from backend.utils.multicall import Multicall, value_or_none
 
 ZERO = "0x0000000000000000000000000000000000000000"
 
-FACTORY_ABI = [{
-    "name": "getPair",
-    "outputs": [{"type": "address","name": "pair"}],
-    "inputs": [{"type": "address","name": "tokenA"}, {"type": "address","name": "tokenB"}],
-    "stateMutability": "view", "type": "function"
-}]
-
-PAIR_ABI = [
-    {"name":"getReserves","outputs":[
-        {"type":"uint112","name":"_reserve0"},
-        {"type":"uint112","name":"_reserve1"},
-        {"type":"uint32","name":"_blockTimestampLast"}],
-     "inputs":[], "stateMutability":"view","type":"function"},
-    {"name":"token0","outputs":[{"type":"address","name":""}],"inputs":[],"stateMutability":"view","type":"function"},
-    {"name":"token1","outputs":[{"type":"address","name":""}],"inputs":[],"stateMutability":"view","type":"function"},
-]
-
-ERC20_ABI = [
-    {"name":"decimals","outputs":[{"type":"uint8","name":""}],"inputs":[],"stateMutability":"view","type":"function"},
-    {"name":"symbol","outputs":[{"type":"string","name":""}],"inputs":[],"stateMutability":"view","type":"function"},
-]
-
-def _dbg(msg: str):
-    print(f"[liquidity] {msg}")
-
-@memoize_ttl(10)
-def get_deepest_v2_pool(w3: Web3, chain_key: str, token: str) -> Optional[Dict[str, Any]]:
-    cfg = CHAINS[chain_key]
-    token = Web3.to_checksum_address(token)
-    factory_addr = cfg["factory_v2"]
-    bases: List[Dict[str, str]] = cfg.get("bases", [])
-    factory = w3.eth.contract(address=factory_addr, abi=FACTORY_ABI)
+log = get_logger("liquidity")
 
-    best = None
-    best_depth = -1.0
+# Shared by the sync and async lookups; keyed by chain id, not the (per-loop) client object
+_POOLS = TTLCache("liquidity.deepest_v2_pool", ttl_seconds=10)
 
-    # preload token symbol (debug only)
-    try:
-        tsym = w3.eth.contract(address=token, abi=ERC20_ABI).functions.symbol().call()
-    except Exception:
-        tsym = token[-4:]
+def _pool_key(w3, chain_key: str, token: str, block_identifier="latest"):
+    return w3_key(w3), chain_key, token.lower(), block_identifier
 
-    _dbg(f"factory={factory_addr} chain={chain_key} token={tsym}({token})")
+@_POOLS.memoize(key=_pool_key)
+def get_deepest_v2_pool(w3: Web3, chain_key: str, token: str, block_identifier="latest") -> Optional[Dict[str, Any]]:
+    """
+    Deepest V2 token/base pool across the chain's configured bases.
+    Two multicall round trips: (symbol + getPair + base decimals for every base),
+    then (token0 + getReserves for every pair that exists).
+    """
+    token = Web3.to_checksum_address(token)
+    bases = _bases_for(chain_key, token)
+
+    mc = Multicall(w3)
+    r1_idx = _queue_round1(mc, chain_key, token, bases)
+    r1 = mc.execute(block_identifier)
+    found = _found_pairs(chain_key, token, bases, r1, r1_idx)
+    if not found:
+        log.debug("no V2 token/base pairs found across bases")
+        return None
+
+    mc = Multicall(w3)
+    r2_idx = _queue_round2(mc, found)
+    return _pick_best(found, r1, r1_idx, mc.execute(block_identifier), r2_idx)
+
+@_POOLS.memoize(key=_pool_key)
+async def get_deepest_v2_pool_async(w3, chain_key: str, token: str, block_identifier="latest") -> Optional[Dict[str, Any]]:
+    """get_deepest_v2_pool() for AsyncWeb3 clients."""
+    token = Web3.to_checksum_address(token)
+    bases = _bases_for(chain_key, token)
+
+    mc = Multicall(w3)
+    r1_idx = _queue_round1(mc, chain_key, token, bases)
+    r1 = await mc.execute_async(block_identifier)
+    found = _found_pairs(chain_key, token, bases, r1, r1_idx)
+    if not found:
+        log.debug("no V2 token/base pairs found across bases")
+        return None
+
+    mc = Multicall(w3)
+    r2_idx = _queue_round2(mc, found)
+    return _pick_best(found, r1, r1_idx, await mc.execute_async(block_identifier), r2_idx)
+
+def _bases_for(chain_key: str, token: str) -> List[Dict[str, str]]:
+    bases: List[Dict[str, str]] = []
+    for b in CHAINS[chain_key].get("bases", []):
+        if Web3.to_checksum_address(b["address"]) == token:
+            # skip self-pair attempt
+            log.debug("skip base=%s because base==token", b['symbol'])
+            continue
+        bases.append(b)
+    return bases
 
+def _queue_round1(mc: Multicall, chain_key: str, token: str, bases) -> Dict[str, Any]:
+    """Round 1: token symbol (debug only), getPair + decimals per base."""
+    factory_addr = CHAINS[chain_key]["factory_v2"]
+    idx: Dict[str, Any] = {"symbol": mc.add(token, "symbol()", returns=["string"]), "pair": {}, "decimals": {}}
     for b in bases:
         base_addr = Web3.to_checksum_address(b["address"])
-        base_sym = b["symbol"]
+        idx["pair"][b["symbol"]] = mc.add(factory_addr, "getPair(address,address)", [token, base_addr], returns=["address"])
+        idx["decimals"][b["symbol"]] = mc.add(base_addr, "decimals()", returns=["uint8"])
+    return idx
 
-        if base_addr == token:
-            # skip self-pair attempt
-            _dbg(f"skip base={base_sym} because base==token")
-            continue
+def _found_pairs(chain_key: str, token: str, bases, r1, idx) -> List[tuple]:
+    tsym = value_or_none(r1, idx["symbol"]) or token[-4:]
+    log.debug("factory=%s chain=%s token=%s(%s)", CHAINS[chain_key]['factory_v2'], chain_key, tsym, token)
 
-        try:
-            pair = factory.functions.getPair(token, base_addr).call()
-        except Exception as e:
-            _dbg(f"getPair failed for base={base_sym}: {e}")
+    found = []
+    for b in bases:
+        ok, pair = r1[idx["pair"][b["symbol"]]]
+        if not ok:
+            log.debug("getPair failed for base=%s", b['symbol'])
             continue
-
         if not pair or pair == ZERO:
-            _dbg(f"no pair for {base_sym}")
+            log.debug("no pair for %s", b['symbol'])
             continue
+        found.append((b, Web3.to_checksum_address(pair)))
+    return found
+
+def _queue_round2(mc: Multicall, found) -> Dict[str, Dict[str, int]]:
+    """Round 2: token0 + reserves per existing pair (token1 is implied by token0)."""
+    idx: Dict[str, Dict[str, int]] = {"token0": {}, "reserves": {}}
+    for b, pair in found:
+        idx["token0"][pair] = mc.add(pair, "token0()", returns=["address"])
+        idx["reserves"][pair] = mc.add(pair, "getReserves()", returns=["uint112", "uint112", "uint32"])
+    return idx
+
+def _pick_best(found, r1, r1_idx, r2, r2_idx) -> Optional[Dict[str, Any]]:
+    best = None
+    best_depth = -1.0
 
-        pair_c = w3.eth.contract(address=pair, abi=PAIR_ABI)
-        t0 = pair_c.functions.token0().call()
-        t1 = pair_c.functions.token1().call()
-        r0, r1, _ = pair_c.functions.getReserves().call()
+    for b, pair in found:
+        base_addr = Web3.to_checksum_address(b["address"])
+        base_sym = b["symbol"]
+        t0 = value_or_none(r2, r2_idx["token0"][pair])
+        reserves = value_or_none(r2, r2_idx["reserves"][pair])
+        if t0 is None or reserves is None:
+            log.debug("pair read failed base=%s pair=%s", base_sym, pair)
+            continue
+        r0, r1_, _ = reserves
 
         # identify which reserve is the base
         if Web3.to_checksum_address(t0) == base_addr:
             base_reserve = r0
-            token_reserve = r1
+            token_reserve = r1_
         else:
-            base_reserve = r1
+            base_reserve = r1_
             token_reserve = r0
 
         # humanize base reserve
-        try:
-            base_dec = w3.eth.contract(address=base_addr, abi=ERC20_ABI).functions.decimals().call()
-        except Exception:
+        base_dec = value_or_none(r1, r1_idx["decimals"][base_sym])
+        if base_dec is None:
             base_dec = 18
         base_human = float(base_reserve) / float(10 ** base_dec)
 
@@ -104,9 +143,9 @@ def get_deepest_v2_pool(w3: Web3, chain_key: str, token: str) -> Optional[Dict[s
                 "token_reserve_units": int(token_reserve),
             }
 
-        _dbg(f"pair found base={base_sym} pair={pair} base_reserve≈{base_human}")
+        log.debug("pair found base=%s pair=%s base_reserve≈%s", base_sym, pair, base_human)
 
     if not best:
-        _dbg("no V2 token/base pairs found across bases")
+        log.debug("no V2 token/base pairs found across bases")
 
     return best
@@ -0,0 +1,129 @@
+# backend/utils/log.py
+# Purpose: Leveled logging for backend/, api.py and the CLIs (replaces the old debug prints).
+#
+#   from backend.utils.log import get_logger
+#   log = get_logger("ANALYZE")
+#   log.debug("RPC requests for %s: %s", addr, counts)   # formatted only if DEBUG is on for ANALYZE
+#
+# Console lines keep the familiar "[TAG] message" shape (on stderr, so --json output stays clean).
+# Arguments are formatted lazily by logging itself: pass them as args, never pre-build an
+# f-string, and guard anything expensive with log.isEnabledFor(logging.DEBUG).
+#
+# Env:
+#   LOG_LEVEL=INFO                           default level for every tag
+#   LOG_LEVELS=ANALYZE=DEBUG,rpc-router=WARNING   per-tag overrides (case-insensitive)
+#   LOG_JSON=0                               1 = console lines as JSON objects
+#   LOG_FILE=                                also append JSON lines to this file (log pipeline sink)
+
+from __future__ import annotations
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+ROOT = "st9"
+
+_CONFIGURED = False
+_CONFIG_LOCK = threading.Lock()
+_OVERRIDES: Dict[str, int] = {}     # tag (lowercase) -> level, from LOG_LEVELS
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        tag = record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name
+        line = f"[{tag}] {record.getMessage()}"
+        if record.levelno >= logging.WARNING:
+            line = f"[{tag}] {record.levelname}: {record.getMessage()}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger (tag), msg, thread, plus extra={"fields": {...}}."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        tag = record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name
+        out = {
+            "ts": record.created,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": tag,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, dict):
+            out.update(fields)
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+
+def _level(name: str, default: int = logging.INFO) -> int:
+    value = logging.getLevelName(name.strip().upper())
+    return value if isinstance(value, int) else default
+
+
+def _parse_levels(spec: str) -> Dict[str, int]:
+    levels: Dict[str, int] = {}
+    for part in (spec or "").replace(";", ",").split(","):
+        if "=" in part:
+            tag, lvl = part.split("=", 1)
+            if tag.strip():
+                levels[tag.strip().lower()] = _level(lvl)
+    return levels
+
+
+def setup_logging(level: Optional[str] = None, json_console: Optional[bool] = None,
+                  log_file: Optional[str] = None, force: bool = False) -> None:
+    """Configure the st9 logger tree from env (arguments override). Runs once unless force=True."""
+    global _CONFIGURED
+    with _CONFIG_LOCK:
+        if _CONFIGURED and not force:
+            return
+        root = logging.getLogger(ROOT)
+        for h in list(root.handlers):
+            root.removeHandler(h)
+            h.close()
+        root.setLevel(_level(level or os.getenv("LOG_LEVEL", "INFO")))
+        root.propagate = False
+
+        if json_console is None:
+            json_console = os.getenv("LOG_JSON", "0").strip().lower() not in {"0", "false", "no", "off", ""}
+        console = logging.StreamHandler(sys.stderr)
+        console.setFormatter(JsonFormatter() if json_console else _TextFormatter())
+        root.addHandler(console)
+
+        path = log_file if log_file is not None else os.getenv("LOG_FILE", "")
+        if path:
+            sink = logging.FileHandler(path, encoding="utf-8")
+            sink.setFormatter(JsonFormatter())
+            root.addHandler(sink)
+
+        overrides = _parse_levels(os.getenv("LOG_LEVELS", ""))
+        for name in list(logging.root.manager.loggerDict):
+            if name.startswith(ROOT + "."):
+                _apply_override(logging.getLogger(name), overrides)
+        _OVERRIDES.clear()
+        _OVERRIDES.update(overrides)
+        _CONFIGURED = True
+
+
+def _apply_override(logger: logging.Logger, overrides: Dict[str, int]) -> None:
+    tag = logger.name[len(ROOT) + 1:].lower()
+    logger.setLevel(overrides.get(tag, logging.NOTSET))
+
+
+def get_logger(tag: str) -> logging.Logger:
+    """Logger for one module tag (e.g. "ANALYZE", "rpc-router"); printed as [tag]."""
+    setup_logging()
+    logger = logging.getLogger(f"{ROOT}.{tag}")
+    _apply_override(logger, _OVERRIDES)
+    return logger
+
+
+__all__ = ["get_logger", "setup_logging", "JsonFormatter"]
@@ -0,0 +1,308 @@
+# backend/utils/metrics.py
+# Purpose: In-process metrics rendered in the Prometheus text format (GET /api/metrics).
+#
+# No client library: counters, histograms and scrape-time gauges are enough here.
+# Every series the app exports is declared at the bottom of this file, so the
+# full list lives in one place; instrumented modules just import and call them:
+#
+#   from backend.utils.metrics import EXPLORER_REQUESTS
+#   EXPLORER_REQUESTS.inc(host_key="etherscan_v2", status="200")
+#
+# Label values must stay low-cardinality (host keys, stage names, endpoint hosts);
+# never put addresses or full URLs (they may carry API keys) in a label.
+
+from __future__ import annotations
+import threading
+import weakref
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from backend.utils.log import get_logger
+
+_REGISTRY: "Dict[str, _Metric]" = {}
+_REGISTRY_LOCK = threading.Lock()
+
+# Seconds; spans fast cache hits up to very slow explorer retries
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def total(self, **match: str) -> float:
+        """Sum over every series whose labels equal match (all series if empty)."""
+        idx = [(self.labelnames.index(n), str(v)) for n, v in match.items()]
+        with self._lock:
+            return sum(v for k, v in self._values.items() if all(k[i] == want for i, want in idx))
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}   # key -> (bucket counts, [sum])
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            total[0] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), t[0])) for k, (c, t) in self._values.items())
+        out: List[str] = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = f'le="{_fmt_value(bound)}"'
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(total)}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {cumulative}")
+        return out
+
+
+class Gauge(_Metric):
+    """Set/inc/dec gauge, or a scrape-time callback returning {label values tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_: str, labelnames: Sequence[str] = (),
+                 collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, help_, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._collect = collect
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self._collect is not None:
+            try:
+                values.update(self._collect())
+            except Exception as e:
+                get_logger("metrics").error("collect failed for %s: %s", self.name, e)
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in sorted(values.items())]
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _REGISTRY_LOCK:
+        existing = _REGISTRY.get(metric.name)
+        if existing is not None:
+            return existing
+        _REGISTRY[metric.name] = metric
+        return metric
+
+
+def counter(name: str, help_: str, labelnames: Sequence[str] = ()) -> Counter:
+    return _register(Counter(name, help_, labelnames))  # type: ignore[return-value]
+
+
+def histogram(name: str, help_: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help_, labelnames, buckets))  # type: ignore[return-value]
+
+
+def gauge(name: str, help_: str, labelnames: Sequence[str] = (),
+          collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None) -> Gauge:
+    return _register(Gauge(name, help_, labelnames, collect))  # type: ignore[return-value]
+
+
+def render() -> str:
+    """All series in Prometheus text exposition format (version 0.0.4)."""
+    with _REGISTRY_LOCK:
+        metrics = list(_REGISTRY.values())
+    lines: List[str] = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+def endpoint_label(url: str) -> str:
+    """scheme://host[:port] only — RPC URLs often carry an API key in the path or query."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc.rsplit('@', 1)[-1]}" if parts.netloc else "unknown"
+
+
+# ---------- thread-pool queue depth ----------
+
+_EXECUTORS: "weakref.WeakValueDictionary[str, object]" = weakref.WeakValueDictionary()
+
+
+def track_executor(name: str, executor) -> None:
+    """Export queue depth / thread count of a ThreadPoolExecutor under `name`."""
+    _EXECUTORS[name] = executor
+
+
+def _collect_queue_depth() -> Dict[Tuple[str, ...], float]:
+    return {(name,): float(ex._work_queue.qsize()) for name, ex in list(_EXECUTORS.items())}
+
+
+def _collect_pool_threads() -> Dict[Tuple[str, ...], float]:
+    return {(name,): float(len(ex._threads)) for name, ex in list(_EXECUTORS.items())}
+
+
+# ---------- caches (backend/utils/cache.TTLCache) ----------
+
+_CACHES: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def track_cache(cache) -> None:
+    """Export entry count / bytes of a TTLCache (anything with .name and .stats())."""
+    _CACHES.add(cache)
+
+
+def _collect_cache_entries() -> Dict[Tuple[str, ...], float]:
+    return {(c.name,): float(c.stats()["entries"]) for c in list(_CACHES)}
+
+
+def _collect_cache_bytes() -> Dict[Tuple[str, ...], float]:
+    return {(c.name,): float(c.stats()["bytes"]) for c in list(_CACHES) if c.max_bytes}
+
+
+# ---------- adaptive scan concurrency (backend/utils/concurrency.AdaptiveLimit) ----------
+
+_LIMITS: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def track_concurrency(limit) -> None:
+    """Export the current limit / analyses in flight of an AdaptiveLimit (anything with .name, .limit, .inflight)."""
+    _LIMITS.add(limit)
+
+
+def _collect_concurrency_limit() -> Dict[Tuple[str, ...], float]:
+    return {(l.name,): float(l.limit) for l in list(_LIMITS)}
+
+
+def _collect_concurrency_inflight() -> Dict[Tuple[str, ...], float]:
+    return {(l.name,): float(l.inflight) for l in list(_LIMITS)}
+
+
+# ---------- series ----------
+
+ANALYZE_STAGE_SECONDS = histogram(
+    "analyze_stage_seconds", "Latency of each analyze_token stage", ("stage",))
+ANALYZE_SECONDS = histogram(
+    "analyze_seconds", "End-to-end analyze_token latency", ("mode",))
+ANALYZE_TOTAL = counter(
+    "analyze_total", "Finished analyses", ("mode", "outcome"))
+ANALYZE_INFLIGHT = gauge(
+    "analyze_inflight", "Analyses currently running", ("mode",))
+
+RPC_REQUESTS = counter(
+    "rpc_requests_total", "RPC HTTP requests sent, by JSON-RPC method ('batch' = array POST)", ("method",))
+RPC_ENDPOINT_REQUESTS = counter(
+    "rpc_endpoint_requests_total", "RPC HTTP requests per endpoint host", ("endpoint", "outcome"))
+RPC_ENDPOINT_SECONDS = histogram(
+    "rpc_endpoint_request_seconds", "RPC HTTP request latency per endpoint host", ("endpoint",))
+
+EXPLORER_REQUESTS = counter(
+    "explorer_requests_total", "Explorer API requests by rate-limiter host key and HTTP status", ("host_key", "status"))
+EXPLORER_RETRIES = counter(
+    "explorer_retries_total", "Explorer API retries by host key and reason", ("host_key", "reason"))
+EXPLORER_429 = counter(
+    "explorer_http_429_total", "Explorer API 429 (rate limited) responses by host key", ("host_key",))
+EXPLORER_KEY_REQUESTS = counter(
+    "explorer_key_requests_total", "Explorer API requests per pooled API key (hashed label)", ("family", "key"))
+EXPLORER_KEY_BENCHED = counter(
+    "explorer_key_benched_total", "Explorer API keys taken out of rotation by reason (rate/daily/quota/invalid)",
+    ("family", "key", "reason"))
+RATELIMIT_WAIT_SECONDS = histogram(
+    "ratelimit_wait_seconds", "Time waiting for an explorer rate-limit token by host key and lane",
+    ("host_key", "lane"),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+
+CACHE_REQUESTS = counter(
+    "cache_requests_total", "Cache lookups by cache name and result (hit/miss/coalesced)", ("cache", "result"))
+CACHE_EVICTIONS = counter(
+    "cache_evictions_total", "Cache entries dropped by cache name and reason (lru/expired/bytes)", ("cache", "reason"))
+CACHE_ENTRIES = gauge(
+    "cache_entries", "Entries currently held per cache", ("cache",), collect=_collect_cache_entries)
+CACHE_BYTES = gauge(
+    "cache_bytes", "Approximate bytes held per cache (only caches with a byte bound)", ("cache",),
+    collect=_collect_cache_bytes)
+
+SCAN_CONCURRENCY_LIMIT = gauge(
+    "scan_concurrency_limit", "Current adaptive limit on analyses in flight per chain", ("chain",),
+    collect=_collect_concurrency_limit)
+SCAN_CONCURRENCY_INFLIGHT = gauge(
+    "scan_concurrency_inflight", "Analyses holding a concurrency slot per chain", ("chain",),
+    collect=_collect_concurrency_inflight)
+SCAN_CONCURRENCY_CHANGES = counter(
+    "scan_concurrency_changes_total", "Adaptive concurrency limit changes by direction and reason",
+    ("chain", "direction", "reason"))
+
+THREADPOOL_QUEUE_DEPTH = gauge(
+    "threadpool_queue_depth", "Work items waiting for a thread", ("pool",), collect=_collect_queue_depth)
+THREADPOOL_THREADS = gauge(
+    "threadpool_threads", "Threads started by the pool", ("pool",), collect=_collect_pool_threads)
+
+
+__all__ = ["Counter", "Histogram", "Gauge", "counter", "histogram", "gauge", "render", "endpoint_label",
+           "track_executor", "track_cache", "track_concurrency"]
@@ -1,11 +1,8 @@
 # backend/utils/mint_check.py
+from backend.utils.abi_features import analyze_abi
+
 def check_mint_function(abi: list) -> bool:
     """
     Returns True if a mint-like function exists (name contains 'mint').
     """
-    for item in abi:
-        if item.get("type") == "function":
-            name = (item.get("name") or "").lower()
-            if "mint" in name:
-                return True
-    return False
+    return analyze_abi(abi).has_mint
@@ -0,0 +1,178 @@
+# backend/utils/multicall.py
+# Purpose: Batch read-only eth_calls through Multicall3.aggregate3 (Web3 v7).
+#
+# Usage:
+#   mc = Multicall(w3)
+#   i = mc.add(token, "owner()", returns=["address"])
+#   j = mc.add(factory, "getPair(address,address)", [token, base], returns=["address"])
+#   results = mc.execute()          # one eth_call (per MULTICALL_MAX_CALLS chunk)
+#   ok, owner = results[i]
+#
+# Every sub-call uses allowFailure=true, so one reverting getter never sinks the batch.
+# If aggregate3 itself fails (chain without Multicall3, node quirk) we fall back to
+# plain sequential eth_calls with the same result shape.
+#
+# With an AsyncWeb3 client, use `await mc.execute_async()` (same queueing and decoding).
+
+from __future__ import annotations
+import os
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence, Tuple
+from web3 import Web3
+
+from backend.utils.log import get_logger
+from backend.utils.trace import annotate, span
+
+# Same deterministic deployment on ETH, BSC and most EVM chains.
+MULTICALL3_ADDRESS = Web3.to_checksum_address("0xcA11bde05977b3631167028862bE2a173976CA11")
+
+MULTICALL3_ABI = [{
+    "name": "aggregate3",
+    "type": "function",
+    "stateMutability": "payable",
+    "inputs": [{
+        "name": "calls", "type": "tuple[]",
+        "components": [
+            {"name": "target", "type": "address"},
+            {"name": "allowFailure", "type": "bool"},
+            {"name": "callData", "type": "bytes"},
+        ],
+    }],
+    "outputs": [{
+        "name": "returnData", "type": "tuple[]",
+        "components": [
+            {"name": "success", "type": "bool"},
+            {"name": "returnData", "type": "bytes"},
+        ],
+    }],
+}]
+
+# Sub-calls per aggregate3 request (keeps us well under node eth_call gas caps)
+MULTICALL_MAX_CALLS = int(os.getenv("MULTICALL_MAX_CALLS", "200"))
+
+
+log = get_logger("multicall")
+
+
+@lru_cache(maxsize=1024)
+def _selector(signature: str) -> bytes:
+    return bytes(Web3.keccak(text=signature)[:4])
+
+
+def _arg_types(signature: str) -> List[str]:
+    inner = signature[signature.index("(") + 1: signature.rindex(")")]
+    return [t.strip() for t in inner.split(",") if t.strip()]
+
+
+class Multicall:
+    """Collects calls, then executes them in as few aggregate3 round trips as possible."""
+
+    def __init__(self, w3: Web3):
+        self.w3 = w3
+        self._calls: List[Tuple[str, bytes, Tuple[str, ...]]] = []
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def add(self, target: str, signature: str, args: Sequence[Any] = (), returns: Sequence[str] = ()) -> int:
+        """
+        Queue `signature` (e.g. "getPair(address,address)") on `target`.
+        `returns` are the ABI output types used to decode; empty = keep raw bytes.
+        Returns the index of this call in execute()'s result list.
+        """
+        data = _selector(signature)
+        types = _arg_types(signature)
+        if types:
+            data += self.w3.codec.encode(types, list(args))
+        self._calls.append((Web3.to_checksum_address(target), data, tuple(returns)))
+        return len(self._calls) - 1
+
+    def _decode(self, success: bool, raw: bytes, returns: Tuple[str, ...]) -> Tuple[bool, Any]:
+        if not success:
+            return False, None
+        if not returns:
+            return True, raw
+        if not raw:
+            # Call to an EOA / missing function returns empty data
+            return False, None
+        try:
+            values = self.w3.codec.decode(list(returns), raw)
+        except Exception:
+            return False, None
+        return True, (values[0] if len(values) == 1 else tuple(values))
+
+    def _aggregate(self, chunk, block_identifier) -> List[Tuple[bool, bytes]]:
+        mc = self.w3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+        payload = [(target, True, data) for target, data, _ in chunk]
+        return [(bool(ok), bytes(raw)) for ok, raw in
+                mc.functions.aggregate3(payload).call(block_identifier=block_identifier)]
+
+    def _sequential(self, chunk, block_identifier) -> List[Tuple[bool, bytes]]:
+        out = []
+        for target, data, _ in chunk:
+            try:
+                raw = self.w3.eth.call({"to": target, "data": "0x" + data.hex()}, block_identifier)
+                out.append((True, bytes(raw)))
+            except Exception:
+                out.append((False, b""))
+        return out
+
+    async def _aggregate_async(self, chunk, block_identifier) -> List[Tuple[bool, bytes]]:
+        mc = self.w3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+        payload = [(target, True, data) for target, data, _ in chunk]
+        return [(bool(ok), bytes(raw)) for ok, raw in
+                await mc.functions.aggregate3(payload).call(block_identifier=block_identifier)]
+
+    async def _sequential_async(self, chunk, block_identifier) -> List[Tuple[bool, bytes]]:
+        out = []
+        for target, data, _ in chunk:
+            try:
+                raw = await self.w3.eth.call({"to": target, "data": "0x" + data.hex()}, block_identifier)
+                out.append((True, bytes(raw)))
+            except Exception:
+                out.append((False, b""))
+        return out
+
+    def _chunks(self):
+        for start in range(0, len(self._calls), MULTICALL_MAX_CALLS):
+            yield self._calls[start:start + MULTICALL_MAX_CALLS]
+
+    def execute(self, block_identifier: Any = "latest") -> List[Tuple[bool, Any]]:
+        """Run all queued calls; returns [(ok, decoded_value_or_None), ...] in add() order."""
+        results: List[Tuple[bool, Any]] = []
+        for chunk in self._chunks():
+            with span("multicall", kind="rpc", calls=len(chunk)):
+                try:
+                    raw = self._aggregate(chunk, block_identifier)
+                except Exception as e:
+                    log.warning("aggregate3 failed (%s); falling back to %d sequential eth_calls", e, len(chunk))
+                    annotate(fallback="sequential")
+                    raw = self._sequential(chunk, block_identifier)
+            for (ok, data), (_, _, returns) in zip(raw, chunk):
+                results.append(self._decode(ok, data, returns))
+        self._calls = []
+        return results
+
+    async def execute_async(self, block_identifier: Any = "latest") -> List[Tuple[bool, Any]]:
+        """execute() for AsyncWeb3 clients."""
+        results: List[Tuple[bool, Any]] = []
+        for chunk in self._chunks():
+            with span("multicall", kind="rpc", calls=len(chunk)):
+                try:
+                    raw = await self._aggregate_async(chunk, block_identifier)
+                except Exception as e:
+                    log.warning("aggregate3 failed (%s); falling back to %d sequential eth_calls", e, len(chunk))
+                    annotate(fallback="sequential")
+                    raw = await self._sequential_async(chunk, block_identifier)
+            for (ok, data), (_, _, returns) in zip(raw, chunk):
+                results.append(self._decode(ok, data, returns))
+        self._calls = []
+        return results
+
+
+def value_or_none(results: List[Tuple[bool, Any]], idx: Optional[int]) -> Any:
+    """Convenience: decoded value at idx, or None if the call failed / was never queued."""
+    if idx is None:
+        return None
+    ok, val = results[idx]
+    return val if ok else None
@@ -1,7 +1,10 @@
 # backend/utils/ownership.py
-from typing import Optional
+from typing import Optional, Tuple
 from web3 import Web3
-from web3.exceptions import ContractLogicError, BadFunctionCallOutput
+from backend.utils.cache import TTLCache, w3_key
+from backend.utils.log import get_logger
+from backend.utils.multicall import Multicall
+from backend.utils.rpc_batch import batch_requests, batch_requests_async, block_param, hex_to_bytes
 
 # Common owner/admin getters seen in the wild
 OWNER_METHOD_CANDIDATES = [
@@ -14,8 +17,16 @@ EIP1967_IMPL_SLOT = int(
     "0x360894a13ba1a3210667c828492db98dca3e2076cc3735a920a3ca505d382bbc", 16
 )
 
-def _dbg(msg: str) -> None:
-    print(f"[ownership] {msg}")
+# Slots where simple Ownable layouts keep _owner
+HEURISTIC_OWNER_SLOTS = (0, 1)
+
+log = get_logger("ownership")
+
+# Verdicts per (chain, token, block); owners rarely change, so "latest" is reused briefly too
+_VERDICTS = TTLCache("ownership.check_ownership", ttl_seconds=30)
+
+def _verdict_key(w3, token_address: str, block_identifier="latest"):
+    return w3_key(w3), token_address.lower(), block_identifier
 
 def _addr_or_none(raw: bytes) -> Optional[str]:
     """Interpret the last 20 bytes of a 32-byte storage value as an address."""
@@ -28,130 +39,197 @@ def _addr_or_none(raw: bytes) -> Optional[str]:
         return None
     return Web3.to_checksum_address(addr)
 
-def _addr_type(w3: Web3, address: str) -> str:
+def _code_request(address: str, block_identifier) -> tuple:
+    return ("eth_getCode", [Web3.to_checksum_address(address), block_param(block_identifier)])
+
+def _code_to_type(code) -> str:
+    if isinstance(code, Exception):
+        raise code
+    return "EOA" if len(hex_to_bytes(code)) == 0 else "Contract"
+
+def _addr_type(w3: Web3, address: str, block_identifier="latest") -> str:
     """Return 'EOA' if no code, else 'Contract'."""
-    code = w3.eth.get_code(Web3.to_checksum_address(address))
-    return "EOA" if len(code) == 0 else "Contract"
+    return _code_to_type(batch_requests(w3, [_code_request(address, block_identifier)])[0])
 
-def _call_owner_like(w3: Web3, address: str) -> Optional[str]:
-    """Try ABI-based getters like owner(), admin(), etc."""
+async def _addr_type_async(w3, address: str, block_identifier="latest") -> str:
+    return _code_to_type((await batch_requests_async(w3, [_code_request(address, block_identifier)]))[0])
+
+def _slot_requests(address: str, slots, block_identifier) -> list:
     addr = Web3.to_checksum_address(address)
-    for name in OWNER_METHOD_CANDIDATES:
-        abi = [{
-            "constant": True,
-            "inputs": [],
-            "name": name,
-            "outputs": [{"name": "", "type": "address"}],
-            "type": "function",
-        }]
-        contract = w3.eth.contract(address=addr, abi=abi)
-        try:
-            _dbg(f"try getter: {name}()")
-            val = getattr(contract.functions, name)().call()
-            if isinstance(val, str) and Web3.is_address(val):
-                return Web3.to_checksum_address(val)
-        except (ContractLogicError, BadFunctionCallOutput, ValueError):
-            continue
-        except Exception:
-            continue
-    return None
+    blk = block_param(block_identifier)
+    return [("eth_getStorageAt", [addr, hex(slot), blk]) for slot in slots]
 
-def _raw_owner_like(w3: Web3, address: str) -> Optional[str]:
+def _read_slots(w3: Web3, address: str, slots, block_identifier="latest") -> dict:
+    """Read several storage slots in one JSON-RPC batch. slot -> raw bytes (or the exception)."""
+    res = batch_requests(w3, _slot_requests(address, slots, block_identifier))
+    return {slot: (r if isinstance(r, Exception) else hex_to_bytes(r)) for slot, r in zip(slots, res)}
+
+async def _read_slots_async(w3, address: str, slots, block_identifier="latest") -> dict:
+    res = await batch_requests_async(w3, _slot_requests(address, slots, block_identifier))
+    return {slot: (r if isinstance(r, Exception) else hex_to_bytes(r)) for slot, r in zip(slots, res)}
+
+def _probe_owner_getters(w3: Web3, address: str, block_identifier="latest") -> Tuple[Optional[str], Optional[str]]:
     """
-    Low-level call (no ABI) to common selectors: owner(), getOwner(), admin(), etc.
-    If function exists and returns a 32-byte ABI-encoded address, decode it.
+    One Multicall3 round trip over all owner/admin selectors (no ABI needed).
+    Returns (raw_owner, abi_owner):
+      - raw_owner: first getter whose 32-byte return ends in a non-zero address
+      - abi_owner: first getter that ABI-decodes as an address (zero address = renounced)
     """
-    addr = Web3.to_checksum_address(address)
-    signatures = [
-        "owner()", "getOwner()", "ownerAddress()",
-        "admin()", "getAdmin()", "proxyAdmin()",
-    ]
-    for sig in signatures:
-        try:
-            selector = w3.keccak(text=sig)[:4]  # 4-byte selector
-            data = "0x" + selector.hex()
-            res = w3.eth.call({"to": addr, "data": data})
-            if res and len(res) >= 32:
-                a = "0x" + res[-20:].hex()
-                if Web3.is_address(a) and a.lower() != "0x0000000000000000000000000000000000000000":
-                    _dbg(f"raw owner hit via {sig} -> {a}")
-                    return Web3.to_checksum_address(a)
-        except Exception:
+    mc = Multicall(w3)
+    idx = [mc.add(Web3.to_checksum_address(address), f"{name}()") for name in OWNER_METHOD_CANDIDATES]
+    return _owners_from_results(w3, mc.execute(block_identifier), idx)
+
+async def _probe_owner_getters_async(w3, address: str, block_identifier="latest") -> Tuple[Optional[str], Optional[str]]:
+    mc = Multicall(w3)
+    idx = [mc.add(Web3.to_checksum_address(address), f"{name}()") for name in OWNER_METHOD_CANDIDATES]
+    return _owners_from_results(w3, await mc.execute_async(block_identifier), idx)
+
+def _owners_from_results(w3, results, idx) -> Tuple[Optional[str], Optional[str]]:
+    raw_owner: Optional[str] = None
+    abi_owner: Optional[str] = None
+    for name, i in zip(OWNER_METHOD_CANDIDATES, idx):
+        ok, res = results[i]
+        if not ok or not res:
             continue
-    return None
-
-def _read_eip1967_impl(w3: Web3, address: str) -> Optional[str]:
+        if raw_owner is None and len(res) >= 32:
+            a = "0x" + res[-20:].hex()
+            if Web3.is_address(a) and a.lower() != "0x0000000000000000000000000000000000000000":
+                log.debug("raw owner hit via %s() -> %s", name, a)
+                raw_owner = Web3.to_checksum_address(a)
+        if abi_owner is None:
+            try:
+                val = w3.codec.decode(["address"], res)[0]
+                if isinstance(val, str) and Web3.is_address(val):
+                    abi_owner = Web3.to_checksum_address(val)
+            except Exception:
+                pass
+    return raw_owner, abi_owner
+
+def _read_eip1967_impl(w3, address: str, slots: Optional[dict] = None) -> Optional[str]:
     """Read the EIP-1967 implementation slot; return implementation address if present."""
     try:
-        raw = w3.eth.get_storage_at(Web3.to_checksum_address(address), EIP1967_IMPL_SLOT)
+        slots = slots if slots is not None else _read_slots(w3, address, [EIP1967_IMPL_SLOT])
+        raw = slots[EIP1967_IMPL_SLOT]
+        if isinstance(raw, Exception):
+            raise raw
         impl = _addr_or_none(raw)
         if impl:
-            _dbg(f"EIP-1967 impl slot nonzero → {impl}")
+            log.debug("EIP-1967 impl slot nonzero → %s", impl)
         else:
-            _dbg("EIP-1967 impl slot empty/zero")
+            log.debug("EIP-1967 impl slot empty/zero")
         return impl
     except Exception as e:
-        _dbg(f"EIP-1967 read error: {e}")
+        log.debug("EIP-1967 read error: %s", e)
         return None
 
-def _heuristic_owner_slots(w3: Web3, address: str) -> Optional[str]:
+def _heuristic_owner_slots(w3: Web3, address: str, slots: Optional[dict] = None,
+                           block_identifier="latest") -> Optional[str]:
     """
     [Inference] Probe slot 0 and 1 for an address-like value.
     Not guaranteed; some Ownable patterns store _owner at slot 0.
     """
     try:
-        for slot in (0, 1):
-            raw = w3.eth.get_storage_at(Web3.to_checksum_address(address), slot)
+        slots = slots if slots is not None else _read_slots(w3, address, HEURISTIC_OWNER_SLOTS, block_identifier)
+        for slot in HEURISTIC_OWNER_SLOTS:
+            raw = slots[slot]
+            if isinstance(raw, Exception):
+                raise raw
             cand = _addr_or_none(raw)
             if cand:
-                _dbg(f"[heuristic] slot {slot} looks like addr → {cand}")
+                log.debug("[heuristic] slot %s looks like addr → %s", slot, cand)
                 return cand
     except Exception as e:
-        _dbg(f"[heuristic] slot read error: {e}")
+        log.debug("[heuristic] slot read error: %s", e)
     return None
 
-def check_ownership(w3: Web3, token_address: str) -> str:
-    """Ownership checker with raw calls, ABI getters, proxy follow, and heuristics."""
-    _dbg(f"checking ownership for {Web3.to_checksum_address(token_address)}")
+@_VERDICTS.memoize(key=_verdict_key)
+def check_ownership(w3: Web3, token_address: str, block_identifier="latest") -> str:
+    """
+    Ownership checker with raw calls, ABI getters, proxy follow, and heuristics.
+    Every read is made at `block_identifier` (block-pinned analysis passes a number).
+    """
+    log.debug("checking ownership for %s", token_address)
 
-    # 0) raw low-level try (no ABI)
-    raw_owner = _raw_owner_like(w3, token_address)
+    # 0) raw low-level try (no ABI) — all getters in one multicall
+    raw_owner, direct_owner = _probe_owner_getters(w3, token_address, block_identifier)
     if raw_owner:
-        otype = _addr_type(w3, raw_owner)
+        otype = _addr_type(w3, raw_owner, block_identifier)
         if raw_owner.lower() == "0x0000000000000000000000000000000000000000":
             return "✅ Ownership is RENOUNCED."
         return f"🚩 Ownership NOT renounced — owner={raw_owner} ({otype})"
 
-    # 1) ABI-based getters
-    direct_owner = _call_owner_like(w3, token_address)
+    # 1) ABI-decoded getters (same multicall; catches a zero/renounced owner)
     if direct_owner:
-        otype = _addr_type(w3, direct_owner)
+        otype = _addr_type(w3, direct_owner, block_identifier)
         if direct_owner.lower() == "0x0000000000000000000000000000000000000000":
             return "✅ Ownership is RENOUNCED."
         return f"🚩 Ownership NOT renounced — owner={direct_owner} ({otype})"
 
     # 2) EIP-1967 proxy? follow to implementation and retry
-    impl = _read_eip1967_impl(w3, token_address)
+    #    (impl slot + heuristic slots 0/1 fetched together in one JSON-RPC batch)
+    token_slots = _read_slots(w3, token_address, [EIP1967_IMPL_SLOT, *HEURISTIC_OWNER_SLOTS], block_identifier)
+    impl = _read_eip1967_impl(w3, token_address, token_slots)
     if impl:
-        impl_raw_owner = _raw_owner_like(w3, impl) or _call_owner_like(w3, impl)
+        impl_raw, impl_abi = _probe_owner_getters(w3, impl, block_identifier)
+        impl_raw_owner = impl_raw or impl_abi
         if impl_raw_owner:
-            otype = _addr_type(w3, impl_raw_owner)
+            otype = _addr_type(w3, impl_raw_owner, block_identifier)
             if impl_raw_owner.lower() == "0x0000000000000000000000000000000000000000":
                 return "✅ Ownership is RENOUNCED (via proxy impl)."
             return f"🚩 Ownership NOT renounced (proxy) — owner={impl_raw_owner} ({otype})"
-        _dbg("proxy impl has no standard owner/admin getter")
+        log.debug("proxy impl has no standard owner/admin getter")
 
     # 3) As a last resort, try heuristic slots on main & impl
-    heur = _heuristic_owner_slots(w3, token_address)
+    heur = _heuristic_owner_slots(w3, token_address, token_slots)
     if heur:
-        otype = _addr_type(w3, heur)
+        otype = _addr_type(w3, heur, block_identifier)
         return f"[Inference] 🚩 Owner-like value from storage — owner≈{heur} ({otype})"
 
     if impl:
-        heur2 = _heuristic_owner_slots(w3, impl)
+        heur2 = _heuristic_owner_slots(w3, impl, block_identifier=block_identifier)
         if heur2:
-            otype2 = _addr_type(w3, heur2)
+            otype2 = _addr_type(w3, heur2, block_identifier)
             return f"[Inference] 🚩 Owner-like (proxy impl) — owner≈{heur2} ({otype2})"
 
     # 4) nothing worked
     return "⚠️ Cannot detect ownership — contract may be nonstandard or protected."
+
+@_VERDICTS.memoize(key=_verdict_key)
+async def check_ownership_async(w3, token_address: str, block_identifier="latest") -> str:
+    """check_ownership() for AsyncWeb3 clients (same steps and verdict strings)."""
+    log.debug("checking ownership (async) for %s", token_address)
+
+    raw_owner, direct_owner = await _probe_owner_getters_async(w3, token_address, block_identifier)
+    owner = raw_owner or direct_owner
+    if owner:
+        otype = await _addr_type_async(w3, owner, block_identifier)
+        if owner.lower() == "0x0000000000000000000000000000000000000000":
+            return "✅ Ownership is RENOUNCED."
+        return f"🚩 Ownership NOT renounced — owner={owner} ({otype})"
+
+    token_slots = await _read_slots_async(w3, token_address, [EIP1967_IMPL_SLOT, *HEURISTIC_OWNER_SLOTS],
+                                          block_identifier)
+    impl = _read_eip1967_impl(w3, token_address, token_slots)
+    if impl:
+        impl_raw, impl_abi = await _probe_owner_getters_async(w3, impl, block_identifier)
+        impl_raw_owner = impl_raw or impl_abi
+        if impl_raw_owner:
+            otype = await _addr_type_async(w3, impl_raw_owner, block_identifier)
+            if impl_raw_owner.lower() == "0x0000000000000000000000000000000000000000":
+                return "✅ Ownership is RENOUNCED (via proxy impl)."
+            return f"🚩 Ownership NOT renounced (proxy) — owner={impl_raw_owner} ({otype})"
+        log.debug("proxy impl has no standard owner/admin getter")
+
+    heur = _heuristic_owner_slots(w3, token_address, token_slots)
+    if heur:
+        otype = await _addr_type_async(w3, heur, block_identifier)
+        return f"[Inference] 🚩 Owner-like value from storage — owner≈{heur} ({otype})"
+
+    if impl:
+        impl_slots = await _read_slots_async(w3, impl, HEURISTIC_OWNER_SLOTS, block_identifier)
+        heur2 = _heuristic_owner_slots(w3, impl, impl_slots)
+        if heur2:
+            otype2 = await _addr_type_async(w3, heur2, block_identifier)
+            return f"[Inference] 🚩 Owner-like (proxy impl) — owner≈{heur2} ({otype2})"
+
+    return "⚠️ Cannot detect ownership — contract may be nonstandard or protected."
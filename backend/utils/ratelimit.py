@@ -1,80 +1,248 @@
 # backend/utils/ratelimit.py
-import time, random, threading
+# Purpose: Explorer API rate limiting (Etherscan/BscScan): per-host/per-key token buckets,
+# priority lanes and per-job budgets. Requests themselves go through backend/utils/explorer.py.
+#
+# Every host key has one shared bucket refilling at DEFAULT_QPS (ETHERSCAN_QPS) with one
+# second of burst. Callers queue in lanes: "interactive" (the default, e.g. /api/risk) is
+# served before "batch". A caller can also carry its own budget without touching anyone else:
+#
+#   with rate_budget(qps=2.0, lane="batch"):   # this job: <= 2 req/s per host, behind interactive
+#       ...                                     # asyncio tasks and DAG threads started here inherit it
+#
+# Waiting never holds a lock: a waiter checks its place in line, naps outside the lock and
+# checks again, the same way from threads (time.sleep) and coroutines (asyncio.sleep).
+# The front of the line then takes a token from the bucket shared by all local processes
+# (backend/utils/shared_limit.py), so API workers and CLI jobs on one key add up to one
+# ETHERSCAN_QPS; a 429 empties that bucket for everyone.
+#
+# With a KeyPool (backend/utils/keypool.py) acquire() also picks the key, and the buckets above
+# are per key instead of per host (ETHERSCAN_QPS per key).
+import asyncio, os, time, threading
 from collections import deque
-import requests
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from backend.utils.keypool import ApiKey, KeyPool
+from backend.utils.metrics import RATELIMIT_WAIT_SECONDS
+from backend.utils.shared_limit import shared_wait, shared_wait_async
+from backend.utils.trace import add_to
 
 # Default QPS (requests per second) for explorer APIs (Etherscan/BscScan).
 # You can override at runtime (see set_default_qps).
-DEFAULT_QPS = 4.0
+DEFAULT_QPS = max(0.1, float(os.getenv("ETHERSCAN_QPS", "4")))
+
+# Served in this order; a token goes to the oldest waiter of the first non-empty lane
+LANES = ("interactive", "batch")
+_MAX_NAP = 0.5   # waiters far back in line re-check at least this often (others may leave the line)
+_MAX_KEY_WAIT = 60.0   # every pooled key benched for longer than this: fail instead of waiting
 
 # One limiter per "host key" (e.g., 'etherscan_v2', 'etherscan_v1', 'bscscan_v1')
 _LIMITERS = {}
 _LOCK = threading.Lock()
 
 class RateLimiter:
-    def __init__(self, max_per_sec: float):
-        self.max_per_sec = max(0.1, float(max_per_sec))
-        self.window = deque()
+    """Token bucket: max_per_sec refill, burst tokens max (default one second's worth), lane priority."""
+
+    def __init__(self, max_per_sec: float, name: str = "", burst: float | None = None):
+        self.name = name
         self.lock = threading.Lock()
+        self.max_per_sec = max(0.1, float(max_per_sec))
+        self.burst = max(1.0, float(burst) if burst is not None else self.max_per_sec)
+        self.tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lines = {lane: deque() for lane in LANES}
 
-    def wait(self):
+    def set_rate(self, max_per_sec: float, burst: float | None = None):
+        """Change the rate in place (queued waiters and the current fill are kept)."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.max_per_sec = max(0.1, float(max_per_sec))
+            self.burst = max(1.0, float(burst) if burst is not None else self.max_per_sec)
+            self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.max_per_sec)
+        self._stamp = now
+
+    def _try_take(self, ticket: object, lane: str) -> float:
+        """
+        0.0 if ticket got a token, else seconds to nap before asking again. A waiter takes a
+        token only if enough are left for everyone ahead of it, so later or lower-lane
+        callers never delay earlier/higher ones.
+        """
         with self.lock:
             now = time.monotonic()
-            # drop timestamps older than 1s
-            while self.window and now - self.window[0] > 1.0:
-                self.window.popleft()
-
-            if len(self.window) >= self.max_per_sec:
-                # sleep until we drop under the limit
-                sleep_for = 1.0 - (now - self.window[0]) + 0.001
-                if sleep_for > 0:
-                    time.sleep(sleep_for)
-                # cleanup after sleeping
-                now = time.monotonic()
-                while self.window and now - self.window[0] > 1.0:
-                    self.window.popleft()
-
-            self.window.append(time.monotonic())
-
-def _get_limiter(host_key: str, max_qps: float | None):
+            self._refill(now)
+            ahead = 0
+            for name in LANES:
+                line = self._lines[name]
+                if name != lane:
+                    ahead += len(line)
+                    continue
+                if ticket not in line:
+                    line.append(ticket)
+                ahead += line.index(ticket)
+                if self.tokens >= ahead + 1:
+                    self.tokens -= 1.0
+                    line.remove(ticket)
+                    return 0.0
+                return min(max((ahead + 1 - self.tokens) / self.max_per_sec, 0.001), _MAX_NAP)
+            raise ValueError(f"unknown rate limit lane {lane!r}")
+
+    def _leave(self, ticket: object, lane: str):
+        with self.lock:
+            line = self._lines.get(lane)
+            if line is not None and ticket in line:
+                line.remove(ticket)
+
+    def backlog(self) -> float:
+        """Waiters in line minus tokens on hand (lower = a new caller gets through sooner)."""
+        with self.lock:
+            self._refill(time.monotonic())
+            return sum(len(line) for line in self._lines.values()) - self.tokens
+
+    def queued(self) -> dict:
+        with self.lock:
+            return {lane: len(line) for lane, line in self._lines.items()}
+
+    def wait(self, lane: str = "interactive"):
+        ticket = object()
+        try:
+            while True:
+                nap = self._try_take(ticket, lane)
+                if not nap:
+                    return
+                time.sleep(nap)
+        finally:
+            self._leave(ticket, lane)
+
+    async def wait_async(self, lane: str = "interactive"):
+        """Same as wait(), sleeping on the event loop (a cancelled waiter leaves the line)."""
+        ticket = object()
+        try:
+            while True:
+                nap = self._try_take(ticket, lane)
+                if not nap:
+                    return
+                await asyncio.sleep(nap)
+        finally:
+            self._leave(ticket, lane)
+
+
+class RateBudget:
+    """A caller's own limit on top of the shared buckets: at most qps per host key."""
+
+    def __init__(self, qps: float):
+        self.qps = max(0.1, float(qps))
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, host_key: str) -> RateLimiter:
+        with self._lock:
+            lim = self._limiters.get(host_key)
+            if lim is None:
+                lim = self._limiters[host_key] = RateLimiter(self.qps, f"budget:{host_key}")
+            return lim
+
+
+# (lane, budget or None) for explorer calls made in this context
+_SCOPE: ContextVar[tuple] = ContextVar("ratelimit_scope", default=("interactive", None))
+
+@contextmanager
+def rate_budget(qps: float | None = None, lane: str | None = None):
+    """
+    Explorer calls in this context use lane (default: unchanged) and, with qps, a fresh
+    per-scope budget of qps per host key. Nothing global changes.
+    """
+    cur_lane, cur_budget = _SCOPE.get()
+    if lane is not None and lane not in LANES:
+        raise ValueError(f"lane must be one of {LANES}")
+    token = _SCOPE.set((lane or cur_lane, RateBudget(qps) if qps is not None else cur_budget))
+    try:
+        yield
+    finally:
+        _SCOPE.reset(token)
+
+def current_lane() -> str:
+    return _SCOPE.get()[0]
+
+def _get_limiter(host_key: str, max_qps: float | None = None) -> RateLimiter:
+    """Shared bucket for host_key. max_qps sets that host's rate (in place, fill and queue are kept)."""
     with _LOCK:
-        qps = DEFAULT_QPS if max_qps is None else float(max_qps)
         lim = _LIMITERS.get(host_key)
-        if lim is None or getattr(lim, "max_per_sec", None) != qps:
-            lim = RateLimiter(qps)
-            _LIMITERS[host_key] = lim
+        if lim is None:
+            lim = _LIMITERS[host_key] = RateLimiter(DEFAULT_QPS if max_qps is None else max_qps, host_key)
+        elif max_qps is not None and lim.max_per_sec != max(0.1, float(max_qps)):
+            lim.set_rate(max_qps)
         return lim
 
-def http_get_json(host_key: str, url: str, params: dict, max_qps: float | None = None, timeout: int = 15) -> dict:
+def _observe_wait(host_key: str, lane: str, start: float):
+    waited = time.monotonic() - start
+    RATELIMIT_WAIT_SECONDS.observe(waited, host_key=host_key, lane=lane)
+    add_to("ratelimit_wait_ms", waited * 1000.0)
+
+def _key_limiter(key: ApiKey) -> RateLimiter:
+    return _get_limiter(key.bucket)
+
+def _pick_key(pool: KeyPool) -> tuple[ApiKey | None, float]:
+    key, wait = pool.pick(load=lambda k: _key_limiter(k).backlog())
+    if key is None and wait > _MAX_KEY_WAIT:
+        raise RuntimeError(f"all {pool.family} API keys are benched (next back in {wait:.0f}s)")
+    return key, wait
+
+def bucket_name(host_key: str, key: ApiKey | None) -> str:
+    """Name of the cross-process bucket a request to host_key (with key) draws from."""
+    return key.bucket if key is not None else f"explorer:{host_key}"
+
+def acquire(host_key: str, max_qps: float | None, pool: KeyPool | None = None) -> ApiKey | None:
     """
-    GET with per-host rate limiting + retries. Returns response.json() or raises.
-    Retries on 429/5xx, small jitter, keeps QPS under control.
+    Block until this context may send one request to host_key (own budget first, then the
+    shared bucket). With a pool, returns the key to use; the bucket is that key's.
     """
-    lim = _get_limiter(host_key, max_qps)
-    backoff = 0.5
-    for attempt in range(5):
-        lim.wait()
-        try:
-            resp = requests.get(url, params=params, timeout=timeout)
-            status = resp.status_code
-            if status == 200:
-                return resp.json()
-            if status in (429, 500, 502, 503, 504):
-                time.sleep(backoff + random.uniform(0, 0.2))
-                backoff = min(backoff * 2, 4.0)
-                continue
-            # other status codes: bail
-            resp.raise_for_status()
-            return resp.json()
-        except requests.RequestException:
-            time.sleep(backoff + random.uniform(0, 0.2))
-            backoff = min(backoff * 2, 4.0)
-    # final try (let the exception surface for visibility)
-    lim.wait()
-    resp = requests.get(url, params=params, timeout=timeout)
-    resp.raise_for_status()
-    return resp.json()
+    lane, budget = _SCOPE.get()
+    start = time.monotonic()
+    if budget is not None:
+        budget.limiter(host_key).wait()
+    key = None
+    if pool is not None:
+        while True:
+            key, wait = _pick_key(pool)
+            if key is not None:
+                break
+            time.sleep(min(wait, 1.0))
+    lim = _key_limiter(key) if key is not None else _get_limiter(host_key, max_qps)
+    lim.wait(lane)
+    shared_wait(bucket_name(host_key, key), lim.max_per_sec, lim.burst, lane)
+    if key is not None:
+        pool.spend(key)
+    _observe_wait(host_key, lane, start)
+    return key
+
+async def acquire_async(host_key: str, max_qps: float | None, pool: KeyPool | None = None) -> ApiKey | None:
+    lane, budget = _SCOPE.get()
+    start = time.monotonic()
+    if budget is not None:
+        await budget.limiter(host_key).wait_async()
+    key = None
+    if pool is not None:
+        while True:
+            key, wait = _pick_key(pool)
+            if key is not None:
+                break
+            await asyncio.sleep(min(wait, 1.0))
+    lim = _key_limiter(key) if key is not None else _get_limiter(host_key, max_qps)
+    await lim.wait_async(lane)
+    await shared_wait_async(bucket_name(host_key, key), lim.max_per_sec, lim.burst, lane)
+    if key is not None:
+        pool.spend(key)
+    _observe_wait(host_key, lane, start)
+    return key
 
 def set_default_qps(qps: float):
+    """Process-wide explorer rate (CLIs). Existing buckets change in place; for one job use rate_budget()."""
     global DEFAULT_QPS
-    DEFAULT_QPS = max(0.1, float(qps))
+    with _LOCK:
+        DEFAULT_QPS = max(0.1, float(qps))
+        limiters = list(_LIMITERS.values())
+    for lim in limiters:
+        lim.set_rate(DEFAULT_QPS)
@@ -0,0 +1,307 @@
+# backend/utils/rpc_batch.py
+# Purpose: JSON-RPC array batching for raw node reads that can't go through Multicall
+# (eth_getCode, eth_getStorageAt, eth_getTransactionReceipt, eth_getBlockByNumber, ...).
+#
+# Each chain client gets one RpcBatcher. Callers submit (method, params) and get a
+# Future; a flush thread collects everything submitted within RPC_BATCH_LINGER_MS
+# (from any worker thread, i.e. across tokens during a batch scan), then POSTs it as
+# one JSON-RPC array of at most RPC_BATCH_MAX entries. Errors are resolved per id.
+#
+#   results = batch_requests(w3, [("eth_getCode", [addr, "latest"]),
+#                                 ("eth_getStorageAt", [addr, "0x0", "latest"])])
+#   # -> [result_or_RpcError, ...] in request order
+#
+# AsyncRpcBatcher / batch_requests_async do the same on the event loop for AsyncWeb3
+# clients (a loop timer instead of the flush thread).
+
+from __future__ import annotations
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, List, Sequence, Tuple
+
+from backend.utils.callstats import record_batched_call
+from backend.utils.log import get_logger
+from backend.utils.metrics import endpoint_label, track_executor
+from backend.utils.trace import annotate, span
+
+RPC_BATCH_MODE = os.getenv("RPC_BATCH_MODE", "1").strip().lower() not in {"0", "false", "no", "off", ""}
+RPC_BATCH_MAX = int(os.getenv("RPC_BATCH_MAX", "50"))            # provider's max array length
+RPC_BATCH_LINGER_MS = float(os.getenv("RPC_BATCH_LINGER_MS", "5"))
+RPC_BATCH_SENDERS = int(os.getenv("RPC_BATCH_SENDERS", "4"))      # batches in flight per chain
+
+_BATCHERS: "weakref.WeakKeyDictionary[Any, RpcBatcher]" = weakref.WeakKeyDictionary()
+_BATCHERS_LOCK = threading.Lock()
+
+
+log = get_logger("rpc-batch")
+
+
+class RpcError(Exception):
+    """JSON-RPC error object returned for one request of a batch."""
+
+    def __init__(self, method: str, error: Any):
+        self.method = method
+        self.code = error.get("code") if isinstance(error, dict) else None
+        msg = error.get("message") if isinstance(error, dict) else str(error)
+        super().__init__(f"{method}: {msg}")
+
+
+class RpcBatcher:
+    def __init__(self, provider, max_batch: int = RPC_BATCH_MAX, linger_ms: float = RPC_BATCH_LINGER_MS):
+        self.provider = provider
+        self.max_batch = max(1, int(max_batch))
+        self.linger = max(0.0, float(linger_ms)) / 1000.0
+        self._ids = itertools.count(1)
+        self._pending: List[Tuple[str, Any, Future]] = []
+        self._cond = threading.Condition()
+        self._flusher: threading.Thread | None = None
+        self._senders = ThreadPoolExecutor(max_workers=max(1, RPC_BATCH_SENDERS), thread_name_prefix="rpc-batch")
+        track_executor(f"rpc-batch {endpoint_label(str(getattr(provider, 'endpoint_uri', '')))}", self._senders)
+
+    def submit(self, method: str, params: Any) -> Future:
+        fut: Future = Future()
+        record_batched_call(method)
+        with self._cond:
+            self._pending.append((method, params, fut))
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="rpc-batch-flush", daemon=True)
+                self._flusher.start()
+            self._cond.notify()
+        return fut
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.linger
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                self._pending = self._pending[self.max_batch:]
+            self._senders.submit(self._send, batch)
+
+    def _send(self, batch: List[Tuple[str, Any, Future]]) -> None:
+        by_id, body = _encode_batch(self._ids, batch)
+        try:
+            resp = json.loads(self.provider.post_raw(body, method="batch"))
+        except Exception as e:
+            log.warning("batch POST failed (%d reqs): %s", len(batch), e)
+            for _, fut in by_id.values():
+                _settle(fut, exc=e)
+            return
+
+        if not isinstance(resp, list):
+            # Provider rejected the array (batching disabled / too large): resend one by one
+            log.warning("provider refused batch of %d: %s", len(batch), resp.get("error") if isinstance(resp, dict) else resp)
+            for method, params, fut in batch:
+                _resolve_single(self.provider, method, params, fut)
+            return
+        _settle_batch(by_id, resp)
+
+
+def _encode_batch(ids, batch) -> Tuple[dict, bytes]:
+    """[(method, params, fut)] -> ({id: (method, fut)}, JSON array body)."""
+    by_id = {}
+    payload = []
+    for method, params, fut in batch:
+        rid = next(ids)
+        by_id[rid] = (method, fut)
+        payload.append({"jsonrpc": "2.0", "id": rid, "method": method, "params": params})
+    return by_id, json.dumps(payload).encode()
+
+
+def _settle(fut, result: Any = None, exc: BaseException | None = None) -> None:
+    # An asyncio waiter may have been cancelled meanwhile; never resolve a future twice
+    if fut.done():
+        return
+    if exc is not None:
+        fut.set_exception(exc)
+    else:
+        fut.set_result(result)
+
+
+def _settle_batch(by_id: dict, resp: list) -> None:
+    for item in resp:
+        method, fut = by_id.pop(item.get("id"), (None, None))
+        if fut is None:
+            continue
+        if item.get("error") is not None:
+            _settle(fut, exc=RpcError(method, item["error"]))
+        else:
+            _settle(fut, item.get("result"))
+    for method, fut in by_id.values():
+        _settle(fut, exc=RpcError(method, {"message": "missing from batch response"}))
+
+
+class AsyncRpcBatcher:
+    """RpcBatcher for AsyncWeb3 clients: collects submits for linger_ms on the loop, then POSTs arrays."""
+
+    def __init__(self, provider, max_batch: int = RPC_BATCH_MAX, linger_ms: float = RPC_BATCH_LINGER_MS):
+        self.provider = provider
+        self.max_batch = max(1, int(max_batch))
+        self.linger = max(0.0, float(linger_ms)) / 1000.0
+        self._ids = itertools.count(1)
+        self._pending: List[Tuple[str, Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._inflight: set = set()   # keep send tasks referenced until they finish
+
+    def submit(self, method: str, params: Any) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        record_batched_call(method)
+        self._pending.append((method, params, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            # Empty context: the shared array POST must not be billed to whoever submitted first
+            self._timer = loop.call_later(self.linger, self._flush, context=contextvars.Context())
+        return fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            self._pending = self._pending[self.max_batch:]
+            task = contextvars.Context().run(loop.create_task, self._send(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: List[Tuple[str, Any, asyncio.Future]]) -> None:
+        by_id, body = _encode_batch(self._ids, batch)
+        try:
+            resp = json.loads(await self.provider.post_raw(body, method="batch"))
+        except Exception as e:
+            log.warning("async batch POST failed (%d reqs): %s", len(batch), e)
+            for _, fut in by_id.values():
+                _settle(fut, exc=e)
+            return
+
+        if not isinstance(resp, list):
+            log.warning("provider refused batch of %d: %s", len(batch), resp.get("error") if isinstance(resp, dict) else resp)
+            for method, params, fut in batch:
+                await _resolve_single_async(self.provider, method, params, fut)
+            return
+        _settle_batch(by_id, resp)
+
+
+def _resolve_single(provider, method: str, params: Any, fut: Future) -> None:
+    try:
+        resp = provider.make_request(method, params)
+        if resp.get("error") is not None:
+            _settle(fut, exc=RpcError(method, resp["error"]))
+        else:
+            _settle(fut, resp.get("result"))
+    except Exception as e:
+        _settle(fut, exc=e)
+
+
+async def _resolve_single_async(provider, method: str, params: Any, fut) -> None:
+    try:
+        resp = await provider.make_request(method, params)
+        if resp.get("error") is not None:
+            _settle(fut, exc=RpcError(method, resp["error"]))
+        else:
+            _settle(fut, resp.get("result"))
+    except Exception as e:
+        _settle(fut, exc=e)
+
+
+def get_batcher(w3) -> RpcBatcher | None:
+    """Shared batcher for this client's provider (None if the provider can't batch)."""
+    provider = w3.provider
+    if not RPC_BATCH_MODE or not hasattr(provider, "post_raw"):
+        return None
+    b = _BATCHERS.get(provider)
+    if b is None:
+        with _BATCHERS_LOCK:
+            b = _BATCHERS.get(provider)
+            if b is None:
+                b = RpcBatcher(provider)
+                _BATCHERS[provider] = b
+    return b
+
+
+def batch_requests(w3, requests_: Sequence[Tuple[str, Any]]) -> List[Any]:
+    """
+    Send raw JSON-RPC requests through the client's batcher and wait for all of them.
+    Returns raw JSON results (hex strings / dicts) or the exception for that entry.
+    """
+    batcher = get_batcher(w3)
+    with span("batched " + ",".join(sorted({m for m, _ in requests_})), kind="rpc",
+              requests=len(requests_), batched=batcher is not None):
+        futs = []
+        for method, params in requests_:
+            if batcher is not None:
+                futs.append(batcher.submit(method, params))
+            else:
+                fut: Future = Future()
+                _resolve_single(w3.provider, method, params, fut)
+                futs.append(fut)
+
+        out: List[Any] = []
+        for fut in futs:
+            try:
+                out.append(fut.result())
+            except Exception as e:
+                out.append(e)
+        annotate(errors=sum(isinstance(x, Exception) for x in out))
+        return out
+
+
+def get_async_batcher(w3) -> AsyncRpcBatcher | None:
+    """Shared batcher for an AsyncWeb3 client's provider (None if the provider can't batch)."""
+    provider = w3.provider
+    if not RPC_BATCH_MODE or not hasattr(provider, "post_raw"):
+        return None
+    b = _BATCHERS.get(provider)
+    if b is None:
+        b = AsyncRpcBatcher(provider)
+        _BATCHERS[provider] = b
+    return b
+
+
+async def batch_requests_async(w3, requests_: Sequence[Tuple[str, Any]]) -> List[Any]:
+    """Async batch_requests(): same result shape (raw result or the exception per entry)."""
+    batcher = get_async_batcher(w3)
+    with span("batched " + ",".join(sorted({m for m, _ in requests_})), kind="rpc",
+              requests=len(requests_), batched=batcher is not None):
+        futs = []
+        for method, params in requests_:
+            if batcher is not None:
+                futs.append(batcher.submit(method, params))
+            else:
+                fut = asyncio.get_running_loop().create_future()
+                await _resolve_single_async(w3.provider, method, params, fut)
+                futs.append(fut)
+        out = list(await asyncio.gather(*futs, return_exceptions=True))
+        annotate(errors=sum(isinstance(x, Exception) for x in out))
+        return out
+
+
+def block_param(block_identifier: Any = "latest") -> Any:
+    """web3-style block identifier -> raw JSON-RPC param ('latest', 'pending', or hex number)."""
+    if isinstance(block_identifier, int):
+        return hex(block_identifier)
+    return block_identifier
+
+
+def hex_to_bytes(value: Any) -> bytes:
+    """Raw hex result ('0x...') -> bytes; non-strings map to b''."""
+    if not isinstance(value, str):
+        return b""
+    h = value[2:] if value.startswith("0x") else value
+    return bytes.fromhex(h if len(h) % 2 == 0 else "0" + h)
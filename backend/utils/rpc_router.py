@@ -0,0 +1,322 @@
+# backend/utils/rpc_router.py
+# Purpose: Latency-aware routing of JSON-RPC POSTs across several endpoints of one chain.
+#
+# - Health scoring: EWMA latency x (1 + error penalty) x (1 + in-flight); picks the better of two random
+#   healthy endpoints ("power of two choices"), so slow nodes get less traffic but keep
+#   being measured.
+# - Ejection: RPC_EJECT_AFTER consecutive failures bench a node for RPC_EJECT_SECONDS
+#   (doubling on repeat ejections, capped at 10 min).
+# - Failover: a failed POST (connection error, timeout, 429/5xx) is retried on the next
+#   endpoint before giving up.
+# - Hedged reads (RPC_HEDGE=1): if the first node hasn't answered by the p95 latency of
+#   the fastest healthy node, a duplicate goes to a second node and the first answer wins.
+#   At most RPC_HEDGE_BUDGET duplicates are in flight at once, so a stalled node can't
+#   turn hedging into a request storm.
+# - post_async() is the same policy for the asyncio pipeline (aiohttp session), sharing
+#   the endpoints' health stats with the threaded path; the losing hedge is cancelled.
+# - Shared rate limit (RPC_SHARED_QPS > 0): every POST to an endpoint, from any local
+#   process, takes a token from that endpoint's bucket in backend/utils/shared_limit.py.
+
+from __future__ import annotations
+import asyncio
+import contextvars
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence
+
+import aiohttp
+import requests
+
+from backend.utils.metrics import RPC_ENDPOINT_REQUESTS, RPC_ENDPOINT_SECONDS, endpoint_label, track_executor
+from backend.utils.log import get_logger
+from backend.utils.ratelimit import current_lane
+from backend.utils.shared_limit import shared_wait, shared_wait_async
+from backend.utils.trace import span
+
+RPC_EJECT_AFTER = int(os.getenv("RPC_EJECT_AFTER", "3"))
+RPC_EJECT_SECONDS = float(os.getenv("RPC_EJECT_SECONDS", "30"))
+RPC_HEDGE = os.getenv("RPC_HEDGE", "0").strip().lower() not in {"0", "false", "no", "off", ""}
+RPC_HEDGE_MIN_MS = float(os.getenv("RPC_HEDGE_MIN_MS", "50"))
+RPC_HEDGE_DEFAULT_MS = float(os.getenv("RPC_HEDGE_DEFAULT_MS", "1000"))
+RPC_HEDGE_BUDGET = int(os.getenv("RPC_HEDGE_BUDGET", "8"))   # max duplicate requests in flight
+RPC_SHARED_QPS = float(os.getenv("RPC_SHARED_QPS", "0"))     # per endpoint, all local processes; 0 = off
+
+_MAX_EJECT_SECONDS = 600.0
+_EWMA_ALPHA = 0.2
+_MIN_SAMPLES_FOR_P95 = 20
+_FAILURE_LATENCY = 1.0
+
+
+log = get_logger("rpc-router")
+
+
+class Endpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.label = endpoint_label(url)    # metrics label (no path/query: may hold an API key)
+        self.bucket = "rpc:" + hashlib.sha1(url.encode()).hexdigest()[:16]   # shared rate-limit bucket name
+        self.ewma_latency = 0.0        # seconds; 0 = untried (gets picked early)
+        self.error_ewma = 0.0          # 0..1
+        self.samples: deque = deque(maxlen=200)
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.inflight = 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def score(self) -> float:
+        # In-flight count matters because a stalled node's latency is only learned on completion
+        return max(self.ewma_latency, 0.001) * (1.0 + 4.0 * self.error_ewma) * (1 + self.inflight)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < _MIN_SAMPLES_FOR_P95:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class RpcRouter:
+    def __init__(self, urls: Sequence[str], session: requests.Session, timeout: float,
+                 hedge: bool = RPC_HEDGE, headers: Optional[Dict[str, str]] = None,
+                 max_concurrency: int = 32):
+        if not urls:
+            raise ValueError("RpcRouter needs at least one endpoint")
+        self.endpoints: List[Endpoint] = [Endpoint(u) for u in urls]
+        self.session = session
+        self.timeout = timeout
+        self.hedge = hedge and len(self.endpoints) > 1
+        self.headers = headers or {"Content-Type": "application/json"}
+        self._lock = threading.Lock()
+        self._hedges_inflight = 0
+        # Primaries run on this pool too (so we can wait with a timeout): size it for every
+        # caller plus the hedge budget, or losing duplicates would starve new requests.
+        self._hedge_pool = (ThreadPoolExecutor(max_workers=max_concurrency + RPC_HEDGE_BUDGET,
+                                               thread_name_prefix="rpc-hedge")
+                            if self.hedge else None)
+        if self._hedge_pool is not None:
+            track_executor(f"rpc-hedge {self.endpoints[0].label}", self._hedge_pool)
+
+    # ---- selection / health ----
+
+    def _pick(self, exclude: Sequence[Endpoint] = ()) -> Optional[Endpoint]:
+        now = time.monotonic()
+        with self._lock:
+            live = [e for e in self.endpoints if e not in exclude and e.healthy(now)]
+            if not live:
+                # Everyone is benched: try the one coming back soonest rather than failing outright
+                rest = [e for e in self.endpoints if e not in exclude]
+                return min(rest, key=lambda e: e.ejected_until) if rest else None
+            if len(live) == 1:
+                return live[0]
+            a, b = random.sample(live, 2)
+            return a if a.score() <= b.score() else b
+
+    def _record(self, ep: Endpoint, ok: bool, latency: float) -> None:
+        RPC_ENDPOINT_REQUESTS.inc(endpoint=ep.label, outcome="ok" if ok else "error")
+        RPC_ENDPOINT_SECONDS.observe(latency, endpoint=ep.label)
+        with self._lock:
+            ep.requests += 1
+            ep.error_ewma = (1 - _EWMA_ALPHA) * ep.error_ewma + _EWMA_ALPHA * (0.0 if ok else 1.0)
+            if ok:
+                ep.samples.append(latency)
+                ep.ewma_latency = latency if ep.ewma_latency == 0.0 else \
+                    (1 - _EWMA_ALPHA) * ep.ewma_latency + _EWMA_ALPHA * latency
+                ep.consecutive_failures = 0
+                ep.ejections = 0
+                return
+            ep.failures += 1
+            ep.consecutive_failures += 1
+            # A failure costs at least _FAILURE_LATENCY so a fast-failing node never looks "fast"
+            penalty = max(latency, _FAILURE_LATENCY)
+            ep.ewma_latency = (1 - _EWMA_ALPHA) * ep.ewma_latency + _EWMA_ALPHA * penalty
+            if ep.consecutive_failures >= RPC_EJECT_AFTER:
+                self._eject(ep)
+
+    def _eject(self, ep: Endpoint) -> None:
+        cooldown = min(_MAX_EJECT_SECONDS, RPC_EJECT_SECONDS * (2 ** ep.ejections))
+        ep.ejections += 1
+        ep.consecutive_failures = 0
+        ep.ejected_until = time.monotonic() + cooldown
+        log.warning("ejecting %s for %.0fs", ep.label, cooldown)
+
+    def eject(self, url: str) -> None:
+        """Bench an endpoint up front (e.g. unreachable at startup)."""
+        with self._lock:
+            for ep in self.endpoints:
+                if ep.url == url:
+                    self._eject(ep)
+
+    # ---- transport ----
+
+    def _post_once(self, ep: Endpoint, data: bytes) -> bytes:
+        if RPC_SHARED_QPS > 0:
+            shared_wait(ep.bucket, RPC_SHARED_QPS, RPC_SHARED_QPS, current_lane())
+        start = time.monotonic()
+        with self._lock:
+            ep.inflight += 1
+        try:
+            with span(ep.label, kind="http"):
+                resp = self.session.post(ep.url, data=data, headers=self.headers, timeout=self.timeout)
+                resp.raise_for_status()
+                content = resp.content
+        except Exception:
+            self._record(ep, False, time.monotonic() - start)
+            raise
+        finally:
+            with self._lock:
+                ep.inflight -= 1
+        self._record(ep, True, time.monotonic() - start)
+        return content
+
+    def _hedge_delay(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            p95s = [e.p95() for e in self.endpoints if e.healthy(now)]
+        p95s = [p for p in p95s if p is not None]
+        p95 = min(p95s) if p95s else None
+        return max(RPC_HEDGE_MIN_MS / 1000.0, p95 if p95 is not None else RPC_HEDGE_DEFAULT_MS / 1000.0)
+
+    def _post_hedge(self, ep: Endpoint, data: bytes) -> bytes:
+        try:
+            return self._post_once(ep, data)
+        finally:
+            with self._lock:
+                self._hedges_inflight -= 1
+
+    def _hedged(self, first: Endpoint, data: bytes) -> bytes:
+        # Each attempt runs in a copy of the caller's context so it shows up in the caller's trace
+        futs = {self._hedge_pool.submit(contextvars.copy_context().run, self._post_once, first, data): first}
+        done, _ = wait(futs, timeout=self._hedge_delay())
+        if not done:
+            second = self._pick(exclude=[first])
+            with self._lock:
+                launch = (second is not None and second.healthy(time.monotonic())
+                          and self._hedges_inflight < RPC_HEDGE_BUDGET)
+                if launch:
+                    self._hedges_inflight += 1
+            if launch:
+                futs[self._hedge_pool.submit(contextvars.copy_context().run, self._post_hedge, second, data)] = second
+        pending = set(futs)
+        last_exc: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    return fut.result()
+                last_exc = fut.exception()
+        raise last_exc  # type: ignore[misc]
+
+    def post(self, data: bytes) -> bytes:
+        """POST a JSON-RPC body, failing over across endpoints. Raises the last error."""
+        tried: List[Endpoint] = []
+        last_exc: Optional[BaseException] = None
+        for _ in range(len(self.endpoints)):
+            ep = self._pick(exclude=tried)
+            if ep is None:
+                break
+            try:
+                if self.hedge and not tried:
+                    return self._hedged(ep, data)
+                return self._post_once(ep, data)
+            except Exception as e:
+                last_exc = e
+                tried.append(ep)
+                log.info("%s failed (%s); failing over", ep.label, e.__class__.__name__)
+        raise last_exc if last_exc else RuntimeError("no RPC endpoint available")
+
+    # ---- asyncio transport ----
+
+    async def _post_once_async(self, ep: Endpoint, session: aiohttp.ClientSession, data: bytes) -> bytes:
+        if RPC_SHARED_QPS > 0:
+            await shared_wait_async(ep.bucket, RPC_SHARED_QPS, RPC_SHARED_QPS, current_lane())
+        start = time.monotonic()
+        with self._lock:
+            ep.inflight += 1
+        try:
+            with span(ep.label, kind="http"):
+                async with session.post(ep.url, data=data, headers=self.headers) as resp:
+                    resp.raise_for_status()
+                    content = await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self._record(ep, False, time.monotonic() - start)
+            raise
+        finally:
+            with self._lock:
+                ep.inflight -= 1
+        self._record(ep, True, time.monotonic() - start)
+        return content
+
+    async def _post_hedge_async(self, ep: Endpoint, session: aiohttp.ClientSession, data: bytes) -> bytes:
+        try:
+            return await self._post_once_async(ep, session, data)
+        finally:
+            with self._lock:
+                self._hedges_inflight -= 1
+
+    async def _hedged_async(self, first: Endpoint, session: aiohttp.ClientSession, data: bytes) -> bytes:
+        tasks = {asyncio.ensure_future(self._post_once_async(first, session, data))}
+        done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay())
+        if not done:
+            second = self._pick(exclude=[first])
+            with self._lock:
+                launch = (second is not None and second.healthy(time.monotonic())
+                          and self._hedges_inflight < RPC_HEDGE_BUDGET)
+                if launch:
+                    self._hedges_inflight += 1
+            if launch:
+                tasks.add(asyncio.ensure_future(self._post_hedge_async(second, session, data)))
+        pending = tasks
+        last_exc: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_exc = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_exc  # type: ignore[misc]
+
+    async def post_async(self, session: aiohttp.ClientSession, data: bytes) -> bytes:
+        """Async post(): same endpoint choice, failover and hedging, over an aiohttp session."""
+        tried: List[Endpoint] = []
+        last_exc: Optional[BaseException] = None
+        for _ in range(len(self.endpoints)):
+            ep = self._pick(exclude=tried)
+            if ep is None:
+                break
+            try:
+                if self.hedge and not tried:
+                    return await self._hedged_async(ep, session, data)
+                return await self._post_once_async(ep, session, data)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_exc = e
+                tried.append(ep)
+                log.info("%s failed (%s); failing over", ep.label, e.__class__.__name__)
+        raise last_exc if last_exc else RuntimeError("no RPC endpoint available")
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "endpoint": e.label,   # never the URL: it may carry an API key
+                "healthy": e.healthy(now),
+                "ejected_for_s": round(max(0.0, e.ejected_until - now), 1),
+                "ewma_latency_ms": round(e.ewma_latency * 1000, 1),
+                "p95_ms": round(e.p95() * 1000, 1) if e.p95() is not None else None,
+                "error_rate": round(e.error_ewma, 3),
+                "requests": e.requests,
+                "failures": e.failures,
+                "inflight": e.inflight,
+            } for e in self.endpoints]
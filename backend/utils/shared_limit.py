@@ -0,0 +1,244 @@
+# backend/utils/shared_limit.py
+# Purpose: Token buckets shared by every local process (uvicorn workers, cli.py, batch_cli.py)
+# through one SQLite file, so together they stay under an API key's real limit.
+#
+#   shared_wait("explorer:etherscan_v2", rate=4.0, burst=4.0, lane="batch")
+#   await shared_wait_async(...)
+#   shared_drain("explorer:etherscan_v2")      # got a 429: every process pauses
+#   shared_count("explorer-key:1a2b3c4d", "2025-01-31")   # daily counters (API key quotas)
+#
+# A take is one short IMMEDIATE transaction on (tokens, stamp) of that bucket. Interactive
+# callers may reserve a token up to one burst ahead (sleep the returned delay, then go);
+# batch callers only take a token that is there now, so interactive traffic still goes
+# first across processes. The per-process limiter in ratelimit.py runs before this, so
+# only callers already at the front of their own process's line get here.
+#
+# RATELIMIT_SHARED=0 turns it off (per-process limits only). If the file can't be used it
+# is switched off with one error log, like the explorer store. A file that is only busy
+# (still locked after the busy timeout) is retried once, then that one call goes on under
+# the per-process limits alone.
+
+from __future__ import annotations
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from backend.utils.log import get_logger
+
+log = get_logger("shared-limit")
+
+RATELIMIT_SHARED = os.getenv("RATELIMIT_SHARED", "1").strip().lower() not in {"0", "false", "no", "off", ""}
+RATELIMIT_SHARED_PATH = (os.getenv("RATELIMIT_SHARED_PATH")
+                         or str(Path(__file__).resolve().parents[2] / "data" / "ratelimit.db"))
+
+_MAX_NAP = 0.5   # batch callers re-check at least this often
+_BUSY_RETRIES = 1   # extra tries of a take that found the file locked, before falling back for that call
+_BUSY_BACKOFF = 0.1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name   TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,      -- may go negative: tokens reserved ahead by interactive callers
+    stamp  REAL NOT NULL       -- wall clock (shared by all processes) of the last update
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT NOT NULL,
+    day   TEXT NOT NULL,       -- UTC date
+    used  INTEGER NOT NULL,
+    PRIMARY KEY (name, day)
+);
+"""
+
+
+class SharedBuckets:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode: take() runs its own BEGIN IMMEDIATE ... COMMIT
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=OFF")   # losing the last few updates in a crash is harmless
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def take(self, name: str, rate: float, burst: float, reserve: bool) -> Tuple[bool, float]:
+        """
+        Try to take one token: (True, seconds until it may be used; 0.0 unless reserved ahead)
+        or (False, seconds until asking again makes sense).
+        """
+        rate, burst = max(0.1, rate), max(1.0, burst)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, stamp FROM buckets WHERE name=?", (name,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+            floor = 1.0 - burst if reserve else 1.0   # reservations may run one burst into debt
+            taken = tokens >= floor
+            if taken:
+                tokens -= 1.0
+                wait = max(0.0, -tokens / rate)
+            else:
+                wait = (floor - tokens) / rate
+            conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (name, tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return taken, wait
+
+    def count(self, name: str, day: str) -> int:
+        """Add one to name's counter for day and return the new total."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO counters VALUES (?, ?, 1) ON CONFLICT(name, day) DO UPDATE SET used = used + 1",
+                         (name, day))
+            used = conn.execute("SELECT used FROM counters WHERE name=? AND day=?", (name, day)).fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return used
+
+    def drain(self, name: str) -> None:
+        """Empty the bucket (keeping any debt), e.g. after the API answered 429."""
+        self._conn().execute("UPDATE buckets SET tokens = MIN(tokens, 0.0), stamp = MAX(stamp, ?) WHERE name = ?",
+                             (time.time(), name))
+
+
+_BUCKETS: Optional[SharedBuckets] = None
+_FAILED = False
+_LOCK = threading.Lock()
+
+
+def get_shared_buckets() -> Optional[SharedBuckets]:
+    """Process-wide handle, opened on first use. None if disabled or the file can't be used."""
+    global _BUCKETS, _FAILED
+    if _BUCKETS is not None or _FAILED or not RATELIMIT_SHARED:
+        return _BUCKETS
+    with _LOCK:
+        if _BUCKETS is None and not _FAILED:
+            try:
+                _BUCKETS = SharedBuckets(RATELIMIT_SHARED_PATH)
+                log.debug("shared rate limits at %s", RATELIMIT_SHARED_PATH)
+            except (OSError, sqlite3.Error) as e:
+                _FAILED = True
+                log.error("shared rate limits disabled, can't open %s: %s", RATELIMIT_SHARED_PATH, e)
+    return _BUCKETS
+
+
+def _disable(e: Exception) -> None:
+    global _BUCKETS, _FAILED
+    with _LOCK:
+        if not _FAILED:
+            log.error("shared rate limits disabled after error (%s): %s", RATELIMIT_SHARED_PATH, e)
+        _FAILED, _BUCKETS = True, None
+
+
+def _transient(e: sqlite3.Error) -> bool:
+    """Locked/busy file under contention: worth another try, not a reason to turn the limits off."""
+    msg = str(e).lower()
+    return isinstance(e, sqlite3.OperationalError) and ("locked" in msg or "busy" in msg)
+
+
+def _retry_after(e: sqlite3.Error, name: str, attempt: int) -> Optional[float]:
+    """Seconds to wait before trying a failed take again, or None to go on without the shared bucket."""
+    if not _transient(e):
+        _disable(e)
+        return None
+    if attempt > _BUSY_RETRIES:
+        log.warning("shared bucket %s busy, this request only uses per-process limits: %s", name, e)
+        return None
+    return _BUSY_BACKOFF * attempt
+
+
+def shared_wait(name: str, rate: float, burst: float, lane: str = "interactive") -> None:
+    """Block until this process may send one request counted against the shared bucket name."""
+    buckets = get_shared_buckets()
+    reserve = lane == "interactive"
+    busy = 0
+    while buckets is not None:
+        try:
+            taken, nap = buckets.take(name, rate, burst, reserve)
+        except sqlite3.Error as e:
+            busy += 1
+            backoff = _retry_after(e, name, busy)
+            if backoff is None:
+                return
+            time.sleep(backoff)
+            continue
+        busy = 0
+        if taken:
+            if nap:
+                time.sleep(nap)
+            return
+        time.sleep(min(nap, _MAX_NAP))
+
+
+async def shared_wait_async(name: str, rate: float, burst: float, lane: str = "interactive") -> None:
+    """shared_wait() for coroutines (the SQLite transaction runs in a worker thread)."""
+    buckets = get_shared_buckets()
+    reserve = lane == "interactive"
+    busy = 0
+    while buckets is not None:
+        try:
+            taken, nap = await asyncio.to_thread(buckets.take, name, rate, burst, reserve)
+        except sqlite3.Error as e:
+            busy += 1
+            backoff = _retry_after(e, name, busy)
+            if backoff is None:
+                return
+            await asyncio.sleep(backoff)
+            continue
+        busy = 0
+        if taken:
+            if nap:
+                await asyncio.sleep(nap)
+            return
+        await asyncio.sleep(min(nap, _MAX_NAP))
+
+
+def shared_count(name: str, day: str) -> Optional[int]:
+    """Cross-process daily counter (e.g. API key quota); None when the shared file is off."""
+    buckets = get_shared_buckets()
+    if buckets is None:
+        return None
+    try:
+        return buckets.count(name, day)
+    except sqlite3.Error as e:
+        if _transient(e):
+            log.warning("shared counter %s busy, not counted this time: %s", name, e)
+        else:
+            _disable(e)
+        return None
+
+
+def shared_drain(name: str) -> None:
+    buckets = get_shared_buckets()
+    if buckets is None:
+        return
+    try:
+        buckets.drain(name)
+    except sqlite3.Error as e:
+        if _transient(e):
+            log.warning("shared bucket %s busy, not drained: %s", name, e)
+        else:
+            _disable(e)
+
+
+__all__ = ["SharedBuckets", "get_shared_buckets", "shared_wait", "shared_wait_async", "shared_count", "shared_drain"]
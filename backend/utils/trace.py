@@ -0,0 +1,153 @@
+# backend/utils/trace.py
+# Purpose: Optional per-analysis trace: nested, timed spans for every step, RPC POST,
+# JSON-RPC array read, Multicall chunk, explorer GET and cache lookup.
+#
+#   with tracing() as tr:                       # analyze_token(..., trace=True)
+#       with span("rpc eth_call", kind="rpc", bytes_out=len(body)):
+#           raw = post(body)
+#           annotate(bytes_in=len(raw))
+#   result["_trace"] = tr.to_dict()
+#
+# Like call_accounting(), the active trace and the current span live in ContextVars,
+# so spans nest correctly across the step pool (copied contexts) and asyncio tasks.
+# With no trace active, span()/annotate() cost one ContextVar lookup.
+# Work shared between analyses (batcher flush threads, array POSTs) runs in an empty
+# context and is deliberately not attributed; the waiting caller gets the span instead.
+
+from __future__ import annotations
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "2000"))   # per analysis; extra spans are counted, not kept
+
+_TRACE: ContextVar[Optional["Trace"]] = ContextVar("analysis_trace", default=None)
+_SPAN: ContextVar[Optional[Dict[str, Any]]] = ContextVar("analysis_trace_span", default=None)
+
+
+class Trace:
+    def __init__(self, max_spans: int = TRACE_MAX_SPANS):
+        self.started = time.perf_counter()
+        self.max_spans = max_spans
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    def _ms(self, t: float) -> float:
+        return round((t - self.started) * 1000.0, 3)
+
+    def open(self, name: str, kind: str, parent: Optional[Dict[str, Any]], attrs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return None
+            self._ids += 1
+            s = {"id": self._ids, "parent": parent["id"] if parent else None, "name": name, "kind": kind,
+                 "start_ms": self._ms(time.perf_counter()), "dur_ms": None, **attrs}
+            self.spans.append(s)
+            return s
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [dict(s) for s in self.spans]
+        return {"total_ms": self._ms(time.perf_counter()), "span_count": len(spans),
+                "dropped": self.dropped, "spans": spans}
+
+
+@contextmanager
+def tracing(enabled: bool = True) -> Iterator[Optional[Trace]]:
+    """Record spans for the enclosed block. Yields the Trace (None when disabled)."""
+    if not enabled:
+        yield None
+        return
+    tr = Trace()
+    t_token = _TRACE.set(tr)
+    s_token = _SPAN.set(None)
+    try:
+        yield tr
+    finally:
+        _SPAN.reset(s_token)
+        _TRACE.reset(t_token)
+
+
+def tracing_active() -> bool:
+    return _TRACE.get() is not None
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attrs: Any) -> Iterator[Optional[Dict[str, Any]]]:
+    """Timed child of the current span. An escaping exception is recorded as the span's error."""
+    tr = _TRACE.get()
+    s = tr.open(name, kind, _SPAN.get(), attrs) if tr is not None else None
+    if s is None:
+        yield None
+        return
+    token = _SPAN.set(s)
+    start = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s["error"] = f"{e.__class__.__name__}: {e}"[:200]
+        raise
+    finally:
+        s["dur_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+        _SPAN.reset(token)
+
+
+def event(name: str, kind: str = "internal", **attrs: Any) -> None:
+    """Zero-length span (e.g. a cache hit)."""
+    tr = _TRACE.get()
+    if tr is not None:
+        s = tr.open(name, kind, _SPAN.get(), attrs)
+        if s is not None:
+            s["dur_ms"] = 0.0
+
+
+def annotate(**attrs: Any) -> None:
+    """Set attributes on the current span (no-op outside a trace)."""
+    s = _SPAN.get()
+    if s is not None and _TRACE.get() is not None:
+        s.update(attrs)
+
+
+def add_to(key: str, amount: float) -> None:
+    """Accumulate a numeric attribute on the current span (e.g. rate-limit wait over retries)."""
+    s = _SPAN.get()
+    if s is not None and _TRACE.get() is not None:
+        s[key] = round(s.get(key, 0) + amount, 3)
+
+
+def format_waterfall(trace: Dict[str, Any], width: int = 40) -> str:
+    """Plain-text waterfall of a to_dict() trace (one line per span, children indented)."""
+    spans = trace.get("spans") or []
+    total = max(float(trace.get("total_ms") or 0.0), 0.001)
+    children: Dict[Optional[int], List[Dict[str, Any]]] = {}
+    for s in spans:
+        children.setdefault(s.get("parent"), []).append(s)
+    skip = {"id", "parent", "name", "kind", "start_ms", "dur_ms"}
+    lines: List[str] = []
+
+    def walk(parent: Optional[int], depth: int) -> None:
+        for s in sorted(children.get(parent, []), key=lambda x: x["start_ms"]):
+            dur = s.get("dur_ms") or 0.0
+            col = int(s["start_ms"] / total * width)
+            bar = " " * min(col, width - 1) + "#" * max(1, int(dur / total * width))
+            extra = " ".join(f"{k}={v}" for k, v in s.items() if k not in skip)
+            lines.append(f"{s['start_ms']:9.1f} {dur:9.1f}ms |{bar[:width]:<{width}}| "
+                         f"{'  ' * depth}{s['kind']}:{s['name']} {extra}".rstrip())
+            walk(s["id"], depth + 1)
+
+    walk(None, 0)
+    # Spans whose parent was dropped (TRACE_MAX_SPANS) still get listed
+    known = {s["id"] for s in spans}
+    for pid in [p for p in children if p is not None and p not in known]:
+        walk(pid, 0)
+    lines.append(f"total {total:.1f}ms, {len(spans)} spans" + (f", {trace['dropped']} dropped" if trace.get("dropped") else ""))
+    return "\n".join(lines)
+
+
+__all__ = ["Trace", "tracing", "tracing_active", "span", "event", "annotate", "add_to", "format_waterfall"]
@@ -1,50 +1,83 @@
 # batch_cli.py
-import argparse, json, csv, sys, os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse, json, csv, sys, os, queue, sqlite3, threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
 from pathlib import Path
 
-print("[BATCH] Booting...")
-
 from dotenv import load_dotenv
 _loaded = load_dotenv()
-print(f"[BATCH] .env loaded: {_loaded}")
-print(f"[BATCH] ENV presence -> ETH RPC: {'yes' if os.getenv('WEB3_PROVIDER_ETH') else 'no'}, "
-      f"BSC RPC: {'yes' if os.getenv('WEB3_PROVIDER_BSC') else 'no'}, "
-      f"ETHERSCAN_API_KEY: {'yes' if os.getenv('ETHERSCAN_API_KEY') else 'no'}, "
-      f"BSCSCAN_API_KEY: {'yes' if os.getenv('BSCSCAN_API_KEY') else 'no'}")
+
+# After load_dotenv, so LOG_* settings from .env apply
+from backend.utils.log import get_logger
+log = get_logger("BATCH")
+log.debug("Booting...")
+log.debug(".env loaded: %s", _loaded)
+log.debug("ENV presence -> ETH RPC: %s, BSC RPC: %s, ETHERSCAN_API_KEY: %s, BSCSCAN_API_KEY: %s",
+          *("yes" if os.getenv(k) else "no"
+            for k in ("WEB3_PROVIDER_ETH", "WEB3_PROVIDER_BSC", "ETHERSCAN_API_KEY", "BSCSCAN_API_KEY")))
 
 try:
     from backend.core.analyze import analyze_token
-    print("[BATCH] Import analyze_token: OK")
+    log.debug("Import analyze_token: OK")
 except Exception as e:
-    print("[BATCH] Import analyze_token: FAIL ->", e)
+    log.error("Import analyze_token: FAIL -> %s", e)
     sys.exit(1)
 
 try:
     from backend.utils.ratelimit import set_default_qps
-    print("[BATCH] Import set_default_qps: OK")
+    log.debug("Import set_default_qps: OK")
 except Exception as e:
-    print("[BATCH] Import set_default_qps: FAIL ->", e)
+    log.error("Import set_default_qps: FAIL -> %s", e)
     sys.exit(1)
 
+from backend.chains import warm_up_clients
+from backend.utils.addr import normalize_evm_address
+from backend.utils.concurrency import CONCURRENCY_ADAPTIVE, concurrency_limit, default_ceiling
+from backend.utils.context import prefetch_contract_ages
+
+FIELDNAMES = ["chain","address","ownership","abi_verified","suspicious_functions","has_mint",
+              "max_fee_pct","lp_burn_pct","base_symbol","base_reserve","usd_liquidity",
+              "age_days","score","risk_tier","rpc_calls","block","error"]
+
+PREFETCH_CHUNK = 200   # addresses per contract-age prefetch, looked up ahead of the scan
+
 
-def load_addresses(path: str) -> list[str]:
-    print(f"[BATCH] Loading addresses from: {path}")
+def iter_addresses(path: str):
+    """Addresses from the input file, one per line ('#' comments), read lazily."""
+    log.debug("Reading addresses from: %s", path)
     p = Path(path)
     if not p.exists():
-        print(f"[BATCH] ❌ Input file not found: {path}", file=sys.stderr)
+        log.error("Input file not found: %s", path)
         sys.exit(1)
-    addrs = []
     with p.open() as f:
         for line in f:
             s = line.strip()
             if not s or s.startswith("#"):
                 continue
-            addrs.append(s)
-    print(f"[BATCH] Loaded {len(addrs)} addresses")
-    if addrs:
-        print("[BATCH] First 3:", addrs[:3])
-    return addrs
+            yield s
+
+
+def address_key(raw: str) -> str:
+    """Checksummed address (so case variants dedupe); invalid input stays as-is and fails in its scan."""
+    try:
+        return normalize_evm_address(raw)
+    except ValueError:
+        return (raw or "").strip()
+
+
+class SeenSet:
+    """Addresses already scanned or queued, in a private on-disk SQLite table (memory stays flat)."""
+
+    def __init__(self):
+        # "" = temporary database file, deleted on close
+        self.conn = sqlite3.connect("", isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("CREATE TABLE seen (address TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    def add(self, address: str) -> bool:
+        """True if address was new."""
+        return self.conn.execute("INSERT OR IGNORE INTO seen VALUES (?)", (address,)).rowcount == 1
 
 
 def _safe_float(x, default=0.0):
@@ -55,7 +88,7 @@ def _safe_float(x, default=0.0):
 
 
 def flatten_result(res: dict) -> dict:
-    print(f"[BATCH] Flattening result for {res.get('address','?')}")
+    log.debug("Flattening result for %s", res.get('address','?'))
     fees = (res.get("fees_percent") or {})
     fees_numeric = {k: v for k, v in fees.items() if isinstance(v, (int, float))}
     max_fee = max(fees_numeric.values()) if fees_numeric else 0.0
@@ -81,81 +114,249 @@ def flatten_result(res: dict) -> dict:
         "age_days": f"{_safe_float((res.get('context') or {}).get('age_days', 0.0)):.1f}",
         "score": res.get("score"),
         "risk_tier": res.get("risk_tier"),
+        "rpc_calls": (res.get("rpc_calls") or {}).get("total", ""),
+        "block": (res.get("snapshot") or {}).get("block", ""),
         "error": "",
     }
-    print(f"[BATCH] Flattened: score={flat['score']} tier={flat['risk_tier']} max_fee={flat['max_fee_pct']} usd_liq={flat['usd_liquidity']}")
+    log.debug("Flattened: score=%s tier=%s max_fee=%s usd_liq=%s", flat['score'], flat['risk_tier'], flat['max_fee_pct'], flat['usd_liquidity'])
     return flat
 
 
+def error_row(chain: str, address: str, error: str) -> dict:
+    row = {k: "" for k in FIELDNAMES}
+    row.update(chain=chain, address=address, error=error)
+    return row
+
+
+def record_row(rec: dict) -> dict:
+    """CSV row for one NDJSON record (an analysis result, or {chain, address, error})."""
+    if rec.get("error") and "score" not in rec:
+        return error_row(rec.get("chain"), rec.get("address"), rec["error"])
+    return flatten_result(rec)
+
+
+def _cut_partial_line(path: Path) -> None:
+    """Drop a half-written last line (the previous run died mid-write)."""
+    with path.open("rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if not size:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        pos = size - 1
+        while pos > 0:
+            step = min(65536, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            nl = chunk.rfind(b"\n")
+            if nl >= 0:
+                f.truncate(pos - step + nl + 1)
+                return
+            pos -= step
+        f.truncate(0)
+    log.warning("Dropped a partial last line from %s", path)
+
+
+def _iter_ndjson(path: Path):
+    with path.open() as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def resume_outputs(args, seen: SeenSet) -> int:
+    """
+    Mark every address already in the NDJSON output as done and bring the CSV level with it
+    (rows for records written just before a crash are appended). Returns the number of records.
+    """
+    ndjson, out_csv = Path(args.out_ndjson), Path(args.out_csv)
+    if not ndjson.exists():
+        return 0
+    _cut_partial_line(ndjson)
+    done = 0
+    for rec in _iter_ndjson(ndjson):
+        seen.add(address_key(rec.get("address") or ""))
+        done += 1
+    rows = 0
+    if out_csv.exists() and out_csv.stat().st_size:
+        _cut_partial_line(out_csv)
+        with out_csv.open(newline="") as f:
+            rows = max(0, sum(1 for _ in csv.reader(f)) - 1)   # minus the header
+    if rows < done:
+        with out_csv.open("a", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            if out_csv.stat().st_size == 0:
+                w.writeheader()
+            w.writerows(record_row(rec) for rec in islice(_iter_ndjson(ndjson), rows, None))
+        log.info("Resume: appended %s CSV rows missing after the last run", done - rows)
+    return done
+
+
+def _feed(args, seen: SeenSet, out: queue.Queue, stats: dict):
+    """
+    Reader thread: stream the input file, drop duplicates, prefetch contract ages a chunk
+    ahead and hand addresses to the scan loop (bounded queue, so memory stays flat).
+    """
+    def fresh():
+        for raw in iter_addresses(args.infile):
+            stats["read"] += 1
+            key = address_key(raw)
+            if seen.add(key):
+                yield key
+            else:
+                stats["skipped"] += 1
+
+    try:
+        addresses = fresh()
+        while chunk := list(islice(addresses, PREFETCH_CHUNK)):
+            # Creation info for the chunk in a few multi-address explorer calls (best effort)
+            try:
+                prefetch_contract_ages(args.chain, chunk)
+            except Exception as e:
+                log.warning("Contract age prefetch failed, falling back to per-token lookups: %s", e)
+            for addr in chunk:
+                out.put(addr)
+    except BaseException as e:
+        out.put(e)
+    finally:
+        out.put(None)
+
+
+def write_json_array(ndjson_path: str, json_path: str):
+    """The NDJSON output as one JSON array (streamed record by record)."""
+    with open(json_path, "w") as f:
+        f.write("[")
+        for i, rec in enumerate(_iter_ndjson(Path(ndjson_path))):
+            f.write(",\n  " if i else "\n  ")
+            f.write(json.dumps(rec))
+        f.write("\n]\n")
+
+
 def main():
-    print("[BATCH] Parsing arguments...")
+    log.debug("Parsing arguments...")
     ap = argparse.ArgumentParser(description="Token Rug Radar - Batch Scanner (debug prints)")
     ap.add_argument("--chain", default="eth", choices=["eth", "bsc"], help="Chain to scan")
     ap.add_argument("--infile", required=True, help="Path to text file with one address per line")
     ap.add_argument("--out-csv", default="batch_scan.csv", help="CSV output path")
-    ap.add_argument("--out-json", default="batch_scan.json", help="JSON output path")
-    ap.add_argument("--concurrency", type=int, default=2, help="Parallel scans (1–3 safe on free plans)")
+    ap.add_argument("--out-ndjson", default="batch_scan.ndjson",
+                    help="NDJSON output path (one result per line, appended as results arrive)")
+    ap.add_argument("--out-json", default="batch_scan.json",
+                    help="JSON array written from the NDJSON output at the end ('' = skip)")
+    ap.add_argument("--resume", action="store_true",
+                    help="Keep existing outputs and skip addresses already in them")
+    ap.add_argument("--concurrency", type=int, default=None,
+                    help="Max parallel scans (default: adaptive up to CONCURRENCY_MAX; fixed if CONCURRENCY_ADAPTIVE=0)")
     ap.add_argument("--etherscan-qps", type=float, default=4.0, help="Max req/s to explorer APIs")
+    ap.add_argument("--pin-block", action="store_true", default=None,
+                    help="Pin each scan to one block (default: ANALYZE_PIN_BLOCK)")
     args = ap.parse_args()
-    print(f"[BATCH] Args -> chain={args.chain} infile={args.infile} out_csv={args.out_csv} out_json={args.out_json} "
-          f"conc={args.concurrency} qps={args.etherscan_qps}")
+    log.debug("Args -> chain=%s infile=%s out_csv=%s out_ndjson=%s out_json=%s conc=%s qps=%s pin_block=%s resume=%s",
+              args.chain, args.infile, args.out_csv, args.out_ndjson, args.out_json, args.concurrency,
+              args.etherscan_qps, args.pin_block, args.resume)
 
     set_default_qps(args.etherscan_qps)
-    print(f"[BATCH] Rate limit set to {args.etherscan_qps} req/s")
+    log.debug("Rate limit set to %s req/s", args.etherscan_qps)
 
-    addresses = load_addresses(args.infile)
+    # One shared pooled client for all workers; fail fast on a bad RPC instead of per token.
+    warm = warm_up_clients([args.chain])
+    if warm.get(args.chain):
+        log.error("RPC client for %s failed: %s", args.chain, warm[args.chain])
+        sys.exit(1)
+
+    seen = SeenSet()
+    resumed = resume_outputs(args, seen) if args.resume else 0
+    if resumed:
+        log.info("Resume: %s addresses already in %s are skipped", resumed, args.out_ndjson)
+    mode = "a" if args.resume else "w"
 
-    print(f"[BATCH] Scanning {len(addresses)} addresses on {args.chain} with concurrency={args.concurrency}")
-    rows, json_out = [], []
+    limit = concurrency_limit(args.chain)
 
     def work(addr: str):
-        print(f"[BATCH][WORK] Start {addr}")
+        log.debug("[WORK] Start %s", addr)
+        started = time.monotonic()
         try:
-            res = analyze_token(args.chain, addr)
-            print(f"[BATCH][WORK] analyze_token OK {addr}")
-            row = flatten_result(res)
-            return row, res, None
+            res = analyze_token(args.chain, addr, pin_block=args.pin_block)
+            log.debug("[WORK] analyze_token OK %s", addr)
+            return flatten_result(res), res
         except Exception as e:
-            print(f"[BATCH][WORK] analyze_token FAIL {addr} -> {e}")
-            return {
-                "chain": args.chain, "address": addr, "ownership": "", "abi_verified": "",
-                "suspicious_functions": "", "has_mint": "", "max_fee_pct": "",
-                "lp_burn_pct": "", "base_symbol": "", "base_reserve": "", "usd_liquidity": "",
-                "age_days": "", "score": "", "risk_tier": "", "error": str(e)
-            }, None, e
+            log.warning("[WORK] analyze_token FAIL %s -> %s", addr, e)
+            return error_row(args.chain, addr, str(e)), {"chain": args.chain, "address": addr, "error": str(e)}
+        finally:
+            limit.release(time.monotonic() - started)
 
-    try:
-        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as ex:
-            futs = {ex.submit(work, a): a for a in addresses}
-            for fut in as_completed(futs):
-                row, res, err = fut.result()
-                rows.append(row)
-                json_out.append(res if res else {"chain": args.chain, "address": row["address"], "error": row["error"]})
-                print(f"[BATCH] Result {row['address']} -> score={row.get('score','')} tier={row.get('risk_tier','')} {'(err:'+row['error']+')' if row['error'] else ''}")
-        print("[BATCH] All tasks completed.")
-    except Exception as e:
-        print("[BATCH] Thread pool error:", e)
-
-    fieldnames = ["chain","address","ownership","abi_verified","suspicious_functions","has_mint",
-                  "max_fee_pct","lp_burn_pct","base_symbol","base_reserve","usd_liquidity",
-                  "age_days","score","risk_tier","error"]
-    try:
-        with open(args.out_csv, "w", newline="") as f:
-            w = csv.DictWriter(f, fieldnames=fieldnames)
+    workers = max(1, args.concurrency or default_ceiling())
+    stats = {"read": 0, "skipped": 0, "done": 0, "failed": 0}
+    feed = queue.Queue(maxsize=max(workers, PREFETCH_CHUNK))
+    threading.Thread(target=_feed, args=(args, seen, feed, stats), name="batch-feed", daemon=True).start()
+    log.info("Scanning %s on %s with concurrency=%s (results appended to %s and %s)", args.infile, args.chain,
+             f"adaptive {limit.limit}..{min(workers, limit.max_limit)}" if CONCURRENCY_ADAPTIVE else workers,
+             args.out_csv, args.out_ndjson)
+
+    started = last_report = time.monotonic()
+    with open(args.out_ndjson, mode) as jf, open(args.out_csv, mode, newline="") as cf:
+        w = csv.DictWriter(cf, fieldnames=FIELDNAMES)
+        if cf.tell() == 0:
             w.writeheader()
-            w.writerows(rows)
-        print(f"[BATCH] Wrote CSV -> {args.out_csv}")
-    except Exception as e:
-        print("[BATCH] CSV write FAIL:", e)
+            cf.flush()
+        ex = ThreadPoolExecutor(max_workers=workers)
+        pending, fed_all = set(), False
+        try:
+            while True:
+                # Start scans while the adaptive limit has room: block for input only when nothing is running
+                while not fed_all and len(pending) < workers and limit.try_acquire():
+                    try:
+                        item = feed.get(block=not pending)
+                    except queue.Empty:
+                        item = False
+                    if isinstance(item, str):
+                        pending.add(ex.submit(work, item))   # work() gives the slot back
+                        continue
+                    limit.release()
+                    if item is None:
+                        fed_all = True
+                    elif isinstance(item, BaseException):
+                        raise item
+                    break
+                if not pending:
+                    if fed_all:
+                        break
+                    continue
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    row, rec = fut.result()
+                    # NDJSON first: --resume trusts it and rebuilds missing CSV rows from it
+                    jf.write(json.dumps(rec) + "\n")
+                    jf.flush()
+                    w.writerow(row)
+                    cf.flush()
+                    stats["done"] += 1
+                    stats["failed"] += 1 if row["error"] else 0
+                    log.info("Result %s -> score=%s tier=%s%s", row["address"], row.get("score", ""), row.get("risk_tier", ""),
+                             f" (err:{row['error']})" if row["error"] else "")
+                if time.monotonic() - last_report >= 30:
+                    last_report = time.monotonic()
+                    log.info("Progress: %s done (%s failed), %.2f/s, concurrency %s, %s input lines skipped",
+                             stats["done"], stats["failed"], stats["done"] / (last_report - started), limit.limit,
+                             stats["skipped"])
+        except KeyboardInterrupt:
+            log.warning("Interrupted after %s results; run again with --resume to continue", stats["done"])
+            ex.shutdown(wait=False, cancel_futures=True)
+            os._exit(130)   # don't wait for in-flight scans; their addresses are redone on resume
+        ex.shutdown()
 
-    try:
-        with open(args.out_json, "w") as f:
-            json.dump(json_out, f, indent=2)
-        print(f"[BATCH] Wrote JSON -> {args.out_json}")
-    except Exception as e:
-        print("[BATCH] JSON write FAIL:", e)
+    log.info("Wrote CSV -> %s, NDJSON -> %s: %s new results (%s failed); %s input lines skipped as duplicates%s",
+             args.out_csv, args.out_ndjson, stats["done"], stats["failed"], stats["skipped"],
+             f" or done in earlier runs ({resumed} results)" if resumed else "")
+    if args.out_json:
+        try:
+            write_json_array(args.out_ndjson, args.out_json)
+            log.info("Wrote JSON -> %s", args.out_json)
+        except Exception as e:
+            log.error("JSON write FAIL: %s", e)
 
-    print("✅ Done. CSV →", args.out_csv, " JSON →", args.out_json)
+    print("✅ Done. CSV →", args.out_csv, " NDJSON →", args.out_ndjson, *((" JSON →", args.out_json) if args.out_json else ()))
 
 
 if __name__ == "__main__":
@@ -5,54 +5,62 @@ import os
 import sys
 from pathlib import Path
 
-print("[CLI] Booting...")
-
 from dotenv import load_dotenv
 _loaded = load_dotenv()
-print(f"[CLI] .env loaded: {_loaded}")
-print(f"[CLI] ENV presence -> ETH RPC: {'yes' if os.getenv('WEB3_PROVIDER_ETH') else 'no'}, "
-      f"BSC RPC: {'yes' if os.getenv('WEB3_PROVIDER_BSC') else 'no'}, "
-      f"ETHERSCAN_API_KEY: {'yes' if os.getenv('ETHERSCAN_API_KEY') else 'no'}, "
-      f"BSCSCAN_API_KEY: {'yes' if os.getenv('BSCSCAN_API_KEY') else 'no'}")
+
+# After load_dotenv, so LOG_* settings from .env apply
+from backend.utils.log import get_logger
+log = get_logger("CLI")
+log.debug("Booting...")
+log.debug(".env loaded: %s", _loaded)
+log.debug("ENV presence -> ETH RPC: %s, BSC RPC: %s, ETHERSCAN_API_KEY: %s, BSCSCAN_API_KEY: %s",
+          *("yes" if os.getenv(k) else "no"
+            for k in ("WEB3_PROVIDER_ETH", "WEB3_PROVIDER_BSC", "ETHERSCAN_API_KEY", "BSCSCAN_API_KEY")))
 
 try:
     from backend.core.analyze import analyze_token
-    print("[CLI] Import analyze_token: OK")
+    from backend.utils.trace import format_waterfall
+    log.debug("Import analyze_token: OK")
 except Exception as e:
-    print("[CLI] Import analyze_token: FAIL ->", e)
+    log.error("Import analyze_token: FAIL -> %s", e)
     sys.exit(1)
 
 
 def main():
-    print("[CLI] Parsing arguments...")
+    log.debug("Parsing arguments...")
     p = argparse.ArgumentParser(description="Token Rug Radar CLI (debug prints)")
     p.add_argument("--chain", default="eth", choices=["eth", "bsc"], help="Chain to use (eth|bsc)")
     p.add_argument("--address", required=True, help="ERC-20 contract address")
     p.add_argument("--json", action="store_true", help="Print JSON only")
+    p.add_argument("--pin-block", action="store_true", default=None,
+                   help="Read every check at one block (default: ANALYZE_PIN_BLOCK)")
+    p.add_argument("--trace", action="store_true",
+                   help="Record timed spans for every step/RPC/explorer call (waterfall; _trace in --json)")
     args = p.parse_args()
-    print(f"[CLI] Args -> chain={args.chain} address={args.address} json={args.json}")
+    log.debug("Args -> chain=%s address=%s json=%s pin_block=%s trace=%s",
+              args.chain, args.address, args.json, args.pin_block, args.trace)
 
-    print("[CLI] Calling analyze_token...")
+    log.debug("Calling analyze_token...")
     try:
-        result = analyze_token(args.chain, args.address)
-        print("[CLI] analyze_token: OK")
+        result = analyze_token(args.chain, args.address, pin_block=args.pin_block, trace=args.trace)
+        log.debug("analyze_token: OK")
     except Exception as e:
-        print("[CLI] analyze_token: FAIL ->", e)
+        log.error("analyze_token: FAIL -> %s", e)
         return
 
     if args.json:
-        print("[CLI] --json requested; dumping raw result...")
+        log.debug("--json requested; dumping raw result...")
         print(json.dumps(result, indent=2, sort_keys=False, default=str))
-        print("[CLI] Done.")
+        log.debug("Done.")
         return
 
     # Pretty output with defensive checks
     try:
         print(f"✅ Connected. Chain={result.get('chain','?')}  Address={result.get('address','?')}")
-        print("[CLI] Ownership block...")
+        log.debug("Ownership block...")
         print(result.get("ownership"))
 
-        print("[CLI] ABI checks block...")
+        log.debug("ABI checks block...")
         if result.get("abi_verified"):
             funcs = result.get("suspicious_functions") or []
             if funcs:
@@ -76,7 +84,7 @@ def main():
             print(result.get("abi_error") or "ABI not verified.")
             print("ℹ️ Skipping ABI-based checks for this contract.")
 
-        print("[CLI] Liquidity block...")
+        log.debug("Liquidity block...")
         lp = result.get("liquidity")
         if lp:
             pair = lp.get("pair")
@@ -131,12 +139,16 @@ def main():
                   else "✅ LOW RISK" if tier == "LOW"
                   else f"❓ Unknown tier: {tier}")
         except Exception as e:
-            print("[CLI] Risk print failed:", e)
+            log.error("Risk print failed: %s", e)
+
+        if result.get("_trace"):
+            print("Trace waterfall (start ms, duration, bar, span):")
+            print(format_waterfall(result["_trace"]))
 
     except Exception as e:
-        print("[CLI] Pretty print block: FAIL ->", e)
+        log.error("Pretty print block: FAIL -> %s", e)
 
-    print("[CLI] Done.")
+    log.debug("Done.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,224 @@
+# worker_cli.py
+# Scan worker for distributed batch jobs: leases addresses of queued jobs from a coordinator
+# (any API instance: POST /api/jobs, GET /api/jobs/{id}, GET /api/workers), scans them with
+# analyze_token and reports the results back. Run one per host, each with its own RPC
+# endpoints and explorer keys (.env):
+#
+#   JOBS_WORKER_TOKEN=... python worker_cli.py --coordinator http://scanner-01:8000
+#
+# The coordinator refuses workers until it has JOBS_WORKER_TOKEN set (same value here, or --token).
+# Scans per chain follow the adaptive limit of backend/utils/concurrency.py (--concurrency caps it).
+# Reports also renew the worker's leases; a worker that dies simply stops renewing and its
+# addresses go to other workers after JOBS_LEASE_SECONDS. Ctrl-C / SIGTERM hands them back at once.
+import argparse, os, signal, socket, sys, time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from dotenv import load_dotenv
+_loaded = load_dotenv()
+
+# After load_dotenv, so LOG_* settings from .env apply
+from backend.utils.log import get_logger
+log = get_logger("WORKER")
+log.debug(".env loaded: %s", _loaded)
+
+try:
+    from backend.core.analyze import analyze_token
+    log.debug("Import analyze_token: OK")
+except Exception as e:
+    log.error("Import analyze_token: FAIL -> %s", e)
+    sys.exit(1)
+
+from backend.chains import warm_up_clients
+from backend.utils.concurrency import CONCURRENCY_ADAPTIVE, concurrency_limit, default_ceiling
+from backend.utils.context import prefetch_contract_ages
+from backend.utils.ratelimit import set_default_qps
+
+REPORT_EVERY = 25   # results per report (reports are also sent at least every lease_seconds / 3)
+_MAX_BACKOFF = 30.0
+
+
+class Coordinator:
+    """HTTP client for the coordinator's /api/workers endpoints (retries until it answers)."""
+
+    def __init__(self, url: str, name: str, token: str = "", host: str = ""):
+        self.url = url.rstrip("/")
+        self.name = name
+        self.host = host
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def _post(self, path: str, body: dict, stopping=lambda: False):
+        backoff = 1.0
+        while True:
+            try:
+                resp = self.session.post(f"{self.url}/api/workers/{self.name}/{path}", json=body, timeout=30)
+                if resp.status_code == 204:
+                    return None
+                if resp.status_code < 500:
+                    resp.raise_for_status()   # 4xx (bad token, workers disabled, bad request): retrying won't help
+                    return resp.json()
+                log.warning("coordinator %s -> HTTP %s", path, resp.status_code)
+            except requests.HTTPError:
+                raise
+            except requests.RequestException as e:
+                log.warning("coordinator %s failed: %s", path, e)
+            if stopping():
+                return None
+            time.sleep(backoff)
+            backoff = min(backoff * 2, _MAX_BACKOFF)
+
+    def lease(self, max_items: int, stopping=lambda: False):
+        return self._post("lease", {"max_items": max_items, "host": self.host}, stopping)
+
+    def report(self, job_id: str, results: list) -> bool:
+        body = {"job_id": job_id, "host": self.host,
+                "results": [{"seq": seq, "result": res, "failed": failed} for seq, res, failed in results]}
+        return bool((self._post("report", body) or {}).get("active"))
+
+    def release(self):
+        self._post("release", {}, stopping=lambda: True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Token Rug Radar - distributed scan worker")
+    # The coordinator only serves workers once JOBS_WORKER_TOKEN is set there (or JOBS_WORKERS_INSECURE=1);
+    # pass the same token with --token / JOBS_WORKER_TOKEN
+    ap.add_argument("--coordinator", default=os.getenv("JOBS_COORDINATOR", "http://127.0.0.1:8000"),
+                    help="Base URL of the API that holds the job queue (env JOBS_COORDINATOR); "
+                         "it must have JOBS_WORKER_TOKEN set, and --token must match it")
+    ap.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}", help="Worker name in /api/workers")
+    ap.add_argument("--token", default=os.getenv("JOBS_WORKER_TOKEN", ""), help="Coordinator's JOBS_WORKER_TOKEN")
+    ap.add_argument("--concurrency", type=int, default=None,
+                    help="Max parallel scans on this host (default: adaptive up to CONCURRENCY_MAX)")
+    ap.add_argument("--lease-size", type=int, default=50, help="Addresses taken per lease")
+    ap.add_argument("--etherscan-qps", type=float, default=None, help="Max req/s to explorer APIs (default: ETHERSCAN_QPS)")
+    ap.add_argument("--poll", type=float, default=5.0, help="Seconds between lease requests while there is no work")
+    args = ap.parse_args()
+
+    if args.etherscan_qps is not None:
+        set_default_qps(args.etherscan_qps)
+    coord = Coordinator(args.coordinator, args.name, args.token, socket.gethostname())
+    workers = max(1, args.concurrency or default_ceiling())
+    log.info("Worker %s: coordinator=%s concurrency=%s%s lease=%s", args.name, args.coordinator,
+             "adaptive up to " if CONCURRENCY_ADAPTIVE else "", workers, args.lease_size)
+
+    stop = []
+    signal.signal(signal.SIGTERM, lambda *_: stop.append("SIGTERM"))
+
+    def scan(chain: str, addr: str, pin_block):
+        started = time.monotonic()
+        try:
+            return analyze_token(chain, addr, pin_block=pin_block), False
+        except Exception as e:
+            log.warning("[WORK] analyze_token FAIL %s -> %s", addr, e)
+            return {"chain": chain, "address": addr, "error": str(e)}, True
+        finally:
+            concurrency_limit(chain).release(time.monotonic() - started)
+
+    ready_chains = set()
+    todo = deque()                    # (job_id, chain, pin_block, seq, address) leased, not started
+    running = {}                      # future -> (job_id, seq)
+    outbox = defaultdict(list)        # job_id -> [(seq, result, failed)] not reported yet
+    held = defaultdict(int)           # job_id -> leased addresses without a reported result
+    dropped = set()                   # jobs no longer active: results of their running scans are discarded
+    last_report = {}
+    lease_seconds = 30.0
+    next_lease = 0.0
+    done = failed = 0
+    started = last_log = time.monotonic()
+
+    def flush(job_id: str):
+        results = outbox.pop(job_id, [])
+        active = coord.report(job_id, results)
+        last_report[job_id] = time.monotonic()
+        held[job_id] -= len(results)
+        if not active:
+            # Cancelled (or finished by others): drop what is left of it here
+            log.info("job %s is no longer active, dropping its leased addresses", job_id)
+            dropped.add(job_id)
+            for item in [t for t in todo if t[0] == job_id]:
+                todo.remove(item)
+            held.pop(job_id, None)
+        elif held[job_id] <= 0:
+            held.pop(job_id, None)
+
+    ex = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while not stop:
+            now = time.monotonic()
+            # Keep about as many leased addresses queued as are being scanned
+            if len(todo) < max(1, len(running)) and now >= next_lease:
+                lease = coord.lease(max(1, args.lease_size), stopping=lambda: bool(stop))
+                if lease is None:
+                    next_lease = now + args.poll
+                else:
+                    job, items = lease["job"], lease["items"]
+                    lease_seconds = float(lease.get("lease_seconds") or lease_seconds)
+                    chain, pin_block = job["chain"], job["options"].get("pin_block")
+                    if chain not in ready_chains:
+                        warm = warm_up_clients([chain])
+                        if warm.get(chain):
+                            log.error("RPC client for %s failed: %s", chain, warm[chain])
+                            break
+                        ready_chains.add(chain)
+                    try:
+                        prefetch_contract_ages(chain, [i["address"] for i in items])
+                    except Exception as e:
+                        log.warning("Contract age prefetch failed, falling back to per-token lookups: %s", e)
+                    todo.extend((job["id"], chain, pin_block, i["seq"], i["address"]) for i in items)
+                    held[job["id"]] += len(items)
+                    last_report.setdefault(job["id"], time.monotonic())
+                    log.debug("Leased %s addresses of job %s", len(items), job["id"])
+
+            # Start scans while the chain's adaptive limit has room (scan() gives the slot back)
+            while todo and len(running) < workers and concurrency_limit(todo[0][1]).try_acquire():
+                job_id, chain, pin_block, seq, addr = todo.popleft()
+                running[ex.submit(scan, chain, addr, pin_block)] = (job_id, seq)
+
+            if running:
+                finished, _ = wait(running, timeout=1.0, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    job_id, seq = running.pop(fut)
+                    res, err = fut.result()
+                    done += 1
+                    failed += 1 if err else 0
+                    if job_id not in dropped:
+                        outbox[job_id].append((seq, res, err))
+            elif not todo:
+                time.sleep(min(1.0, max(0.0, next_lease - time.monotonic())))
+
+            # Report full batches; renew the other held jobs before their leases run out
+            for job_id in list(held):
+                due = time.monotonic() - last_report.get(job_id, 0.0) >= lease_seconds / 3
+                if len(outbox.get(job_id, ())) >= REPORT_EVERY or due:
+                    flush(job_id)
+
+            if time.monotonic() - last_log >= 30:
+                last_log = time.monotonic()
+                log.info("Progress: %s scanned (%s failed), %.2f/s, %s in flight (limit %s), %s queued", done, failed,
+                         done / (last_log - started), len(running),
+                         ", ".join(f"{c}={concurrency_limit(c).limit}" for c in sorted(ready_chains)) or "-", len(todo))
+    except KeyboardInterrupt:
+        stop.append("SIGINT")
+    except requests.HTTPError as e:
+        log.error("Coordinator refused the worker: %s", e)
+        os._exit(1)
+
+    log.info("Stopping (%s): reporting %s results, handing back %s addresses",
+             stop[0] if stop else "error", sum(len(v) for v in outbox.values()), len(todo) + len(running))
+    ex.shutdown(wait=False, cancel_futures=True)
+    try:
+        for job_id in list(outbox):
+            flush(job_id)
+        coord.release()
+    except requests.HTTPError as e:
+        log.error("Coordinator refused the final report: %s", e)
+    log.info("Worker %s done: %s scanned (%s failed)", args.name, done, failed)
+    os._exit(0 if stop else 1)   # don't wait for in-flight scans; their addresses were handed back
+
+
+if __name__ == "__main__":
+    main()